@@ -71,6 +71,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'salary.middleware.recalculation_middleware',
+    'salary.middleware.request_memo_middleware',
 ]
 
 ROOT_URLCONF = 'personal_area.urls'
@@ -112,6 +114,25 @@ DATABASES = {
     }
 }
 
+# Cached values are invalidated by bumping versions in the cache, so
+# the cache must be shared by all workers (Redis, Memcached, database):
+# a bump in the local memory cache of one process doesn't reach the others.
+# Values of the local memory cache live LOCAL_CACHE_LIFETIME seconds at most.
+CACHE_BACKEND = os.environ.get(
+    'CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'
+)
+IS_LOCAL_CACHE = CACHE_BACKEND in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+LOCAL_CACHE_LIFETIME = 5
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', default=''),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 AUTH_VALIDAROR_PATH = 'django.contrib.auth.password_validation.'
@@ -316,7 +337,7 @@ CASHIER_BONUS_CRITERIA = Criteria(
 )
 
 DEFAULT_MISCONDUCT_ARTICLE_NUMBER = 1
-DEFAULT_CACHE_LIFETIME=3600
+DEFAULT_CACHE_LIFETIME = LOCAL_CACHE_LIFETIME if IS_LOCAL_CACHE else 3600
 
 AVERAGE_BAR_REVENUE_CRITERIA = 5000
 AVERAGE_HOOKAH_REVENUE_CRITERIA = 700
@@ -324,3 +345,43 @@ MINIMAL_WORKSHIFTS_NUMBER = 4
 
 EMPLOYEE_CHANGE_HOUR = 8 # Hour when employee changes from shift
 WORKSHIFT_SYMBOL = 'Р' # The symbol that denotes the working day in the chart.
+
+# Source of planed workshifts: GoogleSheetsScheduleProvider,
+# FileScheduleProvider (mm-yyyy.csv/xlsx files) or DatabaseScheduleProvider.
+SCHEDULE_PROVIDER = os.environ.get(
+    'SCHEDULE_PROVIDER',
+    default='salary.services.schedule.GoogleSheetsScheduleProvider'
+)
+# Source of the schedule for the PlannedShift table sync.
+SCHEDULE_SYNC_PROVIDER = os.environ.get(
+    'SCHEDULE_SYNC_PROVIDER',
+    default='salary.services.schedule.GoogleSheetsScheduleProvider'
+)
+SCHEDULE_FILES_DIR = os.environ.get(
+    'SCHEDULE_FILES_DIR', default=os.path.join(BASE_DIR, 'schedules')
+)
+GSHEETS_TIMEOUT = 10 # Seconds to wait for Google sheets response.
+GSHEETS_BREAKER_FAILURE_THRESHOLD = 3
+GSHEETS_BREAKER_BASE_DELAY = 30 # Seconds, doubled by every next failure.
+GSHEETS_BREAKER_MAX_DELAY = 1800
+SCHEDULE_SOFT_LIFETIME = 600 # Schedule age to refresh it in the background.
+SCHEDULE_CACHE_LIFETIME = 7 * 24 * 3600
+SCHEDULE_REFRESH_LOCK_TIMEOUT = 120
+SCHEDULE_WARM_INTERVAL = 300
+# Days before today to show missed workshifts on staff pages.
+MISSED_WORKSHIFTS_DAYS = 31
+# Lifetime of cached missed and unclosed workshifts dates.
+WORKSHIFT_DATES_CACHE_LIFETIME = (
+    LOCAL_CACHE_LIFETIME if IS_LOCAL_CACHE else 300
+)
+# Messages number loaded at once in the chat window.
+CHAT_PAGE_SIZE = 50
+# Seconds to hold the messenger long-poll request without new messages.
+CHAT_LONG_POLL_TIMEOUT = 25
+# Seconds between database checks of the long-poll request, to find messages
+# sent through other processes.
+CHAT_DB_POLL_INTERVAL = 5
+# Messages older than the days number are moved to the archive table
+# by archive_chat_messages command.
+CHAT_ARCHIVE_AFTER_DAYS = 180
+CHAT_ARCHIVE_BATCH_SIZE = 1000
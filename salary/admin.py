@@ -14,6 +14,11 @@ class DisciplinaryRegAdmin(admin.ModelAdmin):
     list_display = ('article', 'title', 'sanction')
 
 
+class PlannedShiftAdmin(admin.ModelAdmin):
+    list_display = ('date', 'user')
+    list_filter = ('date',)
+
+
 class DeleteNotAllowedModelAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False
@@ -23,4 +28,5 @@ admin.site.register(Profile, DeleteNotAllowedModelAdmin)
 admin.site.register(WorkingShift, WorkshiftAdmin)
 admin.site.register(Position, DeleteNotAllowedModelAdmin)
 admin.site.register(DisciplinaryRegulations, DisciplinaryRegAdmin)
-admin.site.register(Misconduct)
\ No newline at end of file
+admin.site.register(Misconduct)
+admin.site.register(PlannedShift, PlannedShiftAdmin)
\ No newline at end of file
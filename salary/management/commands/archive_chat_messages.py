@@ -0,0 +1,31 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from salary.services.chat_archive import archive_messages
+
+
+class Command(BaseCommand):
+    help = ('Moves chat messages older than CHAT_ARCHIVE_AFTER_DAYS '
+            'to the archive table.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.CHAT_ARCHIVE_AFTER_DAYS,
+            help='Age of archived messages in days.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.CHAT_ARCHIVE_BATCH_SIZE,
+            help='Messages number moved in one transaction.'
+        )
+
+    def handle(self, *args, **options):
+        archive_before = timezone.now() - datetime.timedelta(
+            days=options['days'])
+        archived_number = archive_messages(
+            archive_before, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{archived_number} messages are archived.'))
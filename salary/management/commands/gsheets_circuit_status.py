@@ -0,0 +1,12 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from salary.services.google_sheets import gsheets_circuit_breaker
+
+
+class Command(BaseCommand):
+    help = 'Prints the state and metrics of Google sheets circuit breaker.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(gsheets_circuit_breaker.get_metrics()))
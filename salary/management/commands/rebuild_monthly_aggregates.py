@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from salary.management.months import get_next_month, parse_month
+from salary.models import WorkingShift
+from salary.services.monthly_reports import rebuild_monthly_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds monthly employees aggregates for the range of months.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start', type=parse_month,
+            help='First month of the range in YYYY-MM format.'
+        )
+        parser.add_argument(
+            '--end', type=parse_month,
+            help='Last month of the range in YYYY-MM format.'
+        )
+
+    def handle(self, *args, **options):
+        months = WorkingShift.objects.filter(
+            status=WorkingShift.WorkshiftStatus.VERIFIED
+        ).dates('shift_date', 'month')
+        if options['start']:
+            months = months.filter(shift_date__gte=options['start'])
+        if options['end']:
+            months = months.filter(
+                shift_date__lt=get_next_month(options['end']))
+
+        for month_date in months:
+            categories = rebuild_monthly_aggregates(
+                month=month_date.month, year=month_date.year)
+            self.stdout.write(
+                f'{month_date:%Y-%m}: '
+                f'{len(categories.cashier_list)} cashiers, '
+                f'{len(categories.hall_admin_list)} hall admins.'
+            )
+        self.stdout.write(self.style.SUCCESS('Aggregates are rebuilt.'))
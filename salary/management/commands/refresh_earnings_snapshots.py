@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from salary.models import WorkingShift, EarningsSnapshot
+from salary.services.earnings_snapshot import get_wrong_snapshots_workshifts
+
+
+class Command(BaseCommand):
+    help = 'Backfills and verifies earnings snapshots of all workshifts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Number of workshifts processed at once.'
+        )
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only report missing and wrong snapshots, do not save them.'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('Chunk size must be positive.')
+
+        workshifts_queryset = WorkingShift.objects.select_related(
+            'hall_admin__profile__position',
+            'cash_admin__profile__position',
+        ).order_by('pk')
+        checked_number = wrong_number = 0
+        last_pk = 0
+        while True:
+            workshifts = list(
+                workshifts_queryset.filter(pk__gt=last_pk)[:chunk_size]
+            )
+            if not workshifts:
+                break
+            last_pk = workshifts[-1].pk
+            checked_number += len(workshifts)
+            wrong_workshifts = get_wrong_snapshots_workshifts(workshifts)
+            wrong_number += len(wrong_workshifts)
+            for workshift in wrong_workshifts:
+                self.stdout.write(f'Wrong earnings snapshots: {workshift}.')
+            if wrong_workshifts and not options['verify']:
+                EarningsSnapshot.refresh_for_workshifts(wrong_workshifts)
+
+        self.stdout.write(
+            f'Checked workshifts: {checked_number}. '
+            f'Wrong snapshots: {wrong_number}.'
+        )
+        if options['verify'] and wrong_number:
+            raise CommandError('Earnings snapshots are not actual.')
+        if not options['verify']:
+            self.stdout.write(self.style.SUCCESS('Snapshots are actual.'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from salary.management.months import get_next_month, parse_month
+from salary.services.schedule import ScheduleSourceError, sync_planned_shifts
+
+
+class Command(BaseCommand):
+    help = ('Syncs PlannedShift table with the schedule sheet, '
+            'the current and next months by default.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start', type=parse_month,
+            help='First month of the range in YYYY-MM format.'
+        )
+        parser.add_argument(
+            '--end', type=parse_month,
+            help='Last month of the range in YYYY-MM format.'
+        )
+
+    def handle(self, *args, **options):
+        current_month = timezone.localdate(timezone.now()).replace(day=1)
+        month_date = options['start'] or current_month
+        end_date = options['end'] or get_next_month(month_date)
+        if month_date > end_date:
+            raise CommandError('Start month is later than end month.')
+
+        while month_date <= end_date:
+            try:
+                sync_result = sync_planned_shifts(
+                    year=month_date.year, month=month_date.month)
+            except ScheduleSourceError as exception:
+                raise CommandError(
+                    f'{month_date:%Y-%m}: schedule is unavailable, '
+                    f'{exception}.'
+                )
+            self.stdout.write(
+                f'{month_date:%Y-%m}: {sync_result.created_number} created, '
+                f'{sync_result.deleted_number} deleted.'
+            )
+            month_date = get_next_month(month_date)
+        self.stdout.write(self.style.SUCCESS('Planned shifts are synced.'))
@@ -0,0 +1,60 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from salary.services.schedule import refresh_employees_schedules
+
+
+class Command(BaseCommand):
+    help = (
+        'Refreshes cached schedules of the current and next months. '
+        'Requires the cache shared by processes (CACHE_BACKEND), '
+        'the local memory cache of this process is useless for the site.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep refreshing schedules until interrupted.'
+        )
+        parser.add_argument(
+            '--interval', type=int, default=settings.SCHEDULE_WARM_INTERVAL,
+            help='Seconds between refreshes in the loop mode.'
+        )
+
+    def handle(self, *args, **options):
+        cache_backend = caches[DEFAULT_CACHE_ALIAS]
+        if isinstance(cache_backend, (LocMemCache, DummyCache)):
+            raise CommandError(
+                f'{type(cache_backend).__name__} is not shared by processes, '
+                f'set a shared CACHE_BACKEND to warm schedules.'
+            )
+        while True:
+            self.warm_schedules()
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def warm_schedules(self) -> None:
+        today = timezone.localdate(timezone.now())
+        next_month_date = (
+            today.replace(day=1) + datetime.timedelta(days=32)
+        )
+        months = [
+            (month_date.year, month_date.month)
+            for month_date in (today, next_month_date)
+        ]
+        try:
+            schedules_dict = refresh_employees_schedules(months)
+        except Exception as exception:
+            self.stderr.write(f'Schedules refresh error: {exception}.')
+            return
+
+        for (year, month), schedule in schedules_dict.items():
+            self.stdout.write(f'{month:02}-{year}: {len(schedule)} employees.')
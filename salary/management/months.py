@@ -0,0 +1,16 @@
+import datetime
+
+from django.core.management.base import CommandError
+
+
+def parse_month(value: str) -> datetime.date:
+    """Returns the first date of the month from YYYY-MM command argument"""
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m').date()
+    except ValueError:
+        raise CommandError(f'Wrong month "{value}", use YYYY-MM format.')
+
+
+def get_next_month(date: datetime.date) -> datetime.date:
+    """Returns the first date of the month next to the date"""
+    return (date.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
@@ -1,5 +1,16 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from salary.services.recalculation import (
+    deferred_recalculation, flush_deferred_recalculation,
+    has_pending_recalculation, start_deferred_recalculation,
+    stop_deferred_recalculation
+)
+from salary.services.request_memo import request_memo_scope
 
 
 def maintrance_middleware(get_response):
@@ -20,4 +31,53 @@ def maintrance_middleware(get_response):
         # Code to be executed for each request/response after
         # the view is called.
 
-    return middleware
\ No newline at end of file
+    return middleware
+
+
+@sync_and_async_middleware
+def recalculation_middleware(get_response):
+    """
+    Coalesces recalculations queued during the request
+    and runs them once after the view.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            start_deferred_recalculation()
+            try:
+                response = await get_response(request)
+            finally:
+                stop_deferred_recalculation()
+            # Recalculation queries can't run in the event loop.
+            if has_pending_recalculation():
+                await sync_to_async(flush_deferred_recalculation)()
+
+            return response
+
+    else:
+        def middleware(request):
+            with deferred_recalculation():
+                response = get_response(request)
+
+            return response
+
+    return middleware
+
+
+@sync_and_async_middleware
+def request_memo_middleware(get_response):
+    """Keeps memoized services results during the request."""
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            with request_memo_scope():
+                response = await get_response(request)
+
+            return response
+
+    else:
+        def middleware(request):
+            with request_memo_scope():
+                response = get_response(request)
+
+            return response
+
+    return middleware
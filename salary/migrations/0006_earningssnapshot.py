@@ -0,0 +1,57 @@
+# Generated by Django 4.1 on 2026-10-18 12:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('salary', '0005_workingshift_wishes_alter_cabinerror_cabin_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EarningsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('HA', 'Администратор зала'), ('CSH', 'Администратор кассы')], max_length=10, verbose_name='Роль на смене')),
+                ('salary', models.FloatField(default=0.0, verbose_name='Оклад')),
+                ('experience', models.FloatField(default=0.0, verbose_name='Надбавка за стаж')),
+                ('attestation', models.FloatField(default=0.0, verbose_name='Надбавка за аттестацию')),
+                ('basic_part', models.FloatField(default=0.0, verbose_name='Окладная часть')),
+                ('award', models.FloatField(default=0.0, verbose_name='Премия за дисциплину')),
+                ('bar_percent', models.FloatField(default=0.0, verbose_name='Процент от выручки по бару')),
+                ('bar_value', models.FloatField(default=0.0, verbose_name='Бонус от выручки по бару')),
+                ('game_zone_percent', models.FloatField(default=0.0, verbose_name='Процент от выручки игровой зоны')),
+                ('game_zone_value', models.FloatField(default=0.0, verbose_name='Бонус от выручки игровой зоны')),
+                ('additional_services_percent', models.FloatField(default=0.0, verbose_name='Процент от выручки доп. услуг')),
+                ('additional_services_value', models.FloatField(default=0.0, verbose_name='Бонус от выручки доп. услуг')),
+                ('revenues_summary', models.FloatField(default=0.0, verbose_name='Бонус от выручки')),
+                ('publication', models.FloatField(default=0.0, verbose_name='Бонус за публикацию')),
+                ('cleaning', models.FloatField(default=0.0, verbose_name='Бонус за наведение порядка')),
+                ('hookah_percent', models.FloatField(default=0.0, verbose_name='Процент от выручки по кальянам')),
+                ('hookah_value', models.FloatField(default=0.0, verbose_name='Бонус от выручки по кальянам')),
+                ('bonus_part', models.FloatField(default=0.0, verbose_name='Бонусная часть')),
+                ('penalty', models.FloatField(default=0.0, verbose_name='Штраф')),
+                ('shortage', models.FloatField(default=0.0, verbose_name='Недостача')),
+                ('retention', models.FloatField(default=0.0, verbose_name='Удержано')),
+                ('estimated_earnings', models.FloatField(default=0.0, verbose_name='Расчётный заработок')),
+                ('before_shortage', models.FloatField(default=0.0, verbose_name='Заработок до вычета недостачи')),
+                ('final_earnings', models.FloatField(default=0.0, verbose_name='Итоговый заработок')),
+                ('calculation_date', models.DateTimeField(auto_now=True, verbose_name='Дата расчёта')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='earnings_snapshots', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+                ('workshift', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='earnings_snapshots', to='salary.workingshift', verbose_name='Смена')),
+            ],
+            options={
+                'verbose_name': 'Расчёт заработка за смену',
+                'verbose_name_plural': 'Расчёты заработка за смены',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='earningssnapshot',
+            constraint=models.UniqueConstraint(fields=('workshift', 'role'), name='unique_workshift_role_earnings'),
+        ),
+    ]
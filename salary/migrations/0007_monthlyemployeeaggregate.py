@@ -0,0 +1,50 @@
+# Generated by Django 4.1 on 2026-10-18 12:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('salary', '0006_earningssnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyEmployeeAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('HA', 'Администратор зала'), ('CSH', 'Администратор кассы')], max_length=10, verbose_name='Роль на сменах')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='Год')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='Месяц')),
+                ('order_number', models.PositiveSmallIntegerField(default=0, verbose_name='Порядковый номер')),
+                ('shift_counter', models.PositiveSmallIntegerField(default=0, verbose_name='Количество смен')),
+                ('basic_revenues', models.FloatField(default=0.0, verbose_name='Сумма окладных частей')),
+                ('bonus_revenues', models.FloatField(default=0.0, verbose_name='Сумма бонусных частей')),
+                ('shortage', models.FloatField(default=0.0, verbose_name='Недостачи')),
+                ('penalty', models.FloatField(default=0.0, verbose_name='Штрафы')),
+                ('average_revenue', models.FloatField(default=0.0, verbose_name='Средняя выручка')),
+                ('summary_bar_revenue', models.FloatField(default=0.0, verbose_name='Выручка по бару')),
+                ('average_bar_revenue', models.FloatField(default=0.0, verbose_name='Средняя выручка по бару')),
+                ('summary_hookah_revenue', models.FloatField(default=0.0, verbose_name='Выручка по кальянам')),
+                ('average_hookah_revenue', models.FloatField(default=0.0, verbose_name='Средняя выручка по кальянам')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_aggregates', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Итоги сотрудника за месяц',
+                'verbose_name_plural': 'Итоги сотрудников за месяц',
+                'ordering': ['order_number'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='monthlyemployeeaggregate',
+            index=models.Index(fields=['year', 'month'], name='salary_mont_year_431df7_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyemployeeaggregate',
+            constraint=models.UniqueConstraint(fields=('employee', 'role', 'year', 'month'), name='unique_employee_role_month_aggregate'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1 on 2026-10-18 12:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('salary', '0007_monthlyemployeeaggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlannedShift',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата смены')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='planned_shifts', to=settings.AUTH_USER_MODEL, verbose_name='Сотрудник')),
+            ],
+            options={
+                'verbose_name': 'Запланированная смена',
+                'verbose_name_plural': 'График смен',
+                'ordering': ['date'],
+            },
+        ),
+    ]
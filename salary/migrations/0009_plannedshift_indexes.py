@@ -0,0 +1,21 @@
+# Generated by Django 4.1 on 2026-10-18 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salary', '0008_plannedshift'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='plannedshift',
+            index=models.Index(fields=['date'], name='salary_plan_date_2328ed_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='plannedshift',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_user_planned_shift'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1 on 2026-10-18 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salary', '0009_plannedshift_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorksheetCopy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30, unique=True, verbose_name='Название листа')),
+                ('data', models.JSONField(default=list, verbose_name='Данные листа')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Копия листа графика',
+                'verbose_name_plural': 'Копии листов графика',
+            },
+        ),
+    ]
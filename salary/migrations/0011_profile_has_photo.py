@@ -0,0 +1,32 @@
+# Generated by Django 4.1 on 2026-10-18 13:13
+
+import os
+
+from django.db import migrations, models
+
+
+def fill_has_photo(apps, schema_editor):
+    Profile = apps.get_model('salary', 'Profile')
+    profiles_with_photo_ids = [
+        profile.pk
+        for profile in Profile.objects.exclude(photo='').exclude(photo=None)
+        if os.path.exists(profile.photo.path)
+    ]
+    Profile.objects.filter(pk__in=profiles_with_photo_ids).update(
+        has_photo=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salary', '0010_worksheetcopy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='has_photo',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Фото загружено'),
+        ),
+        migrations.RunPython(fill_has_photo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 4.1 on 2026-10-18 13:14
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Min
+import django.db.models.deletion
+
+
+def fill_last_read_message_id(apps, schema_editor):
+    """Sets read cursors before the first unread message of every member"""
+    ChatMember = apps.get_model('salary', 'ChatMember')
+    Message = apps.get_model('salary', 'Message')
+    for chat_member in ChatMember.objects.all():
+        other_messages = Message.objects.filter(
+            chat_id=chat_member.chat_id).exclude(author_id=chat_member.user_id)
+        first_unread_id = other_messages.filter(is_read=False).aggregate(
+            first_id=Min('id'))['first_id']
+        if first_unread_id:
+            last_read_message_id = first_unread_id - 1
+        else:
+            last_read_message_id = Message.objects.filter(
+                chat_id=chat_member.chat_id).aggregate(
+                    last_id=Max('id'))['last_id'] or 0
+        ChatMember.objects.filter(pk=chat_member.pk).update(
+            last_read_message_id=last_read_message_id)
+
+
+def fill_is_read(apps, schema_editor):
+    ChatMember = apps.get_model('salary', 'ChatMember')
+    Message = apps.get_model('salary', 'Message')
+    for chat_member in ChatMember.objects.all():
+        Message.objects.filter(
+            chat_id=chat_member.chat_id,
+            id__lte=chat_member.last_read_message_id
+        ).exclude(author_id=chat_member.user_id).update(is_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('salary', '0011_profile_has_photo'),
+    ]
+
+    operations = [
+        # The existing auto-created members table becomes ChatMember table.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ChatMember',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='salary.chat', verbose_name='Чат')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_memberships', to=settings.AUTH_USER_MODEL, verbose_name='Участник')),
+                    ],
+                    options={
+                        'verbose_name': 'Участник чата',
+                        'verbose_name_plural': 'Участники чатов',
+                        'db_table': 'salary_chat_members',
+                        'unique_together': {('chat', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='chat',
+                    name='members',
+                    field=models.ManyToManyField(through='salary.ChatMember', to=settings.AUTH_USER_MODEL, verbose_name='Участники'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chatmember',
+            name='last_read_message_id',
+            field=models.BigIntegerField(default=0, verbose_name='Последнее прочитанное сообщение'),
+        ),
+        migrations.RunPython(fill_last_read_message_id, fill_is_read),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+    ]
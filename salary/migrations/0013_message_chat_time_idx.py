@@ -0,0 +1,17 @@
+# Generated by Django 4.1 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salary', '0012_chatmember'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat', 'sending_time', 'id'], name='message_chat_time_idx'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.1 on 2026-10-18 13:20
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Min
+import django.db.models.deletion
+
+
+def _get_merged_last_read_message_id(ChatMember, Message, chat_ids, user_id):
+    """Returns read cursor before the first unread message of the user
+    in all merged chats.
+    """
+    first_unread_ids = []
+    for chat_member in ChatMember.objects.filter(
+            chat_id__in=chat_ids, user_id=user_id):
+        first_unread_id = Message.objects.filter(
+            chat_id=chat_member.chat_id,
+            id__gt=chat_member.last_read_message_id
+        ).exclude(author_id=user_id).aggregate(
+            first_id=Min('id'))['first_id']
+        if first_unread_id:
+            first_unread_ids.append(first_unread_id)
+    if first_unread_ids:
+        return min(first_unread_ids) - 1
+    return Message.objects.filter(chat_id__in=chat_ids).aggregate(
+        last_id=Max('id'))['last_id'] or 0
+
+
+def merge_direct_chats(apps, schema_editor):
+    """Fills members pair of two members chats and merges duplicate chats
+    into the earliest one.
+    """
+    Chat = apps.get_model('salary', 'Chat')
+    ChatMember = apps.get_model('salary', 'ChatMember')
+    Message = apps.get_model('salary', 'Message')
+
+    chats_members = defaultdict(list)
+    for chat_id, user_id in ChatMember.objects.values_list(
+            'chat_id', 'user_id'):
+        chats_members[chat_id].append(user_id)
+    pairs_chats = defaultdict(list)
+    for chat_id, user_ids in chats_members.items():
+        if len(user_ids) == 2:
+            pairs_chats[tuple(sorted(user_ids))].append(chat_id)
+
+    for (low_user_id, high_user_id), chat_ids in pairs_chats.items():
+        kept_chat_id, *duplicate_chat_ids = sorted(chat_ids)
+        if duplicate_chat_ids:
+            for user_id in (low_user_id, high_user_id):
+                ChatMember.objects.filter(
+                    chat_id=kept_chat_id, user_id=user_id
+                ).update(last_read_message_id=_get_merged_last_read_message_id(
+                    ChatMember, Message, chat_ids, user_id))
+            Message.objects.filter(chat_id__in=duplicate_chat_ids).update(
+                chat_id=kept_chat_id)
+            Chat.objects.filter(id__in=duplicate_chat_ids).delete()
+        Chat.objects.filter(id=kept_chat_id).update(
+            low_user_id=low_user_id, high_user_id=high_user_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('salary', '0013_message_chat_time_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='high_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Участник с большим id'),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='low_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Участник с меньшим id'),
+        ),
+        migrations.RunPython(merge_direct_chats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salary', '0014_chat_direct_members'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='chat',
+            constraint=models.UniqueConstraint(fields=('low_user', 'high_user'), name='unique_direct_chat_members'),
+        ),
+    ]
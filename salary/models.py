@@ -1,19 +1,31 @@
-from django.db import models
-from django.contrib.auth.models import User
+import datetime
+
+from django.db import connection, models, transaction
+from django.db.models.functions import Round
+from django.contrib.auth.models import User, Group
 from django.conf import settings
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.urls import reverse_lazy
 
 from salary.services.profile_services import get_expirience_string
+from salary.services.employees_index import invalidate_employees_index
+from salary.services.recalculation import RecalculationQueue
+from salary.services.cache_versions import (
+    invalidate_workshifts_month, invalidate_earnings,
+    invalidate_workshift_dates, invalidate_staff_counters,
+    invalidate_messages_counters
+)
+from salary.services.request_memo import clear_request_memo
+from salary.services.message_hub import message_hub
 from salary.services.filesystem import (
     user_directory_path,
     OverwriteStorage,
 )
 from salary.services.earnings import (
-    WorkshiftData, get_current_earnings, get_total_revenue,
-    get_game_zone_subtotal, get_workshift_penalties, get_costs_sum,
-    get_errors_sum
+    WorkshiftData, get_total_revenue, get_game_zone_subtotal,
+    get_workshift_penalties, get_costs_sum, get_errors_sum, get_batch_earnings,
+    Earnings, ShiftEarnings, BasicPart, BonusPart, Revenues, PercentValue
 )
 
 
@@ -23,7 +35,82 @@ def get_last_name(self):
 User.add_to_class("get_full_name", get_last_name)
 
 
-class Profile(models.Model):
+def get_upsert_unique_fields(unique_fields: list[str]) -> list[str] | None:
+    """Returns unique_fields argument of bulk_create upsert, MySQL upserts
+    by any unique key and doesn't accept them.
+    """
+    if connection.features.supports_update_conflicts_with_target:
+        return unique_fields
+    return None
+
+
+class FieldTrackerMixin:
+    """
+    Remembers field values loaded from the database
+    to define which of them are changed before saving.
+    """
+    # Fields whose original values receivers need even when they are
+    # assigned without loading.
+    tracked_fields: tuple[str, ...] = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_changed_fields(self, field_names: tuple[str, ...]) -> set[str]:
+        """Returns names of changed fields, all of them for a new instance"""
+        loaded_values = getattr(self, '_loaded_values', None)
+        if loaded_values is None:
+            return set(field_names)
+        # Field assigned without loading has unknown original value
+        # and is considered changed.
+        return {
+            name for name in field_names
+            if name in self.__dict__
+            and (name not in loaded_values
+                 or self.__dict__[name] != loaded_values[name])
+        }
+
+    def _remember_loaded_values(self, fields=None) -> None:
+        self._loaded_values.update({
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+            and (fields is None
+                 or field.name in fields or field.attname in fields)
+        })
+
+    def load_original_values(self) -> None:
+        """Loads original values of tracked fields assigned without loading"""
+        loaded_values = getattr(self, '_loaded_values', None)
+        if loaded_values is None:
+            return
+        unknown_fields = [
+            name for name in self.tracked_fields
+            if name in self.__dict__ and name not in loaded_values
+        ]
+        if unknown_fields:
+            loaded_values.update(
+                type(self)._base_manager.filter(pk=self.pk)
+                .values(*unknown_fields).first() or {}
+            )
+
+    def refresh_from_db(self, using=None, fields=None):
+        """Remembers values of the deferred fields loaded on access"""
+        super().refresh_from_db(using=using, fields=fields)
+        if getattr(self, '_loaded_values', None) is not None:
+            self._remember_loaded_values(fields)
+
+    def save(self, *args, **kwargs):
+        self.load_original_values()
+        super().save(*args, **kwargs)
+        self._loaded_values = dict()
+        self._remember_loaded_values()
+
+
+class Profile(FieldTrackerMixin, models.Model):
     class EmailStatus(models.TextChoices):
         ADDED = 'ADD', 'Не подтвержден'
         SENT = 'SNT', 'Ссылка направлена'
@@ -55,6 +142,8 @@ class Profile(models.Model):
     photo = models.ImageField(
         blank=True, null=True, storage=OverwriteStorage(), 
         upload_to=user_directory_path, verbose_name='Фото профиля')
+    has_photo = models.BooleanField(
+        default=False, editable=False, verbose_name='Фото загружено')
     email_status = models.CharField(
         max_length=10, choices=EmailStatus.choices,
         default=EmailStatus.ADDED, verbose_name='Состояние электронной почты'
@@ -83,6 +172,15 @@ class Profile(models.Model):
         return get_expirience_string(employment_date=self.employment_date,
                                      expiration_date=self.dismiss_date)
 
+    def save(self, *args, **kwargs):
+        self.has_photo = bool(self.photo)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'photo' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'has_photo'}
+        super().save(*args, **kwargs)
+
+    earnings_fields = ('position_id', 'employment_date', 'attestation_date')
+
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -96,6 +194,29 @@ def save_user_profile(sender, instance, **kwargs):
     instance.profile.save()
 
 
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_employees_index(sender, instance, update_fields=None,
+                                    **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_employees_index()
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_profile_employees_index(sender, instance, created, **kwargs):
+    if created or instance.get_changed_fields(('position_id',)):
+        invalidate_employees_index()
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_permissions_employees_index(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_employees_index()
+
+
 class DisciplinaryRegulations(models.Model):
     article = models.CharField(max_length=10, verbose_name='Пункт')
     title = models.CharField(max_length=255, verbose_name='Наименование')
@@ -111,7 +232,7 @@ class DisciplinaryRegulations(models.Model):
         return f'{self.article} {self.title}'
 
 
-class Misconduct(models.Model):
+class Misconduct(FieldTrackerMixin, models.Model):
     class MisconductStatus(models.TextChoices):
         ADDED = 'AD', 'Ожидает объяснение'
         WAIT = 'WT', 'На рассмотрении'
@@ -151,6 +272,8 @@ class Misconduct(models.Model):
         verbose_name='Редактор', blank=True, editable=False
     )
 
+    tracked_fields = ('workshift_date',)
+
     class Meta:
         verbose_name = 'Дисциплинарный проступок'
         verbose_name_plural = 'Дисциплинарные проступки'
@@ -163,7 +286,7 @@ class Misconduct(models.Model):
         return reverse_lazy('misconduct_detail', kwargs={'slug': self.slug})
 
 
-class WorkingShift(models.Model):
+class WorkingShift(FieldTrackerMixin, models.Model):
     class WorkshiftStatus(models.TextChoices):
         NOT_CONFIRMED = 'NOT_CONFIRMED', 'Не подтверждена'
         UNVERIFIED = 'UVD', 'Не проверена'
@@ -301,28 +424,70 @@ class WorkingShift(models.Model):
         )
 
 
+    def get_snapshot_earnings(self) -> ShiftEarnings | None:
+        """
+        Returns ShiftEarnings from the earnings snapshots
+        or None if snapshots are not saved.
+        """
+        if not self.pk:
+            return None
+        snapshots = {
+            snapshot.role: snapshot
+            for snapshot in self.earnings_snapshots.all()
+        }
+        try:
+            return ShiftEarnings(
+                hall_admin=snapshots[
+                    EarningsSnapshot.Role.HALL_ADMIN].get_earnings(),
+                cashier=snapshots[
+                    EarningsSnapshot.Role.CASHIER].get_earnings(),
+            )
+        except KeyError:
+            return None
+
+    def get_shift_earnings(self) -> ShiftEarnings:
+        """
+        Returns ShiftEarnings from the earnings snapshots, missing snapshots
+        are calculated and saved.
+        """
+        shift_earnings = getattr(self, '_shift_earnings', None)
+        if shift_earnings is None:
+            shift_earnings = self.get_snapshot_earnings()
+        if shift_earnings is None and self.pk:
+            shift_earnings = EarningsSnapshot.refresh_for_workshifts(
+                [self]).get(self.pk)
+        if shift_earnings is None:
+            shift_earnings = get_batch_earnings([self])[None]
+        self._shift_earnings = shift_earnings
+        return shift_earnings
+
     @property
     def hall_admin_earnings(self):
-        workshift_data = self.get_workshift_data()
-        employee = self.hall_admin
-        return get_current_earnings(employee, workshift_data)
-
+        return self.get_shift_earnings().hall_admin
 
     @property
     def cashier_earnings(self):
-        workshift_data = self.get_workshift_data()
-        employee = self.cash_admin
-        return get_current_earnings(employee, workshift_data, is_cashier=True)
+        return self.get_shift_earnings().cashier
 
     def get_absolute_url(self):
         return reverse_lazy('detail_workshift', kwargs={'slug': self.slug})
 
-    def save(self, *args, **kwargs):
-        self.slug = self.shift_date
-        self.game_zone_error = get_errors_sum(
-            ErrorKNA.objects.filter(workshift__id=self.pk))
-        self.cost_sum = get_costs_sum(
-            Cost.objects.filter(workshift__id=self.pk))
+    revenue_fields = (
+        'bar_revenue', 'game_zone_revenue', 'additional_services_revenue',
+        'hookah_revenue'
+    )
+    penalty_fields = ('shift_date', 'cash_admin_id', 'hall_admin_id')
+    earnings_fields = revenue_fields + penalty_fields + (
+        'hall_cleaning', 'shortage', 'shortage_paid', 'publication_is_verified'
+    )
+    aggregate_fields = ('game_zone_error', 'cost_sum')
+    # Fields of the monthly employees aggregates sources.
+    report_fields = earnings_fields + aggregate_fields + (
+        'status', 'cash_admin_penalty', 'hall_admin_penalty'
+    )
+    tracked_fields = ('shift_date', 'status')
+
+    def calculate_revenues(self) -> None:
         self.game_zone_subtotal = get_game_zone_subtotal(
             self.game_zone_revenue, self.game_zone_error)
         self.summary_revenue = get_total_revenue(
@@ -330,31 +495,527 @@ class WorkingShift(models.Model):
             self.additional_services_revenue, self.hookah_revenue
         )
 
+    def calculate_penalties(self) -> None:
         current_penalties = get_workshift_penalties(
             misconduct_queryset=Misconduct.objects.filter(
                 workshift_date=self.shift_date,
                 status=Misconduct.MisconductStatus.CLOSED,
             ),
-            cash_admin_id=self.cash_admin.pk,
-            hall_admin_id=self.hall_admin.pk
+            cash_admin_id=self.cash_admin_id,
+            hall_admin_id=self.hall_admin_id
         )
         self.cash_admin_penalty = current_penalties.cash_admin_penalty
         self.hall_admin_penalty = current_penalties.hall_admin_penalty
 
-        super().save(*args, **kwargs)
+    def refresh_earnings_snapshots(self) -> None:
+        """Saves actual earnings snapshots of the workshift"""
+        employees_is_cached = all((
+            WorkingShift.hall_admin.is_cached(self),
+            WorkingShift.cash_admin.is_cached(self),
+        )) and all(
+            User.profile.is_cached(employee)
+            and Profile.position.is_cached(employee.profile)
+            for employee in (self.hall_admin, self.cash_admin)
+        )
+        if not employees_is_cached:
+            employees = User.objects.select_related(
+                'profile__position').in_bulk(
+                    {self.hall_admin_id, self.cash_admin_id})
+            self.hall_admin = employees[self.hall_admin_id]
+            self.cash_admin = employees[self.cash_admin_id]
+        self._shift_earnings = EarningsSnapshot.refresh_for_workshifts(
+            [self]).get(self.pk)
+
+    def refresh_aggregates(self) -> None:
+        """Recalculates sums of errors and costs from the database"""
+        self.game_zone_error = get_errors_sum(
+            ErrorKNA.objects.filter(workshift__id=self.pk))
+        self.cost_sum = get_costs_sum(
+            Cost.objects.filter(workshift__id=self.pk))
+        self.calculate_revenues()
+        with transaction.atomic():
+            super().save(update_fields=(
+                *self.aggregate_fields, 'game_zone_subtotal',
+                'summary_revenue'
+            ))
+            self.refresh_earnings_snapshots()
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the workshift and recalculates only values whose inputs
+        are changed. Sums of errors and costs are maintained by ErrorKNA
+        and Cost changes and never overwritten here.
+        """
+        self.slug = self.shift_date
+        is_adding = self._state.adding
+        self.load_original_values()
+        changed_fields = self.get_changed_fields(self.earnings_fields)
+        update_fields = {
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key
+        } - set(self.aggregate_fields)
+
+        if changed_fields.intersection(self.revenue_fields):
+            if not is_adding:
+                self.refresh_from_db(fields=self.aggregate_fields)
+            self.calculate_revenues()
+        else:
+            update_fields -= {'game_zone_subtotal', 'summary_revenue'}
+
+        if changed_fields.intersection(self.penalty_fields):
+            previous_penalties = (self.cash_admin_penalty,
+                                  self.hall_admin_penalty)
+            self.calculate_penalties()
+            if previous_penalties != (self.cash_admin_penalty,
+                                      self.hall_admin_penalty):
+                changed_fields.add('penalty')
+        else:
+            update_fields -= {'cash_admin_penalty', 'hall_admin_penalty'}
+
+        if not is_adding and 'update_fields' not in kwargs:
+            kwargs['update_fields'] = update_fields
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if changed_fields:
+                self.refresh_earnings_snapshots()
+
+    def update_penalties(self) -> None:
+        """Recalculates penalties from misconducts and saves it if changed"""
+        previous_penalties = (self.cash_admin_penalty, self.hall_admin_penalty)
+        self.calculate_penalties()
+        if previous_penalties == (self.cash_admin_penalty,
+                                  self.hall_admin_penalty):
+            return
+        with transaction.atomic():
+            super().save(
+                update_fields=('cash_admin_penalty', 'hall_admin_penalty'))
+            self.refresh_earnings_snapshots()
+
+    @classmethod
+    def apply_aggregates_delta(cls, workshift_id: int,
+                               errors_delta: float = 0.0,
+                               costs_delta: float = 0.0) -> None:
+        """
+        Applies changes of errors and costs sums to the workshift
+        with the single update query.
+        """
+        update_values = dict()
+        if errors_delta:
+            game_zone_error = models.F('game_zone_error') + errors_delta
+            game_zone_subtotal = models.Case(
+                models.When(
+                    game_zone_revenue__gte=game_zone_error,
+                    then=Round(
+                        models.F('game_zone_revenue') - game_zone_error, 2)
+                ),
+                default=models.Value(0.0),
+                output_field=models.FloatField()
+            )
+            update_values['summary_revenue'] = (
+                models.F('bar_revenue') + game_zone_subtotal
+                + models.F('additional_services_revenue')
+                + models.F('hookah_revenue')
+            )
+            update_values['game_zone_subtotal'] = game_zone_subtotal
+        if costs_delta:
+            update_values['cost_sum'] = models.F('cost_sum') + costs_delta
+        if errors_delta:
+            # The error column is assigned last, because MySQL evaluates
+            # assignments from left to right.
+            update_values['game_zone_error'] = game_zone_error
+        if not update_values:
+            return
+
+        with transaction.atomic():
+            cls.objects.filter(pk=workshift_id).update(**update_values)
+            if errors_delta:
+                EarningsSnapshot.objects.filter(
+                    workshift_id=workshift_id).delete()
+        if errors_delta:
+            shift_date = cls.objects.filter(pk=workshift_id).values_list(
+                'shift_date', flat=True).first()
+            if shift_date:
+                invalidate_workshifts_month(shift_date)
+                MonthlyEmployeeAggregate.invalidate_month(shift_date)
+
+
+@receiver(post_save, sender=WorkingShift)
+@receiver(post_delete, sender=WorkingShift)
+def invalidate_workshift_month_cache(sender, instance, created=None,
+                                     **kwargs):
+    shift_dates = {instance.shift_date}
+    is_verified = instance.status == WorkingShift.WorkshiftStatus.VERIFIED
+    loaded_values = getattr(instance, '_loaded_values', None)
+    if loaded_values:
+        # Original values of the tracked fields are loaded before saving.
+        shift_dates.add(loaded_values.get('shift_date', instance.shift_date))
+        is_verified |= (
+            loaded_values.get('status') == WorkingShift.WorkshiftStatus.VERIFIED
+        )
+    # Deleted or new workshift changes reports whatever fields it has.
+    is_report_changed = created is not False or bool(
+        instance.get_changed_fields(WorkingShift.report_fields))
+    for shift_date in shift_dates:
+        invalidate_workshifts_month(shift_date)
+        if is_verified and is_report_changed:
+            MonthlyEmployeeAggregate.invalidate_month(shift_date)
+
+
+@receiver(post_save, sender=WorkingShift)
+@receiver(post_delete, sender=WorkingShift)
+def invalidate_workshift_dates_cache(sender, instance, created=None,
+                                     **kwargs):
+    if created is False and not instance.get_changed_fields(('shift_date',)):
+        return
+    invalidate_workshift_dates()
+    clear_request_memo()
+
+
+def recalculate_workshifts_penalties(shift_dates: set[datetime.date]) -> None:
+    for workshift in WorkingShift.objects.filter(shift_date__in=shift_dates):
+        workshift.update_penalties()
+
+
+penalties_recalculation_queue = RecalculationQueue(
+    'workshift penalties', recalculate_workshifts_penalties
+)
 
 
 @receiver(post_save, sender=Misconduct)
 @receiver(post_delete, sender=Misconduct)
 def run_calculating_penalties(sender, instance, created=None, **kwargs):
-    workshift_queryset = WorkingShift.objects.filter(
-            shift_date=instance.workshift_date
-    ).first()
-    if workshift_queryset:
-        workshift_queryset.save()
+    shift_dates = {instance.workshift_date}
+    loaded_values = getattr(instance, '_loaded_values', None)
+    if loaded_values:
+        # Original values of the tracked fields are loaded before saving.
+        shift_dates.add(
+            loaded_values.get('workshift_date', instance.workshift_date))
+    penalties_recalculation_queue.add(*shift_dates)
+
+
+class EarningsSnapshot(models.Model):
+    class Role(models.TextChoices):
+        HALL_ADMIN = 'HA', 'Администратор зала'
+        CASHIER = 'CSH', 'Администратор кассы'
+
+    workshift = models.ForeignKey(
+        WorkingShift, on_delete=models.CASCADE,
+        related_name='earnings_snapshots', verbose_name='Смена'
+    )
+    employee = models.ForeignKey(
+        User, on_delete=models.PROTECT,
+        related_name='earnings_snapshots', verbose_name='Сотрудник'
+    )
+    role = models.CharField(
+        max_length=10, choices=Role.choices, verbose_name='Роль на смене'
+    )
+    salary = models.FloatField(verbose_name='Оклад', default=0.0)
+    experience = models.FloatField(
+        verbose_name='Надбавка за стаж', default=0.0
+    )
+    attestation = models.FloatField(
+        verbose_name='Надбавка за аттестацию', default=0.0
+    )
+    basic_part = models.FloatField(
+        verbose_name='Окладная часть', default=0.0
+    )
+    award = models.FloatField(
+        verbose_name='Премия за дисциплину', default=0.0
+    )
+    bar_percent = models.FloatField(
+        verbose_name='Процент от выручки по бару', default=0.0
+    )
+    bar_value = models.FloatField(
+        verbose_name='Бонус от выручки по бару', default=0.0
+    )
+    game_zone_percent = models.FloatField(
+        verbose_name='Процент от выручки игровой зоны', default=0.0
+    )
+    game_zone_value = models.FloatField(
+        verbose_name='Бонус от выручки игровой зоны', default=0.0
+    )
+    additional_services_percent = models.FloatField(
+        verbose_name='Процент от выручки доп. услуг', default=0.0
+    )
+    additional_services_value = models.FloatField(
+        verbose_name='Бонус от выручки доп. услуг', default=0.0
+    )
+    revenues_summary = models.FloatField(
+        verbose_name='Бонус от выручки', default=0.0
+    )
+    publication = models.FloatField(
+        verbose_name='Бонус за публикацию', default=0.0
+    )
+    cleaning = models.FloatField(
+        verbose_name='Бонус за наведение порядка', default=0.0
+    )
+    hookah_percent = models.FloatField(
+        verbose_name='Процент от выручки по кальянам', default=0.0
+    )
+    hookah_value = models.FloatField(
+        verbose_name='Бонус от выручки по кальянам', default=0.0
+    )
+    bonus_part = models.FloatField(
+        verbose_name='Бонусная часть', default=0.0
+    )
+    penalty = models.FloatField(verbose_name='Штраф', default=0.0)
+    shortage = models.FloatField(verbose_name='Недостача', default=0.0)
+    retention = models.FloatField(verbose_name='Удержано', default=0.0)
+    estimated_earnings = models.FloatField(
+        verbose_name='Расчётный заработок', default=0.0
+    )
+    before_shortage = models.FloatField(
+        verbose_name='Заработок до вычета недостачи', default=0.0
+    )
+    final_earnings = models.FloatField(
+        verbose_name='Итоговый заработок', default=0.0
+    )
+    calculation_date = models.DateTimeField(
+        verbose_name='Дата расчёта', auto_now=True
+    )
 
+    class Meta:
+        verbose_name = 'Расчёт заработка за смену'
+        verbose_name_plural = 'Расчёты заработка за смены'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('workshift', 'role'),
+                name='unique_workshift_role_earnings'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.workshift} {self.get_role_display()}'
 
-class Position(models.Model):
+    def get_earnings(self) -> Earnings:
+        return Earnings(
+            basic_part=BasicPart(
+                salary=self.salary,
+                experience=self.experience,
+                attestation=self.attestation,
+                summary=self.basic_part
+            ),
+            bonus_part=BonusPart(
+                award=self.award,
+                revenues=Revenues(
+                    bar=PercentValue(self.bar_percent, self.bar_value),
+                    game_zone=PercentValue(self.game_zone_percent,
+                                           self.game_zone_value),
+                    additional_services=PercentValue(
+                        self.additional_services_percent,
+                        self.additional_services_value
+                    ),
+                    summary=self.revenues_summary
+                ),
+                publication=self.publication,
+                cleaning=self.cleaning,
+                hookah=PercentValue(self.hookah_percent, self.hookah_value),
+                summary=self.bonus_part
+            ),
+            penalty=self.penalty,
+            shortage=self.shortage,
+            retention=self.retention,
+            estimated_earnings=self.estimated_earnings,
+            before_shortage=self.before_shortage,
+            final_earnings=self.final_earnings
+        )
+
+    @classmethod
+    def from_earnings(cls, workshift_id: int, employee_id: int, role: str,
+                      earnings: Earnings) -> 'EarningsSnapshot':
+        revenues = earnings.bonus_part.revenues
+        return cls(
+            workshift_id=workshift_id,
+            employee_id=employee_id,
+            role=role,
+            salary=earnings.basic_part.salary,
+            experience=earnings.basic_part.experience,
+            attestation=earnings.basic_part.attestation,
+            basic_part=earnings.basic_part.summary,
+            award=earnings.bonus_part.award,
+            bar_percent=revenues.bar.percent,
+            bar_value=revenues.bar.value,
+            game_zone_percent=revenues.game_zone.percent,
+            game_zone_value=revenues.game_zone.value,
+            additional_services_percent=revenues.additional_services.percent,
+            additional_services_value=revenues.additional_services.value,
+            revenues_summary=revenues.summary,
+            publication=earnings.bonus_part.publication,
+            cleaning=earnings.bonus_part.cleaning,
+            hookah_percent=earnings.bonus_part.hookah.percent,
+            hookah_value=earnings.bonus_part.hookah.value,
+            bonus_part=earnings.bonus_part.summary,
+            penalty=earnings.penalty,
+            shortage=earnings.shortage,
+            retention=earnings.retention,
+            estimated_earnings=earnings.estimated_earnings,
+            before_shortage=earnings.before_shortage,
+            final_earnings=earnings.final_earnings
+        )
+
+    @classmethod
+    def refresh_for_workshifts(
+            cls, workshifts: list[WorkingShift]) -> dict[int, ShiftEarnings]:
+        """
+        Calculates earnings of the workshifts and upserts its snapshots,
+        so concurrent refreshes of the same workshifts don't conflict.
+        Returns dict with ShiftEarnings by workshift pk.
+        """
+        earnings_dict = get_batch_earnings(workshifts)
+        snapshots_list = []
+        for workshift in workshifts:
+            shift_earnings = earnings_dict[workshift.pk]
+            snapshots_list.extend((
+                cls.from_earnings(workshift.pk, workshift.hall_admin_id,
+                                  cls.Role.HALL_ADMIN,
+                                  shift_earnings.hall_admin),
+                cls.from_earnings(workshift.pk, workshift.cash_admin_id,
+                                  cls.Role.CASHIER, shift_earnings.cashier),
+            ))
+        cls.objects.bulk_create(
+            snapshots_list, update_conflicts=True,
+            unique_fields=get_upsert_unique_fields(['workshift_id', 'role']),
+            update_fields=[
+                field.attname for field in cls._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in ('workshift_id', 'role')
+            ]
+        )
+        return earnings_dict
+
+
+class MonthlyEmployeeAggregate(models.Model):
+    Role = EarningsSnapshot.Role
+
+    employee = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='monthly_aggregates', verbose_name='Сотрудник'
+    )
+    role = models.CharField(
+        max_length=10, choices=Role.choices, verbose_name='Роль на сменах'
+    )
+    year = models.PositiveSmallIntegerField(verbose_name='Год')
+    month = models.PositiveSmallIntegerField(verbose_name='Месяц')
+    order_number = models.PositiveSmallIntegerField(
+        verbose_name='Порядковый номер', default=0
+    )
+    shift_counter = models.PositiveSmallIntegerField(
+        verbose_name='Количество смен', default=0
+    )
+    basic_revenues = models.FloatField(
+        verbose_name='Сумма окладных частей', default=0.0
+    )
+    bonus_revenues = models.FloatField(
+        verbose_name='Сумма бонусных частей', default=0.0
+    )
+    shortage = models.FloatField(verbose_name='Недостачи', default=0.0)
+    penalty = models.FloatField(verbose_name='Штрафы', default=0.0)
+    average_revenue = models.FloatField(
+        verbose_name='Средняя выручка', default=0.0
+    )
+    summary_bar_revenue = models.FloatField(
+        verbose_name='Выручка по бару', default=0.0
+    )
+    average_bar_revenue = models.FloatField(
+        verbose_name='Средняя выручка по бару', default=0.0
+    )
+    summary_hookah_revenue = models.FloatField(
+        verbose_name='Выручка по кальянам', default=0.0
+    )
+    average_hookah_revenue = models.FloatField(
+        verbose_name='Средняя выручка по кальянам', default=0.0
+    )
+
+    class Meta:
+        ordering = ['order_number']
+        verbose_name = 'Итоги сотрудника за месяц'
+        verbose_name_plural = 'Итоги сотрудников за месяц'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('employee', 'role', 'year', 'month'),
+                name='unique_employee_role_month_aggregate'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=('year', 'month')),
+        ]
+
+    def __str__(self) -> str:
+        return (f'{self.employee} {self.get_role_display()} '
+                f'{self.month}.{self.year}')
+
+    @classmethod
+    def invalidate_month(cls, date: datetime.date) -> None:
+        """Removes aggregates of the month, they are rebuilt on reading"""
+        cls.objects.filter(year=date.year, month=date.month).delete()
+
+    @classmethod
+    def invalidate_employees_months(cls, employees_filter: models.Q) -> None:
+        """Removes aggregates of the months with the filtered employees"""
+        months_filter = models.Q()
+        months = cls.objects.filter(employees_filter).order_by().values_list(
+            'year', 'month').distinct()
+        for year, month in months:
+            months_filter |= models.Q(year=year, month=month)
+        if months_filter:
+            cls.objects.filter(months_filter).delete()
+
+
+class PlannedShift(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='planned_shifts', verbose_name='Сотрудник'
+    )
+    date = models.DateField(verbose_name='Дата смены')
+
+    class Meta:
+        ordering = ['date']
+        verbose_name = 'Запланированная смена'
+        verbose_name_plural = 'График смен'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'date'), name='unique_user_planned_shift'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=('date',)),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.date} {self.user.get_full_name()}'
+
+
+class WorksheetCopy(models.Model):
+    name = models.CharField(
+        max_length=30, unique=True, verbose_name='Название листа'
+    )
+    data = models.JSONField(verbose_name='Данные листа', default=list)
+    updated_at = models.DateTimeField(
+        verbose_name='Дата обновления', auto_now=True
+    )
+
+    class Meta:
+        verbose_name = 'Копия листа графика'
+        verbose_name_plural = 'Копии листов графика'
+
+    def __str__(self) -> str:
+        return self.name
+
+    @classmethod
+    def save_worksheets(cls, worksheets_data: dict[str, list]) -> None:
+        """Saves the last known data of the worksheets"""
+        cls.objects.bulk_create(
+            [
+                cls(name=name, data=data)
+                for name, data in worksheets_data.items()
+            ],
+            update_conflicts=True,
+            unique_fields=get_upsert_unique_fields(['name']),
+            update_fields=['data', 'updated_at']
+        )
+
+
+class Position(FieldTrackerMixin, models.Model):
     title = models.CharField(max_length=255)
     name = models.CharField(max_length=60)
     position_salary = models.FloatField(default=0.0)
@@ -367,17 +1028,60 @@ class Position(models.Model):
         return self.title
 
 
+@receiver(post_save, sender=Profile)
+def invalidate_profile_earnings(sender, instance, created, **kwargs):
+    """Removes earnings snapshots if employee basic part values changed"""
+    if not created and instance.get_changed_fields(Profile.earnings_fields):
+        EarningsSnapshot.objects.filter(employee_id=instance.user_id).delete()
+        MonthlyEmployeeAggregate.invalidate_employees_months(
+            models.Q(employee_id=instance.user_id))
+        invalidate_earnings()
+
+
+@receiver(post_save, sender=Position)
+def invalidate_position_earnings(sender, instance, created, **kwargs):
+    """Removes earnings snapshots of employees if position salary changed"""
+    if not created and instance.get_changed_fields(('position_salary',)):
+        EarningsSnapshot.objects.filter(
+            employee__profile__position=instance).delete()
+        MonthlyEmployeeAggregate.invalidate_employees_months(
+            models.Q(employee__profile__position=instance))
+        invalidate_earnings()
+
+
+@receiver(post_save, sender=Position)
+def invalidate_position_employees_index(sender, instance, created, **kwargs):
+    if not created and instance.get_changed_fields(('name',)):
+        invalidate_employees_index()
+
+
 class Chat(models.Model):
-    members = models.ManyToManyField(User, verbose_name='Участники')
+    members = models.ManyToManyField(
+        User, through='ChatMember', verbose_name='Участники')
     slug = models.SlugField(
         max_length=60, unique=True, verbose_name='URL', null=True, blank=True
     )
+    # Members of the direct chat ordered by id, empty for other chats.
+    low_user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', verbose_name='Участник с меньшим id'
+    )
+    high_user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', verbose_name='Участник с большим id'
+    )
 
     class Meta:
         verbose_name = 'Chat'
         permissions = [
             ("can_create_new_chats", "Can create new chats"),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=('low_user', 'high_user'),
+                name='unique_direct_chat_members'
+            ),
+        ]
 
     def save(self, *args, **kwargs) -> None:
         super().save(*args, **kwargs)
@@ -401,15 +1105,66 @@ class Message(models.Model):
     sending_time = models.DateTimeField(
         verbose_name='Время отправления', auto_now_add=True
     )
-    is_read = models.BooleanField(
-        verbose_name='Отметка о прочтении', default=False
-    )
 
     class Meta:
         verbose_name = 'Message'
+        indexes = [
+            models.Index(
+                fields=['chat', 'sending_time', 'id'],
+                name='message_chat_time_idx'
+            ),
+        ]
+
 
+class ChatMember(models.Model):
+    chat = models.ForeignKey(
+        Chat, on_delete=models.CASCADE, related_name='memberships',
+        verbose_name='Чат'
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='chat_memberships',
+        verbose_name='Участник'
+    )
+    last_read_message_id = models.BigIntegerField(
+        default=0, verbose_name='Последнее прочитанное сообщение'
+    )
 
-class ErrorKNA(models.Model):
+    class Meta:
+        db_table = 'salary_chat_members'
+        verbose_name = 'Участник чата'
+        verbose_name_plural = 'Участники чатов'
+        unique_together = ('chat', 'user')
+
+    def __str__(self) -> str:
+        return f'{self.chat} {self.user}'
+
+
+class ArchivedMessage(models.Model):
+    """Old chat message moved from Message table with the same id"""
+    id = models.BigIntegerField(primary_key=True, verbose_name='ID')
+    chat = models.ForeignKey(
+        Chat, on_delete=models.CASCADE, related_name='archived_messages',
+        verbose_name='Чат'
+    )
+    message_text = models.TextField(verbose_name='Текст сообщения')
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+',
+        verbose_name='Автор'
+    )
+    sending_time = models.DateTimeField(verbose_name='Время отправления')
+
+    class Meta:
+        verbose_name = 'Архивное сообщение'
+        verbose_name_plural = 'Архивные сообщения'
+        indexes = [
+            models.Index(
+                fields=['chat', 'sending_time', 'id'],
+                name='archived_message_chat_time_idx'
+            ),
+        ]
+
+
+class ErrorKNA(FieldTrackerMixin, models.Model):
     class ErrorType(models.TextChoices):
         KNA = 'KNA', 'Ошибка по КНА'
         GRILL = 'GRILL', 'Гриль'
@@ -427,7 +1182,7 @@ class ErrorKNA(models.Model):
                                   related_name='errors')
 
 
-class Cost(models.Model):
+class Cost(FieldTrackerMixin, models.Model):
     cost_sum = models.FloatField(verbose_name='Сумма расхода', default=0.0)
     cost_reason = models.CharField(max_length=255, verbose_name='Причина')
     cost_person = models.ForeignKey(User, on_delete=models.PROTECT,
@@ -446,3 +1201,101 @@ class CabinError(models.Model):
                                       verbose_name='Ошибочное время')
     workshift = models.ForeignKey(WorkingShift, on_delete=models.CASCADE,
                                   related_name='cabin_error')
+
+
+def _get_sum_changes(instance: ErrorKNA | Cost, sum_field: str,
+                     is_deleted: bool = False) -> dict[int, float | None]:
+    """
+    Returns dict with changes of the workshifts sums by workshift id.
+    The change is None if the previous value of the deferred field
+    is unknown and the sum has to be recalculated.
+    """
+    if is_deleted:
+        loaded_values = getattr(instance, '_loaded_values', None) or {
+            'workshift_id': instance.workshift_id,
+            sum_field: getattr(instance, sum_field)
+        }
+        if 'workshift_id' not in loaded_values:
+            return dict()
+        return {loaded_values['workshift_id']: (
+            -loaded_values[sum_field] if sum_field in loaded_values else None
+        )}
+
+    # Access loads the deferred fields and remembers their values.
+    workshift_id = instance.workshift_id
+    current_sum = getattr(instance, sum_field)
+    loaded_values = getattr(instance, '_loaded_values', None)
+    sum_changes = dict()
+    if loaded_values is not None:
+        sum_changes[loaded_values.get('workshift_id', workshift_id)] = (
+            -loaded_values[sum_field] if sum_field in loaded_values
+            else None
+        )
+    previous_change = sum_changes.get(workshift_id, 0.0)
+    if previous_change is not None:
+        sum_changes[workshift_id] = previous_change + current_sum
+    return sum_changes
+
+
+def _apply_sum_changes(sum_changes: dict[int, float | None],
+                       delta_name: str) -> None:
+    for workshift_id, delta in sum_changes.items():
+        if delta is not None:
+            WorkingShift.apply_aggregates_delta(
+                workshift_id, **{delta_name: delta})
+            continue
+        workshift = WorkingShift.objects.filter(pk=workshift_id).first()
+        if workshift is not None:
+            workshift.refresh_aggregates()
+
+
+@receiver(post_save, sender=ErrorKNA)
+@receiver(post_delete, sender=ErrorKNA)
+def update_workshift_errors_sum(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, WorkingShift):
+        return
+    is_deleted = kwargs.get('signal') is post_delete
+    sum_changes = _get_sum_changes(instance, 'error_sum', is_deleted)
+    _apply_sum_changes(sum_changes, 'errors_delta')
+
+
+@receiver(post_save, sender=Cost)
+@receiver(post_delete, sender=Cost)
+def update_workshift_costs_sum(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, WorkingShift):
+        return
+    is_deleted = kwargs.get('signal') is post_delete
+    sum_changes = _get_sum_changes(instance, 'cost_sum', is_deleted)
+    _apply_sum_changes(sum_changes, 'costs_delta')
+
+
+@receiver(post_save, sender=WorkingShift)
+@receiver(post_delete, sender=WorkingShift)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=Misconduct)
+@receiver(post_delete, sender=Misconduct)
+def invalidate_staff_counters_cache(sender, **kwargs):
+    invalidate_staff_counters()
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+@receiver(post_save, sender=ChatMember)
+@receiver(post_delete, sender=ChatMember)
+@receiver(m2m_changed, sender=Chat.members.through)
+def invalidate_messages_counters_cache(sender, action=None, **kwargs):
+    if action and not action.startswith('post_'):
+        return
+    invalidate_messages_counters()
+
+
+@receiver(post_save, sender=Message)
+def notify_chat_members(sender, instance, created, **kwargs):
+    """Wakes up waiting messenger requests of the chat members"""
+    if not created:
+        return
+    transaction.on_commit(lambda: message_hub.notify(
+        ChatMember.objects.filter(chat_id=instance.chat_id).values_list(
+            'user_id', flat=True)
+    ))
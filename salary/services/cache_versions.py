@@ -0,0 +1,79 @@
+import datetime
+import logging
+import time
+
+from django.core.cache import cache
+
+
+EARNINGS_VERSION_KEY = 'earnings_version'
+WORKSHIFT_DATES_VERSION_KEY = 'workshift_dates_version'
+STAFF_COUNTERS_VERSION_KEY = 'staff_counters_version'
+MESSAGES_VERSION_KEY = 'messages_version'
+
+
+logger = logging.getLogger(__name__)
+
+
+def _get_initial_version() -> int:
+    """
+    Returns initial version value which is greater than the previous one,
+    even if the version key was evicted from the cache.
+    """
+    return int(time.time() * 1000)
+
+
+def get_cache_version(version_key: str) -> int:
+    """Returns current version value for the version key"""
+    version = cache.get(version_key)
+    if version is None:
+        version = _get_initial_version()
+        if not cache.add(version_key, version, None):
+            version = cache.get(version_key, version)
+    return version
+
+
+def bump_cache_version(version_key: str) -> None:
+    """Makes outdated all cache values depending on the version key"""
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.set(version_key, _get_initial_version(), None)
+    logger.debug(f'Cache version {version_key} is bumped.')
+
+
+def get_versioned_key(key: str, *version_keys: str) -> str:
+    """Returns cache key which includes versions of all version keys"""
+    versions = '_'.join(
+        str(get_cache_version(version_key)) for version_key in version_keys
+    )
+    return f'{key}_v{versions}'
+
+
+def get_month_version_key(year: int, month: int) -> str:
+    return f'workshifts_version_{year}_{month}'
+
+
+def invalidate_workshifts_month(shift_date: datetime.date) -> None:
+    """Makes outdated cached data of the workshifts month"""
+    bump_cache_version(get_month_version_key(shift_date.year,
+                                             shift_date.month))
+
+
+def invalidate_earnings() -> None:
+    """Makes outdated cached data depending on any employees earnings"""
+    bump_cache_version(EARNINGS_VERSION_KEY)
+
+
+def invalidate_workshift_dates() -> None:
+    """Makes outdated cached data depending on dates of existing workshifts"""
+    bump_cache_version(WORKSHIFT_DATES_VERSION_KEY)
+
+
+def invalidate_staff_counters() -> None:
+    """Makes outdated cached numbers of the staff badges"""
+    bump_cache_version(STAFF_COUNTERS_VERSION_KEY)
+
+
+def invalidate_messages_counters() -> None:
+    """Makes outdated cached numbers of unread messages"""
+    bump_cache_version(MESSAGES_VERSION_KEY)
@@ -1,67 +1,70 @@
+import datetime
 import logging
 from typing import List, Optional, NamedTuple
 
-from django.db.models import QuerySet
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet, Count, F, Max, OuterRef, Q, Subquery
 from django.http import HttpRequest
+from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 
 from salary.models import *
-from salary.services.profile_services import profile_photo_is_exists
+from salary.services.cache_versions import invalidate_messages_counters
 
 
 class Dialog(NamedTuple):
-    member: User
+    member_id: int
+    full_name: str
     photo: str | None
     unread_messages_count: int
     is_selected: bool
     slug: str
+    last_message_time: datetime.datetime | None
 
 
-chat_logger = logging.getLogger(__name__)
-
+class MessageCursor(NamedTuple):
+    sending_time: datetime.datetime
+    id: int
 
-def get_user_chats_list(user_id: int) -> QuerySet:
-    """Return queryset of user chat's
 
-    Args:
-        user_id (int): User id
+class MessagesPage(NamedTuple):
+    messages: list[Message]
+    older_cursor: str | None
+    newest_cursor: str | None
 
-    Returns:
-        QuerySet: models.Chat QuerySet
-    """
 
-    return User.objects.get(pk=user_id).chat_set.all()
+CURSOR_TIME_FORMAT = '%Y%m%d%H%M%S%f'
 
 
-def get_chat_info(chat, user_id: int,
-                  is_selected: bool = False) -> Optional[Dialog]:
-    """Return dialog information for user_id interlocutor
+chat_logger = logging.getLogger(__name__)
 
-    Args:
-        chat (QuerySet): Chat
-        user_id (int): _description_
 
-    Returns:
-        Dialog: named tuple
+def get_user_chats_queryset(user_id: int) -> QuerySet:
+    """Returns user chats annotated with the interlocutor data,
+    the number of unread messages and the last message time.
     """
-    if chat.members.count() > 1:
-        member=chat.members.exclude(
-            id=user_id).select_related('profile').last()
-        unread_messages_count=chat.chat.filter(author=member,
-                                               is_read=False).count()
-        photo_is_exists = profile_photo_is_exists(member.profile)
-        return Dialog(
-            member=member,
-            photo=member.profile.photo.url if photo_is_exists else None,
-            unread_messages_count=unread_messages_count,
-            is_selected=is_selected,
-            slug=chat.slug,
-        )
-    else:
-        chat_logger.error(f'Too little users in chat {chat.id}. Delete this.')
-
-    return None
+    interlocutor_subquery = ChatMember.objects.filter(
+        chat_id=OuterRef('pk')).exclude(user_id=user_id).order_by('-user_id')
+    interlocutor_user = User.objects.filter(pk=OuterRef('interlocutor_id'))
+    interlocutor_profile = Profile.objects.filter(
+        pk=OuterRef('interlocutor_id'))
+
+    return Chat.objects.filter(memberships__user_id=user_id).annotate(
+        interlocutor_id=Subquery(interlocutor_subquery.values('user_id')[:1]),
+    ).exclude(interlocutor_id=None).annotate(
+        interlocutor_last_name=Subquery(
+            interlocutor_user.values('last_name')[:1]),
+        interlocutor_first_name=Subquery(
+            interlocutor_user.values('first_name')[:1]),
+        interlocutor_photo=Subquery(
+            interlocutor_profile.filter(has_photo=True).values('photo')[:1]),
+        unread_messages_count=Count('chat', filter=Q(
+            chat__id__gt=F('memberships__last_read_message_id'))
+            & ~Q(chat__author_id=user_id)),
+        last_message_time=Max('chat__sending_time'),
+    ).order_by(F('last_message_time').desc(nulls_last=True), '-pk')
 
 
 def get_chats_list(user_id: int, selected_slug: str = '') -> List[Dialog]:
@@ -74,33 +77,129 @@ def get_chats_list(user_id: int, selected_slug: str = '') -> List[Dialog]:
     Returns:
         List[Dialog]: list of Dialog
     """
-    chats_list = []
-    for chat in get_user_chats_list(user_id):
-        is_selected = False
-        if selected_slug and selected_slug == chat.slug:
-            is_selected = True
-        dialog = get_chat_info(chat, user_id, is_selected)
-        if dialog:
-            chats_list.append(dialog)
+    photo_storage = Profile._meta.get_field('photo').storage
+    return [
+        Dialog(
+            member_id=chat.interlocutor_id,
+            full_name=(
+                f'{chat.interlocutor_last_name} '
+                f'{chat.interlocutor_first_name}'
+            ),
+            photo=(
+                photo_storage.url(chat.interlocutor_photo)
+                if chat.interlocutor_photo else None
+            ),
+            unread_messages_count=chat.unread_messages_count,
+            is_selected=bool(selected_slug) and selected_slug == chat.slug,
+            slug=chat.slug,
+            last_message_time=chat.last_message_time,
+        )
+        for chat in get_user_chats_queryset(user_id)
+    ]
 
-    return chats_list
+
+def get_chat_interlocutor(chat: Chat, user_id: int) -> Optional[User]:
+    """Returns the chat member who is not the user"""
+    interlocutor = chat.members.exclude(
+        id=user_id).select_related('profile').last()
+    if interlocutor is None:
+        chat_logger.error(f'Too little users in chat {chat.id}. Delete this.')
+    return interlocutor
 
 
-def get_messages_list(chat_slug: str) -> QuerySet:
-    """Return dialog messages
+def encode_message_cursor(message: Message) -> str:
+    """Returns cursor string of the message position in the chat"""
+    sending_time = message.sending_time
+    if timezone.is_aware(sending_time):
+        sending_time = sending_time.astimezone(datetime.timezone.utc)
+    return f'{sending_time:{CURSOR_TIME_FORMAT}}_{message.id}'
+
+
+def decode_message_cursor(cursor: str) -> MessageCursor:
+    """Returns MessageCursor from the cursor string or raises ValueError"""
+    sending_time_string, message_id = cursor.split('_')
+    sending_time = datetime.datetime.strptime(sending_time_string,
+                                              CURSOR_TIME_FORMAT)
+    if settings.USE_TZ:
+        sending_time = sending_time.replace(tzinfo=datetime.timezone.utc)
+    return MessageCursor(sending_time=sending_time, id=int(message_id))
+
+
+def _get_chat_messages(
+        chat: Chat,
+        model: type[Message | ArchivedMessage] = Message) -> QuerySet:
+    return model.objects.filter(chat=chat).select_related('author__profile')
+
+
+def get_messages_page(chat: Chat, before: str = '',
+                      size: int | None = None) -> MessagesPage:
+    """Return the latest dialog messages before the cursor
 
     Args:
-        chat_slug (str): Chat model slug field value
+        chat (Chat): Chat model
+        before (str, optional): cursor of the first loaded message.
+        size (int, optional): messages number. Default: CHAT_PAGE_SIZE.
 
     Returns:
-        QuerySet: Message models of the chat
+        MessagesPage: messages in sending order and cursors
     """
+    size = size or settings.CHAT_PAGE_SIZE
+    messages_querysets = [
+        _get_chat_messages(chat, model) for model in (Message, ArchivedMessage)
+    ]
+    if before:
+        cursor = decode_message_cursor(before)
+        messages_querysets = [
+            messages_queryset.filter(
+                Q(sending_time__lt=cursor.sending_time)
+                | Q(sending_time=cursor.sending_time, id__lt=cursor.id)
+            ) for messages_queryset in messages_querysets
+        ]
+    messages = []
+    # Archived messages are read when the older hot messages are over.
+    for messages_queryset in messages_querysets:
+        messages.extend(messages_queryset.order_by('-sending_time', '-id')[
+            :size + 1 - len(messages)])
+        if len(messages) > size:
+            break
+    has_older = len(messages) > size
+    messages = messages[:size][::-1]
+
+    return MessagesPage(
+        messages=messages,
+        older_cursor=(
+            encode_message_cursor(messages[0]) if has_older else None),
+        newest_cursor=(
+            encode_message_cursor(messages[-1]) if messages else None),
+    )
+
+
+def get_new_messages(chat: Chat, after: str,
+                     size: int | None = None) -> list[Message]:
+    """Return dialog messages sent after the cursor in sending order,
+    the first messages of the chat if the cursor is empty.
+    """
+    size = size or settings.CHAT_PAGE_SIZE
+    messages_queryset = _get_chat_messages(chat)
+    if after:
+        cursor = decode_message_cursor(after)
+        messages_queryset = messages_queryset.filter(
+            Q(sending_time__gt=cursor.sending_time)
+            | Q(sending_time=cursor.sending_time, id__gt=cursor.id)
+        )
+    return list(messages_queryset.order_by('sending_time', 'id')[:size])
 
-    messages_queryset = Message.objects.filter(
-        chat__slug=chat_slug
-    ).select_related('author__profile', 'chat').order_by('sending_time')
 
-    return messages_queryset
+def get_message_data(message: Message) -> dict:
+    """Returns message data for JSON response"""
+    return {
+        'id': message.id,
+        'cursor': encode_message_cursor(message),
+        'author_id': message.author_id,
+        'author': message.author.get_full_name(),
+        'message_text': message.message_text,
+        'sending_time': message.sending_time.isoformat(),
+    }
 
 
 def get_acvite_users_list(user_id: int) -> QuerySet:
@@ -114,24 +213,29 @@ def get_acvite_users_list(user_id: int) -> QuerySet:
     return active_users_queryset
 
 
-def members_chat_exists(author: User, recipient: User) -> QuerySet:
-    """Return queryset with Chats of author and recipient
+def get_direct_chat_members_ids(author: User,
+                                recipient: User) -> dict[str, int]:
+    """Returns low_user_id and high_user_id lookups of the direct chat"""
+    low_user_id, high_user_id = sorted((author.pk, recipient.pk))
+    return {'low_user_id': low_user_id, 'high_user_id': high_user_id}
+
+
+def members_chat_exists(author: User, recipient: User) -> Chat | None:
+    """Return direct Chat of author and recipient if exists
 
     Args:
         author (User): author user
         recipient (User): recipient user
 
     Returns:
-        QuerySet: QuerySet of Chats
+        Chat | None: Chat model
     """
-    chat = (Chat.objects.filter(members=author) & 
-            Chat.objects.filter(members=recipient))
-
-    return chat
+    return Chat.objects.filter(
+        **get_direct_chat_members_ids(author, recipient)).first()
 
 
 def get_members_chat(author: User, recipient: User) -> Chat:
-    """Return Chat model
+    """Return direct Chat model, creates it if not exists
 
     Args:
         author (User): Message author
@@ -141,15 +245,18 @@ def get_members_chat(author: User, recipient: User) -> Chat:
         Chat: Chat model
     """
     chat = members_chat_exists(author, recipient)
-
-    if chat and chat.count() == 1:
-        if chat.count() > 1:
-            chat_logger.warning(f'Duplicate chat detected: {author.username} and {recipient.username}')
-        return chat.last()
-    else:
-        chat = Chat.objects.create()
-        chat.members.set((author, recipient))
-        chat.save()
+    if chat:
+        return chat
+
+    with transaction.atomic():
+        chat, is_created = Chat.objects.get_or_create(
+            **get_direct_chat_members_ids(author, recipient))
+        if is_created:
+            chat.members.set((author, recipient))
+            chat_logger.info(
+                f'Chat of {author.username} and {recipient.username} '
+                f'is created.'
+            )
 
     return chat
 
@@ -183,23 +290,35 @@ def add_message_and_return_chat(request: HttpRequest) -> Chat:
     return chat
 
 
-def mark_messages_as_read(messages: QuerySet, user: User) -> None:
-    """Sets the attribute value to true for messages where the user is not the author
+def mark_chat_as_read(chat: Chat, user: User) -> None:
+    """Moves the user read cursor to the last message of the chat
 
     Args:
-        messages (QuerySet): Message QuerySet
+        chat (Chat): Opened chat
         user (User): Recipient of messages
     """
-    for message in messages.exclude(author=user).filter(is_read=False):
-        message.is_read = True
-        message.save()
+    last_message_id = Message.objects.filter(chat=chat).aggregate(
+        last_id=Max('id'))['last_id']
+    if last_message_id is None:
+        return
+    updated_number = ChatMember.objects.filter(
+        chat=chat, user=user, last_read_message_id__lt=last_message_id
+    ).update(last_read_message_id=last_message_id)
+    if updated_number:
+        invalidate_messages_counters()
+
+
+def get_last_read_message_id(chat: Chat, user: User) -> int:
+    """Returns id of the last message read by the user in the chat"""
+    return ChatMember.objects.filter(chat=chat, user=user).values_list(
+        'last_read_message_id', flat=True).first() or 0
 
 
 def get_unread_messages_number(user: User) -> int:
     """
     Returns number of unread messages
     """
-    return Message.objects.select_related('chat').filter(
-        chat__members__in=[user],
-        is_read=False
+    return Message.objects.filter(
+        chat__memberships__user=user,
+        id__gt=F('chat__memberships__last_read_message_id')
     ).exclude(author=user).count()
@@ -0,0 +1,56 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from salary.models import ArchivedMessage, Message
+from salary.services.cache_versions import invalidate_messages_counters
+
+
+logger = logging.getLogger(__name__)
+
+
+def archive_messages(archive_before: datetime.datetime,
+                     batch_size: int | None = None) -> int:
+    """Moves messages sent before the time to ArchivedMessage table
+
+    Args:
+        archive_before (datetime.datetime): sending time of the first kept
+            message.
+        batch_size (int, optional): messages number moved in one
+            transaction. Default: CHAT_ARCHIVE_BATCH_SIZE.
+
+    Returns:
+        int: archived messages number
+    """
+    batch_size = batch_size or settings.CHAT_ARCHIVE_BATCH_SIZE
+    archived_number = 0
+    while True:
+        with transaction.atomic():
+            messages = list(Message.objects.filter(
+                sending_time__lt=archive_before).order_by('id')[:batch_size])
+            if not messages:
+                break
+            ArchivedMessage.objects.bulk_create(
+                [
+                    ArchivedMessage(
+                        id=message.id,
+                        chat_id=message.chat_id,
+                        message_text=message.message_text,
+                        author_id=message.author_id,
+                        sending_time=message.sending_time,
+                    ) for message in messages
+                ]
+            )
+            Message.objects.filter(
+                id__in=[message.id for message in messages]
+            ).delete()
+            # Counters cached by other requests before the commit
+            # are outdated once more after it.
+            transaction.on_commit(invalidate_messages_counters)
+        archived_number += len(messages)
+
+    logger.info(f'{archived_number} messages sent before {archive_before} '
+                f'are archived.')
+    return archived_number
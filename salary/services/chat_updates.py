@@ -0,0 +1,72 @@
+import asyncio
+from typing import NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from salary.models import Chat
+from salary.services.chat import (
+    encode_message_cursor, get_message_data, get_new_messages,
+    mark_chat_as_read
+)
+from salary.services.counters import get_unread_messages_counter
+from salary.services.message_hub import message_hub
+from salary.services.request_memo import clear_request_memo
+
+
+class ChatUpdates(NamedTuple):
+    messages: list[dict]
+    cursor: str
+    unread_messages_count: int
+
+
+def _get_chat_updates(chat: Chat, user: User, after: str) -> ChatUpdates:
+    # The request memo lives for the whole waiting, every check reads
+    # the current counters.
+    clear_request_memo()
+    messages = get_new_messages(chat, after)
+    if messages:
+        mark_chat_as_read(chat, user)
+    return ChatUpdates(
+        messages=[get_message_data(message) for message in messages],
+        cursor=encode_message_cursor(messages[-1]) if messages else after,
+        unread_messages_count=get_unread_messages_counter(user),
+    )
+
+
+async def wait_chat_updates(chat: Chat, user: User, after: str,
+                            unread_messages_count: int | None = None,
+                            timeout: float | None = None) -> ChatUpdates:
+    """Waits for new messages of the chat after the cursor or changes of
+    the user's unread messages number.
+
+    Args:
+        chat (Chat): Chat model
+        user (User): chat member
+        after (str): cursor of the last message shown to the user
+        unread_messages_count (int, optional): number known by the client.
+        timeout (float, optional): Default: CHAT_LONG_POLL_TIMEOUT.
+
+    Returns:
+        ChatUpdates: new messages, the new cursor and unread messages number
+    """
+    timeout = timeout or settings.CHAT_LONG_POLL_TIMEOUT
+    get_chat_updates = sync_to_async(_get_chat_updates)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    # Subscribe before the first check to not miss a message between them.
+    subscription = message_hub.subscribe(user.id)
+    try:
+        while True:
+            chat_updates = await get_chat_updates(chat, user, after)
+            remaining_time = deadline - loop.time()
+            if (chat_updates.messages
+                    or chat_updates.unread_messages_count
+                    != unread_messages_count
+                    or remaining_time <= 0):
+                return chat_updates
+            await subscription.wait(
+                min(remaining_time, settings.CHAT_DB_POLL_INTERVAL))
+    finally:
+        subscription.close()
@@ -0,0 +1,128 @@
+import logging
+import time
+
+from enum import Enum
+from typing import Any, Callable
+
+from django.core.cache import cache
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(Enum):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calls to the failing service after failure_threshold failures
+    in a row for the exponentially growing delay, then lets through a single
+    probe call. The state and metrics are shared by processes in the cache.
+    """
+    metric_names = ('success', 'failure', 'rejected')
+
+    def __init__(self, name: str, failure_exceptions: tuple[type, ...],
+                 failure_threshold: int, base_delay: float,
+                 max_delay: float) -> None:
+        self.name = name
+        self.failure_exceptions = failure_exceptions
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.state_key = f'circuit_{name}_state'
+        self.probe_key = f'circuit_{name}_probe'
+
+    def _get_state_data(self) -> dict:
+        return cache.get(self.state_key) or {
+            'failures': 0, 'opened_until': 0.0
+        }
+
+    def get_state(self) -> CircuitState:
+        state_data = self._get_state_data()
+        if state_data['failures'] < self.failure_threshold:
+            return CircuitState.CLOSED
+        if time.time() < state_data['opened_until']:
+            return CircuitState.OPEN
+        return CircuitState.HALF_OPEN
+
+    def get_retry_time(self) -> float:
+        """Returns timestamp since which calls are let through again"""
+        state_data = self._get_state_data()
+        if state_data['failures'] < self.failure_threshold:
+            return 0.0
+        return state_data['opened_until']
+
+    def _increment_metric(self, metric_name: str) -> None:
+        metric_key = f'circuit_{self.name}_{metric_name}'
+        if not cache.add(metric_key, 1, None):
+            try:
+                cache.incr(metric_key)
+            except ValueError:
+                cache.set(metric_key, 1, None)
+
+    def get_metrics(self) -> dict:
+        """Returns the state and counters of calls"""
+        state_data = self._get_state_data()
+        metrics = cache.get_many([
+            f'circuit_{self.name}_{metric_name}'
+            for metric_name in self.metric_names
+        ])
+        return {
+            'state': self.get_state().value,
+            'failures_in_row': state_data['failures'],
+            'opened_until': state_data['opened_until'],
+            **{
+                metric_name: metrics.get(
+                    f'circuit_{self.name}_{metric_name}', 0)
+                for metric_name in self.metric_names
+            }
+        }
+
+    def _record_failure(self, exception: Exception) -> None:
+        state_data = self._get_state_data()
+        state_data['failures'] += 1
+        self._increment_metric('failure')
+        extra_failures = state_data['failures'] - self.failure_threshold
+        if extra_failures >= 0:
+            delay = min(self.base_delay * 2 ** extra_failures, self.max_delay)
+            state_data['opened_until'] = time.time() + delay
+            logger.warning(
+                f'Circuit {self.name} is open for {delay}s after '
+                f'{state_data["failures"]} failures: {exception}'
+            )
+        cache.set(self.state_key, state_data, None)
+
+    def _record_success(self, state: CircuitState) -> None:
+        self._increment_metric('success')
+        if state is CircuitState.HALF_OPEN:
+            logger.info(f'Circuit {self.name} is closed.')
+        if self._get_state_data()['failures']:
+            cache.delete(self.state_key)
+
+    def call(self, function: Callable, *args, **kwargs) -> Any:
+        """Calls the function if the circuit is not open"""
+        state = self.get_state()
+        if state is CircuitState.OPEN or (
+                state is CircuitState.HALF_OPEN
+                and not cache.add(self.probe_key, True, self.max_delay)):
+            self._increment_metric('rejected')
+            raise CircuitOpenError(f'Circuit {self.name} is {state.value}.')
+
+        try:
+            result = function(*args, **kwargs)
+        except self.failure_exceptions as exception:
+            self._record_failure(exception)
+            raise
+        else:
+            self._record_success(state)
+            return result
+        finally:
+            if state is CircuitState.HALF_OPEN:
+                cache.delete(self.probe_key)
@@ -0,0 +1,84 @@
+import logging
+
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from salary.models import Misconduct, Profile, WorkingShift
+from salary.services.cache_versions import (
+    MESSAGES_VERSION_KEY, STAFF_COUNTERS_VERSION_KEY, get_versioned_key
+)
+from salary.services.chat import get_unread_messages_number
+from salary.services.request_memo import request_memoized
+
+
+logger = logging.getLogger(__name__)
+
+
+class StaffCounters(NamedTuple):
+    unclosed_workshifts_number: int
+    wait_fix_workshifts_number: int
+    inactive_users_number: int
+    wait_explanation_misconducts_number: int
+    wait_decision_misconducts_number: int
+
+
+def _get_staff_counters_from_db() -> StaffCounters:
+    """Returns StaffCounters with the single query for every table"""
+    workshifts_counters = WorkingShift.objects.aggregate(
+        unclosed_number=Count('pk', filter=~Q(
+            status=WorkingShift.WorkshiftStatus.VERIFIED)),
+        wait_fix_number=Count('pk', filter=Q(
+            status=WorkingShift.WorkshiftStatus.WAIT_CORRECTION)),
+    )
+    profiles_counters = Profile.objects.aggregate(
+        inactive_number=Count('pk', filter=~Q(profile_status__in=(
+            Profile.ProfileStatus.VERIFIED, Profile.ProfileStatus.DISMISSED
+        ))),
+    )
+    misconducts_counters = Misconduct.objects.exclude(
+        intruder__profile__profile_status=Profile.ProfileStatus.DISMISSED
+    ).aggregate(
+        wait_explanation_number=Count('pk', filter=Q(
+            status=Misconduct.MisconductStatus.ADDED)),
+        wait_decision_number=Count('pk', filter=Q(
+            status=Misconduct.MisconductStatus.WAIT)),
+    )
+    return StaffCounters(
+        unclosed_workshifts_number=workshifts_counters['unclosed_number'],
+        wait_fix_workshifts_number=workshifts_counters['wait_fix_number'],
+        inactive_users_number=profiles_counters['inactive_number'],
+        wait_explanation_misconducts_number=misconducts_counters[
+            'wait_explanation_number'],
+        wait_decision_misconducts_number=misconducts_counters[
+            'wait_decision_number'],
+    )
+
+
+@request_memoized
+def get_staff_counters() -> StaffCounters:
+    """Returns cached StaffCounters for the staff badges"""
+    cache_key = get_versioned_key('staff_counters',
+                                  STAFF_COUNTERS_VERSION_KEY)
+    staff_counters = cache.get(cache_key)
+    if staff_counters is None:
+        staff_counters = _get_staff_counters_from_db()
+        cache.set(cache_key, staff_counters, settings.DEFAULT_CACHE_LIFETIME)
+        logger.debug(f'Staff counters are cached: {staff_counters}.')
+    return staff_counters
+
+
+@request_memoized
+def get_unread_messages_counter(user: User) -> int:
+    """Returns cached number of unread messages of the user"""
+    cache_key = get_versioned_key(f'unread_messages_{user.pk}',
+                                  MESSAGES_VERSION_KEY)
+    unread_messages_number = cache.get(cache_key)
+    if unread_messages_number is None:
+        unread_messages_number = get_unread_messages_number(user)
+        cache.set(cache_key, unread_messages_number,
+                  settings.DEFAULT_CACHE_LIFETIME)
+    return unread_messages_number
@@ -1,7 +1,9 @@
 import datetime
 
+from bisect import bisect_right
 from dataclasses import dataclass
-from typing import NamedTuple
+from functools import lru_cache
+from typing import Any, Iterable, NamedTuple, Sequence
 
 from django.db import models
 from django.contrib.auth.models import User
@@ -61,6 +63,17 @@ class Earnings(NamedTuple):
     final_earnings: float
 
 
+class ShiftEarnings(NamedTuple):
+    hall_admin: Earnings
+    cashier: Earnings
+
+
+class EarningsProfile(NamedTuple):
+    salary: float
+    experience_date: datetime.date | None
+    attestation_date: datetime.date | None
+
+
 @dataclass
 class Penalties:
     cash_admin_penalty: float = 0.0
@@ -111,6 +124,11 @@ def get_basic_part(employee: User, workshift_date: datetime.date) -> BasicPart:
             workshift_date
         )
         summary = sum((salary, experience, attestation))
+    return _get_basic_part(salary, experience, attestation, summary)
+
+
+def _get_basic_part(salary: float, experience: float, attestation: float,
+                    summary: float) -> BasicPart:
     return BasicPart(
         salary=salary,
         experience=experience,
@@ -143,7 +161,6 @@ def get_calculated_revenues(workshift_data: WorkshiftData,
     """
     Return calculated revenues according to the criteria
     """
-    summary = 0.0
     criteria = settings.ADMIN_BONUS_CRITERIA
     if is_cashier:
         criteria = settings.CASHIER_BONUS_CRITERIA
@@ -159,6 +176,11 @@ def get_calculated_revenues(workshift_data: WorkshiftData,
         workshift_data.additional_services_revenue,
         criteria.additional_services
     )
+    return _get_revenues(bar, game_zone, additional_services)
+
+
+def _get_revenues(bar: PercentValue, game_zone: PercentValue,
+                  additional_services: PercentValue) -> Revenues:
     summary = sum((bar.value, game_zone.value, additional_services.value))
 
     return Revenues(
@@ -185,18 +207,23 @@ def get_bonus_part(workshift_data: WorkshiftData,
     """
     Return the bonus part of earnings.
     """
-    award = settings.DISCIPLINE_AWARD
     revenues = get_calculated_revenues(workshift_data, is_cashier)
+    hookah = PercentValue(percent=0.0, value=0.0)
+    if not is_cashier:
+        hookah = get_hookah_earnings(workshift_data)
+    return _get_bonus_part(workshift_data, revenues, hookah, is_cashier)
+
+
+def _get_bonus_part(workshift_data: WorkshiftData, revenues: Revenues,
+                    hookah: PercentValue, is_cashier: bool) -> BonusPart:
+    award = settings.DISCIPLINE_AWARD
     publication = 0.0
     cleaning = 0.0
-    hookah = PercentValue(percent=0.0, value=0.0)
     summary = 0.0
     if workshift_data.publication and settings.PUBLICATION_ENABLED:
         publication = settings.PUBLICATION_BONUS
-    if not is_cashier:
-        hookah = get_hookah_earnings(workshift_data)
-        if workshift_data.hall_cleaning:
-            cleaning = settings.HALL_CLEANING_BONUS
+    if not is_cashier and workshift_data.hall_cleaning:
+        cleaning = settings.HALL_CLEANING_BONUS
     summary = sum(
         (award, publication, cleaning, hookah.value, revenues.summary)
     )
@@ -217,6 +244,11 @@ def get_current_earnings(employee: User,
                                 workshift_date=workshift_data.shift_date)
     bonus_part = get_bonus_part(workshift_data=workshift_data,
                                 is_cashier=is_cashier)
+    return _get_earnings(basic_part, bonus_part, workshift_data, is_cashier)
+
+
+def _get_earnings(basic_part: BasicPart, bonus_part: BonusPart,
+                  workshift_data: WorkshiftData, is_cashier: bool) -> Earnings:
     penalty = workshift_data.admin_penalty
     shortage = 0.0
     if is_cashier:
@@ -242,6 +274,148 @@ def get_current_earnings(employee: User,
     )
 
 
+def get_earnings_profile(employee: User) -> EarningsProfile:
+    """
+    Returns EarningsProfile with the employee values for the basic part
+    which do not depend on the workshift.
+    """
+    salary = employee.profile.position.position_salary
+    experience_date = attestation_date = None
+    if salary:
+        experience_date = employee.profile.employment_date + \
+            datetime.timedelta(days=settings.REQUIRED_EXPERIENCE)
+        if settings.ATTESTATION_ENABLED:
+            attestation_date = employee.profile.attestation_date
+    return EarningsProfile(
+        salary=salary,
+        experience_date=experience_date,
+        attestation_date=attestation_date
+    )
+
+
+def _get_profile_basic_part(profile: EarningsProfile,
+                            workshift_date: datetime.date) -> BasicPart:
+    """
+    Returns BasicPart from precalculated EarningsProfile,
+    the result is equal to get_basic_part()
+    """
+    experience = 0.0
+    attestation = 0.0
+    summary = 0.0
+    if profile.salary:
+        if profile.experience_date <= workshift_date:
+            experience = settings.EXPERIENCE_BONUS
+        if profile.attestation_date and \
+                profile.attestation_date <= workshift_date:
+            attestation = settings.ATTESTATION_BONUS
+        summary = sum((profile.salary, experience, attestation))
+    return _get_basic_part(profile.salary, experience, attestation, summary)
+
+
+@lru_cache(maxsize=None)
+def _get_criterias_table(
+        criterias: tuple[tuple[int, float], ...]
+    ) -> tuple[tuple[int, ...], tuple[PercentValue, ...]]:
+    """
+    Returns sorted thresholds of criterias and PercentValue templates
+    with ratios, the first template is used for values below all thresholds.
+    """
+    thresholds = tuple(max_value for max_value, _ in criterias)
+    ratios = (0.0,) + tuple(ratio for _, ratio in criterias)
+    return thresholds, tuple(
+        PercentValue(percent=round(ratio * 100, 2), value=ratio)
+        for ratio in ratios
+    )
+
+
+def get_percent_of_revenue_column(
+        values: Sequence[float],
+        criterias: tuple[tuple[int, float], ...]) -> list[PercentValue]:
+    """
+    Returns list of PercentValue for the column of revenue values,
+    the result is equal to get_percent_of_revenue() for each value
+    """
+    thresholds, ratios = _get_criterias_table(criterias)
+    column = []
+    for value in values:
+        percent, ratio = ratios[bisect_right(thresholds, value)]
+        column.append(
+            PercentValue(percent=percent, value=round(value * ratio, 2))
+        )
+    return column
+
+
+def get_role_earnings_column(workshifts_data: Sequence[WorkshiftData],
+                             profiles: Sequence[EarningsProfile],
+                             is_cashier: bool = False) -> list[Earnings]:
+    """
+    Returns Earnings for the columns of workshifts data and employee profiles
+    in one pass, the result is equal to get_current_earnings() for each row
+    """
+    criteria = settings.ADMIN_BONUS_CRITERIA
+    if is_cashier:
+        criteria = settings.CASHIER_BONUS_CRITERIA
+    bar_column = get_percent_of_revenue_column(
+        [data.bar_revenue for data in workshifts_data], criteria.bar)
+    game_zone_column = get_percent_of_revenue_column(
+        [data.game_zone_revenue for data in workshifts_data],
+        criteria.game_zone
+    )
+    additional_services_column = get_percent_of_revenue_column(
+        [data.additional_services_revenue for data in workshifts_data],
+        criteria.additional_services
+    )
+    empty_hookah = PercentValue(percent=0.0, value=0.0)
+
+    earnings_column = []
+    for data, profile, bar, game_zone, additional_services in zip(
+            workshifts_data, profiles, bar_column, game_zone_column,
+            additional_services_column):
+        revenues = _get_revenues(bar, game_zone, additional_services)
+        hookah = empty_hookah if is_cashier else get_hookah_earnings(data)
+        earnings_column.append(_get_earnings(
+            basic_part=_get_profile_basic_part(profile, data.shift_date),
+            bonus_part=_get_bonus_part(data, revenues, hookah, is_cashier),
+            workshift_data=data,
+            is_cashier=is_cashier
+        ))
+    return earnings_column
+
+
+def get_batch_earnings(workshifts: Iterable[Any]) -> dict[int, ShiftEarnings]:
+    """
+    Returns dict with ShiftEarnings of hall admin and cashier by workshift pk.
+    Workshifts must have selected related 'hall_admin__profile__position'
+    and 'cash_admin__profile__position'.
+    """
+    workshifts = list(workshifts)
+    profiles: dict[int, EarningsProfile] = dict()
+
+    def get_profile(employee: User) -> EarningsProfile:
+        profile = profiles.get(employee.pk)
+        if profile is None:
+            profile = profiles[employee.pk] = get_earnings_profile(employee)
+        return profile
+
+    workshifts_data = [
+        workshift.get_workshift_data() for workshift in workshifts
+    ]
+    hall_admin_column = get_role_earnings_column(
+        workshifts_data,
+        [get_profile(workshift.hall_admin) for workshift in workshifts],
+    )
+    cashier_column = get_role_earnings_column(
+        workshifts_data,
+        [get_profile(workshift.cash_admin) for workshift in workshifts],
+        is_cashier=True
+    )
+    return {
+        workshift.pk: ShiftEarnings(hall_admin=hall_admin, cashier=cashier)
+        for workshift, hall_admin, cashier in zip(
+            workshifts, hall_admin_column, cashier_column)
+    }
+
+
 def get_total_revenue(*args) -> float:
     """Returns sum of revenue values"""
     return sum(args) if sum(args) else 0.0
@@ -260,11 +434,17 @@ def get_workshift_penalties(misconduct_queryset: models.QuerySet,
                             hall_admin_id: int) -> Penalties:
     """Returns penalties for employees from Misconsucts"""
     current_penalties = Penalties()
-    for misconduct in misconduct_queryset:
-        if misconduct.intruder.id == cash_admin_id:
-            current_penalties.cash_admin_penalty += misconduct.penalty
-        elif misconduct.intruder.id == hall_admin_id:
-            current_penalties.hall_admin_penalty += misconduct.penalty
+    intruders_penalties = misconduct_queryset.filter(
+        intruder_id__in=(cash_admin_id, hall_admin_id)
+    ).order_by().values('intruder_id').annotate(
+        penalty_sum=models.Sum('penalty'))
+    for intruder_penalty in intruders_penalties:
+        if intruder_penalty['intruder_id'] == cash_admin_id:
+            current_penalties.cash_admin_penalty += \
+                intruder_penalty['penalty_sum']
+        elif intruder_penalty['intruder_id'] == hall_admin_id:
+            current_penalties.hall_admin_penalty += \
+                intruder_penalty['penalty_sum']
     return current_penalties
 
 
@@ -0,0 +1,60 @@
+import logging
+
+from typing import Iterable
+
+from django.db.models import prefetch_related_objects
+
+from salary.models import WorkingShift, EarningsSnapshot
+from salary.services.earnings import ShiftEarnings, get_batch_earnings
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_workshifts_earnings(
+        workshifts: Iterable[WorkingShift]) -> dict[int, ShiftEarnings]:
+    """
+    Returns dict with ShiftEarnings by workshift pk from earnings snapshots.
+    Missing snapshots are calculated and saved.
+    """
+    workshifts = list(workshifts)
+    prefetch_related_objects(workshifts, 'earnings_snapshots')
+    earnings_dict = dict()
+    missed_workshifts = []
+    for workshift in workshifts:
+        shift_earnings = workshift.get_snapshot_earnings()
+        if shift_earnings is None:
+            missed_workshifts.append(workshift)
+        else:
+            earnings_dict[workshift.pk] = shift_earnings
+
+    if missed_workshifts:
+        logger.info(
+            f'Earnings snapshots are missed for {len(missed_workshifts)} '
+            f'workshifts. Calculate it.'
+        )
+        earnings_dict.update(
+            EarningsSnapshot.refresh_for_workshifts(missed_workshifts)
+        )
+    return earnings_dict
+
+
+def get_wrong_snapshots_workshifts(
+        workshifts: list[WorkingShift]) -> list[WorkingShift]:
+    """
+    Returns workshifts whose earnings snapshots are missing or differ
+    from the calculated earnings.
+    """
+    prefetch_related_objects(workshifts, 'earnings_snapshots')
+    earnings_dict = get_batch_earnings(workshifts)
+    return [
+        workshift for workshift in workshifts
+        if workshift.get_snapshot_earnings() != earnings_dict[workshift.pk]
+        or {
+            (snapshot.role, snapshot.employee_id)
+            for snapshot in workshift.earnings_snapshots.all()
+        } != {
+            (EarningsSnapshot.Role.HALL_ADMIN, workshift.hall_admin_id),
+            (EarningsSnapshot.Role.CASHIER, workshift.cash_admin_id),
+        }
+    ]
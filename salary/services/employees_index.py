@@ -0,0 +1,86 @@
+import logging
+
+from typing import NamedTuple
+
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+
+
+logger = logging.getLogger(__name__)
+
+EMPLOYEES_INDEX_CACHE_KEY = 'employees_index'
+
+
+class EmployeeRecord(NamedTuple):
+    id: int
+    full_name: str
+    position_name: str | None
+    is_cashier: bool
+
+
+class EmployeesIndex(NamedTuple):
+    by_id: dict[int, EmployeeRecord]
+    by_name: dict[str, EmployeeRecord]
+
+
+def normalize_name(name: str) -> str:
+    """Returns name without extra spaces, in lower case and with 'е'
+    instead of 'ё' to compare names from the schedule.
+    """
+    return ' '.join(name.lower().replace('ё', 'е').split())
+
+
+def _get_employees_index_from_db() -> EmployeesIndex:
+    """Returns EmployeesIndex of all users loaded with the single query"""
+    add_workshift_permission = Q(
+        codename='add_workingshift', content_type__app_label='salary')
+    users = User.objects.annotate(
+        has_user_permission=Exists(Permission.objects.filter(
+            add_workshift_permission, user=OuterRef('pk'))),
+        has_group_permission=Exists(Permission.objects.filter(
+            add_workshift_permission, group__user=OuterRef('pk'))),
+    ).order_by('is_active', 'pk').values_list(
+        'pk', 'last_name', 'first_name', 'profile__position__name',
+        'is_active', 'is_superuser', 'has_user_permission',
+        'has_group_permission'
+    )
+
+    employees_index = EmployeesIndex(by_id=dict(), by_name=dict())
+    for (user_id, last_name, first_name, position_name, is_active,
+            is_superuser, has_user_permission, has_group_permission) in users:
+        employee = EmployeeRecord(
+            id=user_id,
+            full_name=f'{last_name} {first_name}',
+            position_name=position_name,
+            is_cashier=is_active and (
+                is_superuser or has_user_permission or has_group_permission)
+        )
+        employees_index.by_id[user_id] = employee
+        employees_index.by_name[normalize_name(employee.full_name)] = employee
+    return employees_index
+
+
+def get_employees_index() -> EmployeesIndex:
+    """Returns cached EmployeesIndex"""
+    employees_index = cache.get(EMPLOYEES_INDEX_CACHE_KEY)
+    if employees_index is None:
+        employees_index = _get_employees_index_from_db()
+        cache.set(EMPLOYEES_INDEX_CACHE_KEY, employees_index,
+                  settings.DEFAULT_CACHE_LIFETIME)
+        logger.info('Employees index is cached.')
+    return employees_index
+
+
+def invalidate_employees_index() -> None:
+    cache.delete(EMPLOYEES_INDEX_CACHE_KEY)
+
+
+def get_employee_by_name(full_name: str) -> EmployeeRecord | None:
+    """Returns EmployeeRecord by the name from the schedule"""
+    return get_employees_index().by_name.get(normalize_name(full_name))
+
+
+def get_employee_by_id(user_id: int) -> EmployeeRecord | None:
+    return get_employees_index().by_id.get(user_id)
@@ -1,16 +1,35 @@
 import gspread
 import logging
-import datetime
+import requests
+import threading
+
+from google.auth.exceptions import GoogleAuthError
+from gspread.utils import absolute_range_name, fill_gaps
 
 from django.conf import settings
-from django.core.cache import cache
 
-from salary.services.db_orm_queries import get_users_full_names_list_from_db
+from salary.services.circuit_breaker import CircuitBreaker
 
 
 logger = logging.getLogger(__name__)
 
 
+class GoogleSheetsError(Exception):
+    pass
+
+
+gsheets_circuit_breaker = CircuitBreaker(
+    'google_sheets',
+    failure_exceptions=(GoogleSheetsError,),
+    failure_threshold=settings.GSHEETS_BREAKER_FAILURE_THRESHOLD,
+    base_delay=settings.GSHEETS_BREAKER_BASE_DELAY,
+    max_delay=settings.GSHEETS_BREAKER_MAX_DELAY
+)
+
+_spreadsheet: gspread.Spreadsheet | None = None
+_spreadsheet_lock = threading.Lock()
+
+
 def get_worksheet_name(year: int, month: int) -> str:
     """Returns formatted worksheet name 'mm-yyyy' 
     from year and month values for request.
@@ -18,82 +37,80 @@ def get_worksheet_name(year: int, month: int) -> str:
     return f'0{month}-{year}' if month < 10 else f'{month}-{year}'
 
 
-def get_gsheets_worksheet_data(worksheet_name: str) -> list[list[str]]:
-    """Connect to google sheets and return data from worksheet."""
-    api_key: dict = settings.GSHEETS_API_KEY
-    spreadsheet: str = settings.SPREADSHEET
-    all_worksheet_data = []
+def get_spreadsheet() -> gspread.Spreadsheet:
+    """Returns the spreadsheet opened by the process-wide client,
+    authorization and metadata lookup are done once.
+    """
+    global _spreadsheet
+    with _spreadsheet_lock:
+        if _spreadsheet is None:
+            google_connect = gspread.service_account_from_dict(
+                settings.GSHEETS_API_KEY)
+            google_connect.set_timeout(settings.GSHEETS_TIMEOUT)
+            _spreadsheet = google_connect.open_by_key(settings.SPREADSHEET)
+            logger.info('Google sheets client is authorized.')
+        return _spreadsheet
+
+
+def reset_spreadsheet() -> None:
+    """Drops the client to authorize it again on the next request"""
+    global _spreadsheet
+    with _spreadsheet_lock:
+        _spreadsheet = None
+
+
+def _get_worksheet_data(worksheet_name: str) -> list[list[str]]:
+    """Returns data from the worksheet or empty list if it is not exists"""
     try:
-        google_connect = gspread.service_account_from_dict(api_key)
-        gsheet = google_connect.open_by_key(spreadsheet)
-        worksheet = gsheet.worksheet(worksheet_name)
-        all_worksheet_data = worksheet.get_all_values()
+        return get_spreadsheet().worksheet(worksheet_name).get_all_values()
     except gspread.exceptions.WorksheetNotFound as exception:
-        logger.exception(f'Error access {worksheet_name}: {exception}')
-    except (gspread.exceptions.GSpreadException,
-            gspread.exceptions.UnSupportedExportFormat) as exception:
-        logger.exception(
-            f'Unknown gspread exception: {exception}')
-
-    return all_worksheet_data
-
-
-def _get_full_names_tuple(worksheet_data: list[list[str]]) -> tuple[str]:
-    """Returns list with full names employees in worksheet."""
-    first_cols_list = [row[0] for row in worksheet_data]
-    names_list = get_users_full_names_list_from_db()
-
-    full_names_tuple = tuple(
-        full_employee_name
-        for full_employee_name in names_list
-        if full_employee_name in first_cols_list
-    )
-    return full_names_tuple
-
-
-def _get_list_of_dates_from_int(row: list, month: int,
-                                year: int) -> list[datetime.date]:
-    """Returns list of dates from list of numbers of days."""
-    workshift_symbol = settings.WORKSHIFT_SYMBOL
-    workday_dates_list = []
-    for number, value in enumerate(row):
-        if workshift_symbol.upper() == value.upper().strip():
-            try:
-                workday_dates_list.append(datetime.date(year, month, number))
-            except ValueError as exception:
-                logger.warning(
-                    f'Incorrect number of day in current number '
-                    f'{number}: {exception}'
-                )
-    return workday_dates_list
-
-
-def get_employees_schedule_dict(year: int, month: int) -> dict:
-    """Returns dict with full names keys of employees,
-    and List[datetime.date] as values. 
-    List[datetime.date] contains dates with planed shifts.
-
-    Returns:
-        dict: { 'Full name': List[datetime.date] }
+        logger.warning(f'Error access {worksheet_name}: {exception}')
+        return []
+
+
+def _get_worksheets_data(
+        worksheet_names: list[str]) -> dict[str, list[list[str]]]:
+    """Returns dict with data of the worksheets loaded with the single
+    request. Loads worksheets separately if any of them is not found.
+    Raises GoogleSheetsError if Google sheets are unavailable.
+    """
+    try:
+        try:
+            response = get_spreadsheet().values_batch_get(
+                [absolute_range_name(name) for name in worksheet_names])
+        except gspread.exceptions.APIError as exception:
+            if exception.response.status_code != 400:
+                raise
+            logger.warning(
+                f'Batch request of {worksheet_names} error: {exception}. '
+                f'Worksheets are requested separately.'
+            )
+            return {
+                name: _get_worksheet_data(name) for name in worksheet_names
+            }
+    except (gspread.exceptions.GSpreadException, GoogleAuthError,
+            requests.exceptions.RequestException) as exception:
+        reset_spreadsheet()
+        raise GoogleSheetsError(
+            f'Google sheets request error: {exception}') from exception
+
+    return {
+        name: fill_gaps(value_range.get('values', []))
+        for name, value_range in zip(
+            worksheet_names, response.get('valueRanges', []))
+    }
+
+
+def get_gsheets_worksheets_data(
+        worksheet_names: list[str]) -> dict[str, list[list[str]]]:
+    """Returns dict with data of several worksheets by the worksheet name
+    loaded with the single request through the circuit breaker.
+    Raises GoogleSheetsError or CircuitOpenError if Google sheets
+    are unavailable.
     """
-    worksheet_name = get_worksheet_name(year, month)
-    employees_schedule_dict = cache.get(worksheet_name)
-    if employees_schedule_dict is None:
-        employees_schedule_dict = dict()
-        worksheet_data = get_gsheets_worksheet_data(worksheet_name)
-        full_names_tuple = _get_full_names_tuple(worksheet_data)
-        for row in worksheet_data:
-            clear_row_value = row[0].strip()
-            if clear_row_value in full_names_tuple:
-                try:
-                    employees_schedule_dict[clear_row_value].extend(
-                        _get_list_of_dates_from_int(row, month, year)
-                    )
-                except KeyError:
-                    employees_schedule_dict[
-                        clear_row_value
-                    ] = _get_list_of_dates_from_int(row, month, year)
-        cache.set(worksheet_name, employees_schedule_dict,
-                  settings.DEFAULT_CACHE_LIFETIME)
-        logger.info(f'The worksheet {worksheet_name} is cached.')
-    return employees_schedule_dict
+    return gsheets_circuit_breaker.call(_get_worksheets_data, worksheet_names)
+
+
+def get_gsheets_worksheet_data(worksheet_name: str) -> list[list[str]]:
+    """Connect to google sheets and return data from worksheet."""
+    return get_gsheets_worksheets_data([worksheet_name])[worksheet_name]
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Iterable
+
+
+class Subscription:
+    """Event of the user's waiting request, set by MessageHub.notify
+    from any thread.
+    """
+
+    def __init__(self, hub: 'MessageHub', user_id: int) -> None:
+        self.hub = hub
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def set(self) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            # The loop of a finished request is already closed.
+            pass
+
+    async def wait(self, timeout: float) -> bool:
+        """Returns True if notified during the timeout"""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.event.clear()
+        return True
+
+    def close(self) -> None:
+        self.hub.unsubscribe(self)
+
+
+class MessageHub:
+    """In-process notifications of the waiting messenger requests.
+    Requests served by other processes are found by the database polling.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscriptions: dict[int, set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            user_subscriptions = self._subscriptions.get(subscription.user_id)
+            if user_subscriptions is None:
+                return
+            user_subscriptions.discard(subscription)
+            if not user_subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def notify(self, user_ids: Iterable[int]) -> None:
+        with self._lock:
+            subscriptions = [
+                subscription
+                for user_id in user_ids
+                for subscription in self._subscriptions.get(user_id, ())
+            ]
+        for subscription in subscriptions:
+            subscription.set()
+
+
+message_hub = MessageHub()
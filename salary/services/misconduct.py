@@ -4,21 +4,14 @@ import logging
 from typing import NamedTuple
 
 from django.contrib.auth.models import User
-from django.db.models import QuerySet, Sum
+from django.db.models import Count, Q, QuerySet, Sum
 
-from salary.models import Misconduct
+from salary.models import Misconduct, Profile
 
 
 logger = logging.getLogger(__name__)
 
 
-class Intruder(NamedTuple):
-    employee: User
-    total_count: int
-    explanation_count: int
-    decision_count: int
-
-
 class MisconductData(NamedTuple):
     penalty_counter: int
     wait_explanation: int
@@ -50,37 +43,23 @@ def get_misconduct_employee_data(
     )
 
 
-def get_sorted_intruders_list(queryset: QuerySet) -> list[Intruder]:
-    intruders_dict: dict[User, list] = dict()
-    for misconduct in queryset:
-        if intruders_dict.get(misconduct.intruder):
-            intruders_dict[misconduct.intruder].append(misconduct.status)
-        else:
-            intruders_dict[misconduct.intruder] = [misconduct.status,]
-    
-    intruders_list = [
-        Intruder(
-            employee=intruder,
-            total_count=len(intruders_dict[intruder]),
-            explanation_count=len(
-                list(filter(
-                    lambda x: x == Misconduct.MisconductStatus.ADDED,
-                    intruders_dict[intruder]
-                ))
-            ),
-            decision_count=len(
-                list(filter(
-                    lambda x: x == Misconduct.MisconductStatus.WAIT,
-                    intruders_dict[intruder]
-                ))
-            )
-        ) for intruder in intruders_dict.keys()
-    ]
-    sorted_intruders_list = sorted(
-        intruders_list, key=lambda i: i.total_count, reverse=True
-    )
-
-    return sorted_intruders_list
+def get_intruders_queryset(show_dismissed: bool = False) -> QuerySet:
+    """Returns users with misconducts annotated with total_count,
+    explanation_count and decision_count, ordered by total_count.
+    """
+    intruders_queryset = User.objects.annotate(
+        total_count=Count('intruder'),
+        explanation_count=Count('intruder', filter=Q(
+            intruder__status=Misconduct.MisconductStatus.ADDED)),
+        decision_count=Count('intruder', filter=Q(
+            intruder__status=Misconduct.MisconductStatus.WAIT)),
+    ).filter(total_count__gt=0)
+    if not show_dismissed:
+        intruders_queryset = intruders_queryset.exclude(
+            profile__profile_status=Profile.ProfileStatus.DISMISSED)
+
+    return intruders_queryset.order_by(
+        '-total_count', 'last_name', 'first_name', 'pk')
 
 
 def get_penalty_sum(misconduct_queryset: QuerySet) -> float:
@@ -4,15 +4,29 @@ import logging
 from enum import Enum
 from typing import NamedTuple
 
-from django.db.models import QuerySet
+from django.db import transaction
+from django.db.models import Q, QuerySet
 from django.conf import settings
+from django.core.cache import cache
 
-from salary.models import WorkingShift
-from salary.services.earnings import Earnings
+from salary.models import (
+    WorkingShift, MonthlyEmployeeAggregate, get_upsert_unique_fields
+)
+from salary.services.earnings import Earnings, ShiftEarnings
+from salary.services.earnings_snapshot import get_workshifts_earnings
+from salary.services.cache_versions import (
+    EARNINGS_VERSION_KEY, get_month_version_key, get_versioned_key
+)
 
 
 logger = logging.getLogger(__name__)
 
+AGGREGATE_VALUE_FIELDS = [
+    'order_number', 'shift_counter', 'basic_revenues', 'bonus_revenues',
+    'shortage', 'penalty', 'average_revenue', 'summary_bar_revenue',
+    'average_bar_revenue', 'summary_hookah_revenue', 'average_hookah_revenue'
+]
+
 
 class RatingDataNotDefined(ValueError):
     pass
@@ -97,12 +111,13 @@ class FilteredRating(NamedTuple):
     full_hall_admin_list: list
 
 
-def get_workshift_data(workshift: WorkingShift) -> WorkshiftData:
+def get_workshift_data(workshift: WorkingShift,
+                       earnings: ShiftEarnings) -> WorkshiftData:
     """
     Returns WorkshiftData model with cashier and hall_admin dict's
     """
-    cashier_earnings_data: Earnings = workshift.cashier_earnings
-    hall_admin_earnings_data: Earnings = workshift.hall_admin_earnings
+    cashier_earnings_data: Earnings = earnings.cashier
+    hall_admin_earnings_data: Earnings = earnings.hall_admin
     
     cashier_dict = {
         'id': workshift.cash_admin.id,
@@ -201,8 +216,10 @@ def get_employee_lists_by_categories(
     """
     cashiers_data_list = []
     hall_admins_data_list = []
+    earnings_dict = get_workshifts_earnings(workshifts)
 
-    for data in map(get_workshift_data, workshifts):
+    for workshift in workshifts:
+        data = get_workshift_data(workshift, earnings_dict[workshift.pk])
         cashiers_data_list.append(data.cashier)
         hall_admins_data_list.append(data.hall_admin)
 
@@ -215,12 +232,132 @@ def get_employee_lists_by_categories(
     )
 
 
-def get_monthly_data_from_workshifts(workshifts: WorkingShift) -> MonthlyData:
+def _get_employee_data(aggregate: MonthlyEmployeeAggregate) -> EmployeeData:
+    """
+    Returns EmployeeData model from the monthly employee aggregate
+    """
+    return EmployeeData(
+        id=aggregate.employee_id,
+        full_name=aggregate.employee.get_full_name(),
+        shift_counter=aggregate.shift_counter,
+        basic_revenues=aggregate.basic_revenues,
+        bonus_revenues=aggregate.bonus_revenues,
+        shortage=aggregate.shortage,
+        penalty=aggregate.penalty,
+        average_revenue=aggregate.average_revenue,
+        summary_bar_revenue=aggregate.summary_bar_revenue,
+        average_bar_revenue=aggregate.average_bar_revenue,
+        summary_hookah_revenue=aggregate.summary_hookah_revenue,
+        average_hookah_revenue=aggregate.average_hookah_revenue
+    )
+
+
+def _get_aggregates_list(employee_list: list[EmployeeData], role: str,
+                         month: int, year: int
+    ) -> list[MonthlyEmployeeAggregate]:
+    """
+    Returns list of MonthlyEmployeeAggregate from EmployeeData list
+    """
+    return [
+        MonthlyEmployeeAggregate(
+            employee_id=employee.id,
+            role=role,
+            year=year,
+            month=month,
+            order_number=order_number,
+            shift_counter=employee.shift_counter,
+            basic_revenues=employee.basic_revenues,
+            bonus_revenues=employee.bonus_revenues,
+            shortage=employee.shortage,
+            penalty=employee.penalty,
+            average_revenue=employee.average_revenue,
+            summary_bar_revenue=employee.summary_bar_revenue,
+            average_bar_revenue=employee.average_bar_revenue,
+            summary_hookah_revenue=employee.summary_hookah_revenue,
+            average_hookah_revenue=employee.average_hookah_revenue
+        )
+        for order_number, employee in enumerate(employee_list)
+    ]
+
+
+def _get_empty_month_cache_key(month: int, year: int) -> str:
+    return get_versioned_key(
+        f'monthly_aggregates_empty_{year}_{month}',
+        get_month_version_key(year, month), EARNINGS_VERSION_KEY
+    )
+
+
+def rebuild_monthly_aggregates(month: int, year: int) -> EmployeeCategories:
     """
-    Returns MonthlyData from workshifts with summary basic and bonus parts
-    revenue and summary shortages, penalties.
+    Calculates employees aggregates of the month from verified workshifts,
+    replaces saved ones and returns EmployeeCategories model.
     """
+    workshifts = get_monthly_workingshifts_queryset(month=month, year=year)
     categories_list = get_employee_lists_by_categories(workshifts)
+    aggregates_list = _get_aggregates_list(
+        categories_list.cashier_list, MonthlyEmployeeAggregate.Role.CASHIER,
+        month, year
+    ) + _get_aggregates_list(
+        categories_list.hall_admin_list,
+        MonthlyEmployeeAggregate.Role.HALL_ADMIN, month, year
+    )
+    saved_aggregates_filter = Q(pk__in=[])
+    for role in MonthlyEmployeeAggregate.Role:
+        saved_aggregates_filter |= Q(role=role, employee_id__in=[
+            aggregate.employee_id for aggregate in aggregates_list
+            if aggregate.role == role
+        ])
+    # Upsert keeps the rebuild idempotent when the month is rebuilt
+    # by concurrent requests.
+    with transaction.atomic():
+        MonthlyEmployeeAggregate.objects.bulk_create(
+            aggregates_list, update_conflicts=True,
+            unique_fields=get_upsert_unique_fields(
+                ['employee_id', 'role', 'year', 'month']),
+            update_fields=AGGREGATE_VALUE_FIELDS
+        )
+        MonthlyEmployeeAggregate.objects.filter(
+            year=year, month=month).exclude(saved_aggregates_filter).delete()
+    if not aggregates_list:
+        cache.set(_get_empty_month_cache_key(month, year), True,
+                  settings.DEFAULT_CACHE_LIFETIME)
+    logger.info(f'Employees aggregates for {month}-{year} are rebuilt.')
+    return categories_list
+
+
+def get_monthly_employee_categories(month: int,
+                                    year: int) -> EmployeeCategories:
+    """
+    Returns EmployeeCategories model from the monthly employees aggregates,
+    rebuilds them if they are not saved.
+    """
+    aggregates = MonthlyEmployeeAggregate.objects.select_related(
+        'employee').filter(year=year, month=month)
+    if not aggregates:
+        if cache.get(_get_empty_month_cache_key(month, year)):
+            return EmployeeCategories(cashier_list=[], hall_admin_list=[])
+        return rebuild_monthly_aggregates(month=month, year=year)
+
+    cashiers_list = []
+    hall_admins_list = []
+    for aggregate in aggregates:
+        if aggregate.role == MonthlyEmployeeAggregate.Role.CASHIER:
+            cashiers_list.append(_get_employee_data(aggregate))
+        else:
+            hall_admins_list.append(_get_employee_data(aggregate))
+
+    return EmployeeCategories(
+        cashier_list=cashiers_list,
+        hall_admin_list=hall_admins_list,
+    )
+
+
+def get_monthly_data_from_categories(
+        categories_list: EmployeeCategories) -> MonthlyData:
+    """
+    Returns MonthlyData from employees categories with summary basic and
+    bonus parts revenue and summary shortages, penalties.
+    """
     employee_data_list: list = (
         categories_list.cashier_list + categories_list.hall_admin_list
     )
@@ -238,7 +375,9 @@ def get_monthly_data_from_workshifts(workshifts: WorkingShift) -> MonthlyData:
     
     return MonthlyData(
         employees=employee_data_list,
-        shift_counter=len(workshifts),
+        shift_counter=sum(
+            employee.shift_counter for employee in categories_list.cashier_list
+        ),
         summary_basic_revenue=round(monthly_summary_basic_part, 2),
         summary_bonus_revenue=round(monthly_summary_bonus_part, 2),
         summary_all_shortages=round(summary_shortages, 2),
@@ -253,7 +392,7 @@ def get_monthly_workingshifts_queryset(month: int, year: int) -> QuerySet:
     workshifts = WorkingShift.objects.select_related(
         'cash_admin__profile__position',
         'hall_admin__profile__position',
-    ).filter(
+    ).prefetch_related('earnings_snapshots').filter(
         shift_date__month=month,
         shift_date__year=year,
         status=WorkingShift.WorkshiftStatus.VERIFIED
@@ -265,8 +404,8 @@ def get_monthly_report(month: int, year: int) -> MonthlyData:
     """
     Returns MonthlyData report for the month
     """
-    workshifts = get_monthly_workingshifts_queryset(month=month, year=year)
-    monthly_report = get_monthly_data_from_workshifts(workshifts)
+    categories_list = get_monthly_employee_categories(month=month, year=year)
+    monthly_report = get_monthly_data_from_categories(categories_list)
     return monthly_report
 
 
@@ -274,8 +413,7 @@ def get_awards_data(month: int, year: int) -> AwardData:
     """
     Returns awards data for the month
     """
-    workshifts = get_monthly_workingshifts_queryset(month=month, year=year)
-    categories_list = get_employee_lists_by_categories(workshifts)
+    categories_list = get_monthly_employee_categories(month=month, year=year)
 
     bar_current_leader = None
     bar_max_revenue = 0.0
@@ -421,6 +559,23 @@ def _sort_list_by_average_revenue(employee_list: list) -> None:
 
 
 def get_filtered_rating_data(month: int, year: int) -> FilteredRating:
+    """
+    Returns filtered Rating data for the month from the cache,
+    calculates it if the month workshifts are changed.
+    """
+    cache_key = get_versioned_key(
+        f'filtered_rating_{year}_{month}',
+        get_month_version_key(year, month), EARNINGS_VERSION_KEY
+    )
+    filtered_rating = cache.get(cache_key)
+    if filtered_rating is None:
+        filtered_rating = _get_filtered_rating_data(month=month, year=year)
+        cache.set(cache_key, filtered_rating, settings.DEFAULT_CACHE_LIFETIME)
+        logger.info(f'Rating for {month}-{year} is cached.')
+    return filtered_rating
+
+
+def _get_filtered_rating_data(month: int, year: int) -> FilteredRating:
     """
     Returns filtered Rating data from awards data
     """
@@ -0,0 +1,90 @@
+import logging
+
+from contextlib import contextmanager
+from typing import Callable, Hashable, Iterator
+
+from asgiref.local import Local
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+class RecalculationQueue:
+    """
+    Collects keys of objects which need to be recalculated and runs
+    the handler once for all of them on the transaction commit, or at the end
+    of the deferred scope (see deferred_recalculation()).
+    """
+    queues: list['RecalculationQueue'] = []
+
+    def __init__(self, name: str,
+                 handler: Callable[[set[Hashable]], None]) -> None:
+        self.name = name
+        self.handler = handler
+        self._local = Local()
+        RecalculationQueue.queues.append(self)
+
+    @property
+    def pending(self) -> set[Hashable]:
+        if not hasattr(self._local, 'pending'):
+            self._local.pending = set()
+        return self._local.pending
+
+    @property
+    def deferred_depth(self) -> int:
+        return getattr(self._local, 'deferred_depth', 0)
+
+    @deferred_depth.setter
+    def deferred_depth(self, value: int) -> None:
+        self._local.deferred_depth = value
+
+    def add(self, *keys: Hashable) -> None:
+        """Adds keys to the queue"""
+        self.pending.update(keys)
+        if not self.deferred_depth:
+            transaction.on_commit(self.flush)
+
+    def flush(self) -> None:
+        """Runs the handler for all pending keys"""
+        if not self.pending:
+            return
+        keys = set(self.pending)
+        self.pending.clear()
+        logger.debug(f'Recalculation "{self.name}" for {keys}.')
+        self.handler(keys)
+
+
+def start_deferred_recalculation() -> None:
+    for queue in RecalculationQueue.queues:
+        queue.deferred_depth += 1
+
+
+def stop_deferred_recalculation() -> None:
+    for queue in RecalculationQueue.queues:
+        queue.deferred_depth -= 1
+
+
+def has_pending_recalculation() -> bool:
+    return any(queue.pending for queue in RecalculationQueue.queues)
+
+
+def flush_deferred_recalculation() -> None:
+    """Runs pending recalculations out of the deferred scope on commit"""
+    for queue in RecalculationQueue.queues:
+        if not queue.deferred_depth and queue.pending:
+            transaction.on_commit(queue.flush)
+
+
+@contextmanager
+def deferred_recalculation() -> Iterator[None]:
+    """
+    Defers the recalculation of all queues to the end of the block,
+    nested blocks are flushed by the outer one.
+    """
+    start_deferred_recalculation()
+    try:
+        yield
+    finally:
+        stop_deferred_recalculation()
+    flush_deferred_recalculation()
@@ -0,0 +1,57 @@
+import functools
+import logging
+
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from asgiref.local import Local
+
+
+logger = logging.getLogger(__name__)
+
+# Unlike threading.local, it is shared by async request and its sync_to_async
+# calls, and separated between concurrent async requests.
+_local = Local()
+
+
+@contextmanager
+def request_memo_scope() -> Iterator[None]:
+    """
+    Keeps results of request_memoized functions until the end of the block,
+    nested blocks share the memo of the outer one.
+    """
+    memo = getattr(_local, 'memo', None)
+    if memo is None:
+        _local.memo = dict()
+    try:
+        yield
+    finally:
+        if memo is None:
+            _local.memo = None
+
+
+def clear_request_memo() -> None:
+    """Forgets results memoized in the current scope"""
+    memo = getattr(_local, 'memo', None)
+    if memo:
+        memo.clear()
+        logger.debug('Request memo is cleared.')
+
+
+def request_memoized(function: Callable) -> Callable:
+    """
+    Calls the function once for the same arguments inside of the
+    request_memo_scope(), outside of it the function is called every time.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        memo = getattr(_local, 'memo', None)
+        if memo is None:
+            return function(*args, **kwargs)
+        memo_key = (function.__module__, function.__qualname__, args,
+                    tuple(sorted(kwargs.items())))
+        if memo_key not in memo:
+            memo[memo_key] = function(*args, **kwargs)
+        return memo[memo_key]
+
+    return wrapper
@@ -0,0 +1,447 @@
+import calendar
+import csv
+import datetime
+import functools
+import logging
+import threading
+import time
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections, transaction
+from django.utils.module_loading import import_string
+
+from salary.models import PlannedShift, WorksheetCopy
+from salary.services.circuit_breaker import CircuitOpenError
+from salary.services.employees_index import (
+    get_employees_index, normalize_name
+)
+from salary.services.google_sheets import (
+    GoogleSheetsError, get_gsheets_worksheets_data, get_worksheet_name,
+    gsheets_circuit_breaker
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduleSourceError(Exception):
+    def __init__(self, message: str, retry_at: float = 0.0) -> None:
+        super().__init__(message)
+        # Timestamp since which the source may be available again.
+        self.retry_at = retry_at
+
+
+class ScheduleCacheEntry(NamedTuple):
+    updated_at: float
+    schedule: dict
+
+
+def _get_list_of_dates_from_int(row: list, month: int,
+                                year: int) -> list[datetime.date]:
+    """Returns list of dates from list of numbers of days."""
+    workshift_symbol = settings.WORKSHIFT_SYMBOL
+    workday_dates_list = []
+    for number, value in enumerate(row):
+        if workshift_symbol.upper() == value.upper().strip():
+            try:
+                workday_dates_list.append(datetime.date(year, month, number))
+            except ValueError as exception:
+                logger.warning(
+                    f'Incorrect number of day in current number '
+                    f'{number}: {exception}'
+                )
+    return workday_dates_list
+
+
+def get_worksheet_schedule_dict(worksheet_data: list[list[str]], month: int,
+                                year: int) -> dict:
+    """Returns dict with user id keys of employees and lists
+    of planed shifts dates as values from the worksheet data.
+    """
+    employees_schedule_dict = dict()
+    employees_by_name = get_employees_index().by_name
+    for row in worksheet_data:
+        employee = employees_by_name.get(normalize_name(row[0]))
+        if employee:
+            employees_schedule_dict.setdefault(employee.id, []).extend(
+                _get_list_of_dates_from_int(row, month, year)
+            )
+    return employees_schedule_dict
+
+
+def get_month_dates_range(
+        year: int, month: int) -> tuple[datetime.date, datetime.date]:
+    """Returns first and last dates of the month"""
+    _, last_day = calendar.monthrange(year, month)
+    return datetime.date(year, month, 1), datetime.date(year, month, last_day)
+
+
+def _get_months_in_range(start_date: datetime.date,
+                         end_date: datetime.date) -> list[tuple[int, int]]:
+    """Returns (year, month) tuples of the dates range"""
+    months_list = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        months_list.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months_list
+
+
+class ScheduleProvider(ABC):
+    """Source of employees planed workshifts"""
+    is_cached: bool = True
+
+    @abstractmethod
+    def get_schedule(self, year: int, month: int) -> dict:
+        """Returns dict { user_id: List[datetime.date] } for the month"""
+
+    def get_schedules(self, months: list[tuple[int, int]]) -> dict:
+        """Returns dict with schedules by (year, month) keys"""
+        return {(year, month): self.get_schedule(year, month)
+                for year, month in months}
+
+    def get_fallback_schedules(self, months: list[tuple[int, int]]) -> dict:
+        """Returns schedules to use while the source is unavailable"""
+        return {month: {} for month in months}
+
+    def get_employee_dates(self, user_id: int, start_date: datetime.date,
+                           end_date: datetime.date) -> list[datetime.date]:
+        """Returns employee planed dates in the range from the schedules"""
+        return [
+            planed_date
+            for year, month in _get_months_in_range(start_date, end_date)
+            for planed_date in get_employees_schedule_dict(
+                year=year, month=month).get(user_id, [])
+            if start_date <= planed_date <= end_date
+        ]
+
+    def get_employees_on_date(self, date: datetime.date) -> list[int]:
+        """Returns ids of employees planed on the date"""
+        schedule_dict = get_employees_schedule_dict(
+            year=date.year, month=date.month)
+        return [
+            user_id for user_id, dates in schedule_dict.items()
+            if date in dates
+        ]
+
+
+class WorksheetScheduleProvider(ScheduleProvider):
+    """Source of the schedule grid from 'mm-yyyy' worksheets"""
+
+    @abstractmethod
+    def get_worksheet_data(self, worksheet_name: str) -> list[list[str]]:
+        """Returns rows of the worksheet"""
+
+    def get_worksheets_data(
+            self, worksheet_names: list[str]) -> dict[str, list[list[str]]]:
+        """Returns dict with rows of the worksheets by the worksheet name"""
+        return {name: self.get_worksheet_data(name)
+                for name in worksheet_names}
+
+    def get_schedule(self, year: int, month: int) -> dict:
+        worksheet_data = self.get_worksheet_data(
+            get_worksheet_name(year, month))
+        return get_worksheet_schedule_dict(worksheet_data, month, year)
+
+    def get_schedules(self, months: list[tuple[int, int]]) -> dict:
+        worksheets_data = self.get_worksheets_data(
+            [get_worksheet_name(year, month) for year, month in months])
+        return {
+            (year, month): get_worksheet_schedule_dict(
+                worksheets_data.get(get_worksheet_name(year, month), []),
+                month, year
+            )
+            for year, month in months
+        }
+
+
+class GoogleSheetsScheduleProvider(WorksheetScheduleProvider):
+    """Reads worksheets from Google sheets, the last known copies
+    of them are saved to serve while Google sheets are unavailable.
+    """
+
+    def get_worksheet_data(self, worksheet_name: str) -> list[list[str]]:
+        return self.get_worksheets_data([worksheet_name])[worksheet_name]
+
+    def get_worksheets_data(
+            self, worksheet_names: list[str]) -> dict[str, list[list[str]]]:
+        try:
+            worksheets_data = get_gsheets_worksheets_data(worksheet_names)
+        except (GoogleSheetsError, CircuitOpenError) as exception:
+            raise ScheduleSourceError(
+                str(exception),
+                retry_at=gsheets_circuit_breaker.get_retry_time()
+            ) from exception
+        try:
+            WorksheetCopy.save_worksheets(worksheets_data)
+        except DatabaseError:
+            logger.exception('Worksheets copies are not saved.')
+        return worksheets_data
+
+    def get_fallback_schedules(self, months: list[tuple[int, int]]) -> dict:
+        worksheets_data = dict(
+            WorksheetCopy.objects.filter(
+                name__in=[get_worksheet_name(*month) for month in months]
+            ).values_list('name', 'data')
+        )
+        logger.info(f'Last known worksheets {list(worksheets_data)} '
+                    f'are used.')
+        return {
+            (year, month): get_worksheet_schedule_dict(
+                worksheets_data.get(get_worksheet_name(year, month), []),
+                month, year
+            )
+            for year, month in months
+        }
+
+
+class FileScheduleProvider(WorksheetScheduleProvider):
+    """Reads worksheets from 'mm-yyyy.csv' or 'mm-yyyy.xlsx' files"""
+
+    def __init__(self, directory: str | None = None) -> None:
+        self.directory = Path(directory or settings.SCHEDULE_FILES_DIR)
+
+    def get_worksheet_data(self, worksheet_name: str) -> list[list[str]]:
+        csv_path = self.directory / f'{worksheet_name}.csv'
+        xlsx_path = self.directory / f'{worksheet_name}.xlsx'
+        if csv_path.exists():
+            return self._read_csv(csv_path)
+        if xlsx_path.exists():
+            return self._read_xlsx(xlsx_path, worksheet_name)
+        logger.warning(f'Schedule file {worksheet_name} is not found '
+                       f'in {self.directory}.')
+        return []
+
+    @staticmethod
+    def _read_csv(path: Path) -> list[list[str]]:
+        with open(path, newline='', encoding='utf-8-sig') as csv_file:
+            return [row for row in csv.reader(csv_file) if row]
+
+    @staticmethod
+    def _read_xlsx(path: Path, worksheet_name: str) -> list[list[str]]:
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            logger.error(f'Install openpyxl to read schedule file {path}.')
+            return []
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            if worksheet_name in workbook.sheetnames:
+                worksheet = workbook[worksheet_name]
+            else:
+                worksheet = workbook.worksheets[0]
+            return [
+                ['' if value is None else str(value) for value in row]
+                for row in worksheet.iter_rows(values_only=True)
+                if row
+            ]
+        finally:
+            workbook.close()
+
+
+class DatabaseScheduleProvider(ScheduleProvider):
+    """Reads the schedule from PlannedShift table"""
+    is_cached = False
+
+    def get_schedule(self, year: int, month: int) -> dict:
+        employees_schedule_dict = dict()
+        planned_shifts = PlannedShift.objects.filter(
+            date__range=get_month_dates_range(year, month)
+        ).order_by('date').values_list('user_id', 'date')
+        for user_id, date in planned_shifts:
+            employees_schedule_dict.setdefault(user_id, []).append(date)
+        return employees_schedule_dict
+
+    def get_employee_dates(self, user_id: int, start_date: datetime.date,
+                           end_date: datetime.date) -> list[datetime.date]:
+        return list(
+            PlannedShift.objects.filter(
+                user_id=user_id, date__range=(start_date, end_date)
+            ).order_by('date').values_list('date', flat=True)
+        )
+
+    def get_employees_on_date(self, date: datetime.date) -> list[int]:
+        return list(
+            PlannedShift.objects.filter(date=date).order_by('pk').values_list(
+                'user_id', flat=True)
+        )
+
+
+@functools.lru_cache
+def _get_schedule_provider(provider_path: str) -> ScheduleProvider:
+    return import_string(provider_path)()
+
+
+def get_schedule_provider() -> ScheduleProvider:
+    """Returns the provider instance configured by SCHEDULE_PROVIDER"""
+    return _get_schedule_provider(settings.SCHEDULE_PROVIDER)
+
+
+def _get_schedule_cache_key(worksheet_name: str) -> str:
+    return f'employees_schedule_{worksheet_name}'
+
+
+def refresh_employees_schedules(months: list[tuple[int, int]]) -> dict:
+    """Loads schedules of the months from the configured provider at once,
+    caches and returns them by (year, month) keys. The fallback schedules
+    of the unavailable provider are cached to become stale when the provider
+    may be available again, so reads do not start refreshes before it.
+    """
+    schedule_provider = get_schedule_provider()
+    try:
+        schedules_dict = schedule_provider.get_schedules(months)
+        updated_at = time.time()
+    except ScheduleSourceError as exception:
+        logger.warning(f'Schedules of {months} are unavailable: {exception}')
+        schedules_dict = schedule_provider.get_fallback_schedules(months)
+        updated_at = (max(exception.retry_at, time.time())
+                      - settings.SCHEDULE_SOFT_LIFETIME)
+    cache.set_many(
+        {
+            _get_schedule_cache_key(get_worksheet_name(year, month)):
+                ScheduleCacheEntry(updated_at, employees_schedule_dict)
+            for (year, month), employees_schedule_dict
+            in schedules_dict.items()
+        },
+        settings.SCHEDULE_CACHE_LIFETIME
+    )
+    logger.info(f'Schedules of {months} are cached.')
+    return schedules_dict
+
+
+def refresh_employees_schedule(year: int, month: int) -> dict:
+    """Loads the schedule from the configured provider, caches
+    and returns the employees schedule dict.
+    """
+    return refresh_employees_schedules([(year, month)])[(year, month)]
+
+
+def _get_neighbour_months(year: int,
+                          month: int) -> list[tuple[int, int]]:
+    """Returns previous, current and next (year, month) tuples"""
+    first_month_date = datetime.date(year, month, 1)
+    previous_month_date = first_month_date - datetime.timedelta(days=1)
+    next_month_date = first_month_date + datetime.timedelta(days=31)
+    return [
+        (previous_month_date.year, previous_month_date.month),
+        (year, month),
+        (next_month_date.year, next_month_date.month),
+    ]
+
+
+def _run_background_refresh(year: int, month: int, lock_key: str) -> None:
+    try:
+        refresh_employees_schedule(year, month)
+    except Exception as exception:
+        logger.exception(f'Background schedule refresh error: {exception}')
+    finally:
+        cache.delete(lock_key)
+        connections.close_all()
+
+
+def start_background_refresh(year: int, month: int) -> bool:
+    """Starts the worksheet refresh in the background thread
+    if it is not started yet by any process. Returns True if started.
+    """
+    worksheet_name = get_worksheet_name(year, month)
+    lock_key = f'{_get_schedule_cache_key(worksheet_name)}_lock'
+    if not cache.add(lock_key, True, settings.SCHEDULE_REFRESH_LOCK_TIMEOUT):
+        logger.debug(f'Schedule {month}-{year} is already refreshing.')
+        return False
+    threading.Thread(
+        target=_run_background_refresh, args=(year, month, lock_key),
+        name=f'schedule-refresh-{month}-{year}', daemon=True
+    ).start()
+    logger.info(f'Background refresh of schedule {month}-{year} is started.')
+    return True
+
+
+def get_employees_schedule_dict(year: int, month: int) -> dict:
+    """Returns dict with user id keys of employees,
+    and List[datetime.date] as values. 
+    List[datetime.date] contains dates with planed shifts.
+    The cached schedule of remote providers is returned at once, it is
+    refreshed in the background when it is older than SCHEDULE_SOFT_LIFETIME.
+    Missed schedule is loaded together with the previous and next months.
+
+    Returns:
+        dict: { user_id: List[datetime.date] }
+    """
+    schedule_provider = get_schedule_provider()
+    if not schedule_provider.is_cached:
+        return schedule_provider.get_schedule(year, month)
+
+    worksheet_name = get_worksheet_name(year, month)
+    cache_entry = cache.get(_get_schedule_cache_key(worksheet_name))
+    if cache_entry is None:
+        neighbour_months = _get_neighbour_months(year, month)
+        cached_keys = cache.get_many([
+            _get_schedule_cache_key(get_worksheet_name(*month_tuple))
+            for month_tuple in neighbour_months
+        ]).keys()
+        missed_months = [
+            month_tuple for month_tuple in neighbour_months
+            if _get_schedule_cache_key(get_worksheet_name(*month_tuple))
+            not in cached_keys
+        ]
+        return refresh_employees_schedules(missed_months)[(year, month)]
+
+    if time.time() - cache_entry.updated_at > settings.SCHEDULE_SOFT_LIFETIME:
+        start_background_refresh(year, month)
+    return cache_entry.schedule
+
+
+class PlannedShiftsSync(NamedTuple):
+    created_number: int
+    deleted_number: int
+
+
+def sync_planned_shifts(
+        year: int, month: int,
+        provider: ScheduleProvider | None = None) -> PlannedShiftsSync:
+    """Saves the month schedule of the provider (SCHEDULE_SYNC_PROVIDER
+    by default) to PlannedShift table, creates only new and deletes only
+    missing planned shifts.
+    """
+    if provider is None:
+        provider = import_string(settings.SCHEDULE_SYNC_PROVIDER)()
+    employees_schedule_dict = provider.get_schedule(year, month)
+    if not employees_schedule_dict:
+        logger.warning(f'Schedule {month}-{year} is empty, sync is skipped.')
+        return PlannedShiftsSync(created_number=0, deleted_number=0)
+
+    planned_shifts_set = {
+        (user_id, planed_date)
+        for user_id, dates in employees_schedule_dict.items()
+        for planed_date in dates
+    }
+    saved_shifts_dict = {
+        (user_id, planed_date): pk
+        for pk, user_id, planed_date in PlannedShift.objects.filter(
+            date__range=get_month_dates_range(year, month)
+        ).values_list('pk', 'user_id', 'date')
+    }
+    new_shifts_list = [
+        PlannedShift(user_id=user_id, date=planed_date)
+        for user_id, planed_date in planned_shifts_set
+        if (user_id, planed_date) not in saved_shifts_dict
+    ]
+    deleted_pk_list = [
+        pk for key, pk in saved_shifts_dict.items()
+        if key not in planned_shifts_set
+    ]
+    with transaction.atomic():
+        PlannedShift.objects.filter(pk__in=deleted_pk_list).delete()
+        PlannedShift.objects.bulk_create(new_shifts_list)
+    logger.info(
+        f'Planned shifts {month}-{year} are synced: '
+        f'{len(new_shifts_list)} created, {len(deleted_pk_list)} deleted.'
+    )
+    return PlannedShiftsSync(created_number=len(new_shifts_list),
+                             deleted_number=len(deleted_pk_list))
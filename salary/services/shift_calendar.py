@@ -6,16 +6,20 @@ from dataclasses import dataclass
 from enum import Enum
 from typing import List, NamedTuple
 
+from django.contrib.auth.models import User
 from django.db.models import QuerySet
 from django.utils import timezone
 from django.conf import settings
 
 from salary.models import WorkingShift
-from salary.services.google_sheets import get_employees_schedule_dict
+from salary.services.earnings_snapshot import get_workshifts_earnings
+from salary.services.schedule import (
+    get_schedule_provider, get_month_dates_range, get_employees_schedule_dict
+)
 from salary.services.db_orm_queries import (
-    get_user_full_name_from_db, get_user_month_workshifts,
-    has_cashier_permissions, is_workshift_exists
+    get_workshifts_in_range
 )
+from salary.services.employees_index import get_employee_by_id
 
 
 class DayStatus(Enum):
@@ -48,6 +52,33 @@ class UserCalendar(NamedTuple):
     sum_of_earnings: float
 
 
+class CalendarData(NamedTuple):
+    planed_dates: set[datetime.date]
+    workshift_dict: dict[datetime.date, Workshift]
+    existing_shifts_dates: set[datetime.date]
+
+
+class TeamCalendarRow(NamedTuple):
+    employee: User
+    calendar: UserCalendar
+
+
+class CoverageDay(NamedTuple):
+    date: datetime.date
+    cashiers_count: int
+    hall_admins_count: int
+
+    @property
+    def is_gap(self) -> bool:
+        return (self.cashiers_count, self.hall_admins_count) != (1, 1)
+
+
+class TeamCalendar(NamedTuple):
+    days_list: list[datetime.date]
+    rows: list[TeamCalendarRow]
+    coverage: list[CoverageDay]
+
+
 class EmployeeOnWork(NamedTuple):
     cashier: str | None
     hall_admin: str | None
@@ -78,16 +109,17 @@ def get_month_calendar(year: int, month: int) -> list[list[datetime.date]]:
     return month_calender
 
 
-def get_workshift_dict(user_id: int, year: int, month: int) -> dict:
-    """Return list of CalendarDay namedtuple from workshifts data."""
-    workshifts = get_user_month_workshifts(user_id=user_id, year=year,
-                                           month=month)
+def get_workshift_dict(user_id: int, workshifts: list[WorkingShift],
+                       earnings_dict: dict | None = None) -> dict:
+    """Return dict of Workshift namedtuples by date from user workshifts."""
     workshift_dict = dict()
+    if earnings_dict is None:
+        earnings_dict = get_workshifts_earnings(workshifts)
     for workshift in workshifts:
-        earnings = workshift.cashier_earnings
+        earnings = earnings_dict[workshift.pk].cashier
         is_verified = False
-        if workshift.hall_admin.pk == user_id:
-            earnings = workshift.hall_admin_earnings
+        if workshift.hall_admin_id == user_id:
+            earnings = earnings_dict[workshift.pk].hall_admin
         if workshift.status == WorkingShift.WorkshiftStatus.VERIFIED:
             is_verified = True
         workshift_url = workshift.get_absolute_url()
@@ -104,20 +136,12 @@ def get_workshift_dict(user_id: int, year: int, month: int) -> dict:
     return workshift_dict
 
 
-def get_planed_workshifts_days_list(user_id: int, month: int,
-                                    year: int) -> list:
-    """Returns list of day numbers planed shifts."""
-    user_full_name = get_user_full_name_from_db(user_id)
-    google_sheets_data_dict = get_employees_schedule_dict(year=year,
-                                                          month=month)
-    employee_days_list = google_sheets_data_dict.get(user_full_name, [])
-    return employee_days_list
-
-
-def is_planed_workshift_closed(required_date: datetime.date) -> bool:
+def is_planed_workshift_closed(
+        required_date: datetime.date,
+        existing_shifts_dates: set[datetime.date]) -> bool:
     """Returns True if last day workshifts in month is closed"""
     required_date += datetime.timedelta(days=1)
-    return is_workshift_exists(required_date)
+    return required_date in existing_shifts_dates
 
 
 def is_last_day_of_month(check_date: datetime.date) -> bool:
@@ -130,32 +154,60 @@ def is_last_day_of_month(check_date: datetime.date) -> bool:
 
 
 def is_workshift_on_last_day_planed(
-        planed_workshifts_list: list[datetime.date]) -> bool:
+        planed_dates: set[datetime.date]) -> bool:
     """Returns True if workshifts planed on last month day"""
-    try:
-        last_day_date_of_month = planed_workshifts_list[-1]
-    except IndexError:
-        return False
+    return any(is_last_day_of_month(planed_date)
+               for planed_date in planed_dates)
 
-    return is_last_day_of_month(last_day_date_of_month)
+
+def get_calendar_data(user_id: int, month_calendar: list[list[datetime.date]],
+                      year: int, month: int) -> CalendarData:
+    """
+    Returns CalendarData for the calendar grid: planed dates of the month,
+    user workshifts and dates of all workshifts in the grid and the day
+    after it, loaded with the single workshifts query.
+    """
+    start_date, end_date = get_month_dates_range(year, month)
+    planed_dates = set(get_schedule_provider().get_employee_dates(
+        user_id, start_date, end_date))
+    if not month_calendar:
+        return CalendarData(planed_dates, dict(), set())
+
+    grid_end_date = month_calendar[-1][-1] + datetime.timedelta(days=1)
+    workshifts = list(get_workshifts_in_range(month_calendar[0][0],
+                                              grid_end_date))
+    user_workshifts = [
+        workshift for workshift in workshifts
+        if start_date <= workshift.shift_date <= end_date
+        and user_id in (workshift.cash_admin_id, workshift.hall_admin_id)
+    ]
+    return CalendarData(
+        planed_dates=planed_dates,
+        workshift_dict=get_workshift_dict(user_id, user_workshifts),
+        existing_shifts_dates={
+            workshift.shift_date for workshift in workshifts
+        }
+    )
 
 
-def get_calendar_week_list(
-        week: list[datetime.date], planed_workshifts_list: list[datetime.date],
-        workshift_dict: dict, month: int) -> list:
+def get_calendar_week_list(week: list[datetime.date],
+                           calendar_data: CalendarData, month: int) -> list:
     """Returns week list with CalendarDay's."""
     calendar_week_list = []
+    workshift_dict = calendar_data.workshift_dict
     for day_date in week:
         current_day = CalendarDay(day_date)
         tomorow = day_date + datetime.timedelta(days=1)
         if day_date.month == month:
-            if (day_date in planed_workshifts_list 
-                    and tomorow not in workshift_dict.keys()):
+            if (day_date in calendar_data.planed_dates
+                    and tomorow not in workshift_dict):
                 current_day.status = DayStatus.PLANED
             if (is_last_day_of_month(current_day.date)
-                    and is_planed_workshift_closed(current_day.date)):
+                    and is_planed_workshift_closed(
+                        current_day.date,
+                        calendar_data.existing_shifts_dates)):
                 current_day.status = DayStatus.REGULAR
-            if day_date in workshift_dict.keys():
+            if day_date in workshift_dict:
                 current_workshift: Workshift = workshift_dict.get(day_date)
                 current_day.earnings = current_workshift.earnings
                 current_day.status = DayStatus.UNVERIFIED
@@ -177,21 +229,26 @@ def get_user_calendar(user_id: int, year: int, month: int) -> UserCalendar:
         sum_of_earnings: float - Amount of earnings in closed shifts.
     """
 
-    planed_workshifts_list = get_planed_workshifts_days_list(
-        user_id=user_id, year=year, month=month)
-    workshift_dict = get_workshift_dict(user_id=user_id, year=year,
-                                        month=month)
     month_calendar = get_month_calendar(year=year, month=month)
+    calendar_data = get_calendar_data(user_id, month_calendar, year, month)
+    return get_calendar_from_data(month_calendar, calendar_data, month)
+
+
+def get_calendar_from_data(month_calendar: list[list[datetime.date]],
+                           calendar_data: CalendarData,
+                           month: int) -> UserCalendar:
+    """Returns UserCalendar with the weeks of month_calendar"""
+    workshift_dict = calendar_data.workshift_dict
     calendar_days_month_list = []
 
     for week in month_calendar:
         calendar_week_list = get_calendar_week_list(
-            week, planed_workshifts_list, workshift_dict, month)
+            week, calendar_data, month)
         calendar_days_month_list.append(calendar_week_list)
 
-    complited_shifts_count = len(workshift_dict.keys())
-    planed_shifts_count = len(planed_workshifts_list)
-    if is_workshift_on_last_day_planed(planed_workshifts_list):
+    complited_shifts_count = len(workshift_dict)
+    planed_shifts_count = len(calendar_data.planed_dates)
+    if is_workshift_on_last_day_planed(calendar_data.planed_dates):
         planed_shifts_count -= 1
     sum_of_earnings = sum([
         workshift.earnings
@@ -209,26 +266,103 @@ def get_user_calendar(user_id: int, year: int, month: int) -> UserCalendar:
     return user_calendar
 
 
+def get_coverage_list(days_list: list[datetime.date],
+                      planed_dates_dict: dict[int, set[datetime.date]],
+                      cashiers_ids: set[int]) -> list[CoverageDay]:
+    """Returns CoverageDay with numbers of planed employees for every day"""
+    coverage_list = []
+    for day_date in days_list:
+        planed_ids = [
+            user_id for user_id, planed_dates in planed_dates_dict.items()
+            if day_date in planed_dates
+        ]
+        cashiers_count = len(cashiers_ids.intersection(planed_ids))
+        coverage_list.append(CoverageDay(
+            date=day_date,
+            cashiers_count=cashiers_count,
+            hall_admins_count=len(planed_ids) - cashiers_count
+        ))
+    return coverage_list
+
+
+def get_team_calendar(employees: QuerySet, year: int,
+                      month: int) -> TeamCalendar:
+    """
+    Returns TeamCalendar with calendar rows of every employee and planed
+    shifts coverage of every day in the month. Built from the single
+    schedule read, the single workshifts query with earnings batch,
+    the single employees query and the cached employees index.
+    """
+    start_date, end_date = get_month_dates_range(year, month)
+    days_list = [
+        start_date + datetime.timedelta(days=day_number)
+        for day_number in range((end_date - start_date).days + 1)
+    ]
+    employees_schedule_dict = get_employees_schedule_dict(
+        year=year, month=month)
+    workshifts = list(get_workshifts_in_range(
+        start_date, end_date + datetime.timedelta(days=1)))
+    month_workshifts = [
+        workshift for workshift in workshifts
+        if workshift.shift_date <= end_date
+    ]
+    earnings_dict = get_workshifts_earnings(month_workshifts)
+    existing_shifts_dates = {workshift.shift_date for workshift in workshifts}
+
+    employees_workshifts = dict()
+    for workshift in month_workshifts:
+        for user_id in {workshift.cash_admin_id, workshift.hall_admin_id}:
+            employees_workshifts.setdefault(user_id, []).append(workshift)
+
+    rows = []
+    cashiers_ids = set()
+    planed_dates_dict = dict()
+    for employee in employees:
+        employee_record = get_employee_by_id(employee.id)
+        if employee_record and employee_record.is_cashier:
+            cashiers_ids.add(employee.id)
+        planed_dates_dict[employee.id] = set(
+            employees_schedule_dict.get(employee.id, []))
+        calendar_data = CalendarData(
+            planed_dates=planed_dates_dict[employee.id],
+            workshift_dict=get_workshift_dict(
+                employee.id, employees_workshifts.get(employee.id, []),
+                earnings_dict
+            ),
+            existing_shifts_dates=existing_shifts_dates
+        )
+        rows.append(TeamCalendarRow(
+            employee=employee,
+            calendar=get_calendar_from_data([days_list], calendar_data, month)
+        ))
+
+    return TeamCalendar(
+        days_list=days_list,
+        rows=rows,
+        coverage=get_coverage_list(
+            days_list, planed_dates_dict, cashiers_ids)
+    )
+
+
 def get_employees_at_work() -> EmployeeOnWork:
     """Returns names of employees at work"""
     now = timezone.localtime(timezone.now())
     today = now.date()
     if now.hour < settings.EMPLOYEE_CHANGE_HOUR:
         today -= datetime.timedelta(days=1)
-    current_month_employee_planed_shifts = get_employees_schedule_dict(
-        year=today.year, month=today.month)
+    employees_ids = get_schedule_provider().get_employees_on_date(today)
     employee_list = [
-        name
-        for name, dates in current_month_employee_planed_shifts.items()
-        if today in dates
+        employee for employee in map(get_employee_by_id, employees_ids)
+        if employee
     ]
 
     try:
         hall_admin, cashier = employee_list
-        if not has_cashier_permissions(cashier):
+        if not cashier.is_cashier:
             hall_admin, cashier = cashier, hall_admin
     except ValueError:
         logger.warning('Number of employees at work not equal 2.')
         return EmployeeOnWork(None, None)
     else:
-        return EmployeeOnWork(cashier=cashier, hall_admin=hall_admin)
+        return EmployeeOnWork(
+            cashier=cashier.full_name, hall_admin=hall_admin.full_name)
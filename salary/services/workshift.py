@@ -3,15 +3,25 @@ import logging
 
 from typing import NamedTuple
 
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import QuerySet, Q, Sum
+from django.core.cache import cache
+from django.db.models import (
+    QuerySet, Q, F, Sum, Count, Case, When, FilteredRelation
+)
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
-from salary.services.shift_calendar import get_planed_workshifts_days_list
+from salary.services.schedule import get_schedule_provider
 from salary.services.monthly_reports import Rating, get_rating_data
-from salary.models import WorkingShift
+from salary.services.earnings_snapshot import get_workshifts_earnings
+from salary.services.cache_versions import (
+    WORKSHIFT_DATES_VERSION_KEY, get_versioned_key
+)
+from salary.services.counters import get_staff_counters
+from salary.services.employees_index import get_employee_by_id
+from salary.services.request_memo import request_memoized
+from salary.models import WorkingShift, EarningsSnapshot
 
 
 logger = logging.getLogger(__name__)
@@ -31,22 +41,48 @@ class UnclosedWorkshifts(NamedTuple):
     unclosed_number: int
 
 
+class MissedMonth(NamedTuple):
+    month_date: datetime.date
+    dates: list[datetime.date]
+
+
 class SummaryWorkshiftData(NamedTuple):
     summary_earnings: float
     summary_penalties: float
     summary_shortages: float
 
 
+def _get_planed_dates_range() -> tuple[datetime.date, datetime.date]:
+    """Returns range of planed dates required by the employee index page:
+    from the last day of previous month to tomorrow.
+    """
+    current_date = timezone.localdate(timezone.now())
+    return (
+        current_date.replace(day=1) - datetime.timedelta(days=1),
+        current_date + datetime.timedelta(days=1)
+    )
+
+
+@request_memoized
+def _get_employee_planed_dates(
+        user_id: int, start_date: datetime.date,
+        end_date: datetime.date) -> frozenset[datetime.date]:
+    return frozenset(get_schedule_provider().get_employee_dates(
+        user_id, start_date, end_date))
+
+
 def _is_date_day_exists_in_plan(user_id: int,
                            check_date: datetime.date) -> bool:
     """Returns True if day from check_date exists
     in the plan else returns False.
     """
-    planed_shifts_days_tuple = get_planed_workshifts_days_list(
-        user_id=user_id, month=check_date.month, year=check_date.year)
-    logger.debug(f'Planed days: {planed_shifts_days_tuple}.')
-    if check_date in planed_shifts_days_tuple:
-        logger.debug(f'{check_date} exists in {planed_shifts_days_tuple}.')
+    start_date, end_date = _get_planed_dates_range()
+    if not start_date <= check_date <= end_date:
+        start_date = end_date = check_date
+    planed_shifts_days_list = _get_employee_planed_dates(
+        user_id, start_date, end_date)
+    if check_date in planed_shifts_days_list:
+        logger.debug(f'{check_date} exists in the plan.')
         return True
 
     logger.debug(f'{check_date} is not exists in the plan.')
@@ -88,33 +124,106 @@ def notification_of_upcoming_shifts(
     return False
 
 
+def _get_workshift_dates_cache_key(key: str,
+                                   current_date: datetime.date) -> str:
+    return get_versioned_key(f'{key}_{current_date:%Y%m%d}',
+                             WORKSHIFT_DATES_VERSION_KEY)
+
+
+def _get_missed_dates_from_db(
+        start_date: datetime.date | None,
+        end_date: datetime.date) -> tuple[datetime.date, ...]:
+    """
+    Returns sorted dates without workshifts in the range. The range starts
+    from the first workshift date if start_date is None.
+    """
+    workshifts = WorkingShift.objects.filter(shift_date__lte=end_date)
+    if start_date:
+        workshifts = workshifts.filter(shift_date__gte=start_date)
+    exists_workshifts_dates = set(
+        workshifts.order_by().values_list('shift_date', flat=True))
+    logger.debug(f'Exists workshifts number: {len(exists_workshifts_dates)}')
+    if start_date is None:
+        if not exists_workshifts_dates:
+            return tuple()
+        start_date = min(exists_workshifts_dates)
+
+    range_dates = {
+        start_date + datetime.timedelta(days=day_number)
+        for day_number in range((end_date - start_date).days + 1)
+    }
+    return tuple(sorted(range_dates - exists_workshifts_dates))
+
+
+@request_memoized
+def get_missed_dates(
+        start_date: datetime.date | None,
+        end_date: datetime.date | None = None) -> tuple[datetime.date, ...]:
+    """
+    Returns tuple with missed dates of unclosed workshifts in the range,
+    from the first workshift if start_date is None and to today
+    if end_date is None. Result is cached till the end of the day
+    or the next workshifts dates change.
+    """
+    current_date = timezone.localdate(timezone.now())
+    end_date = end_date or current_date
+    cache_key = _get_workshift_dates_cache_key(
+        f'missed_dates_{start_date or "first"}_{end_date}', current_date)
+    missed_dates = cache.get(cache_key)
+    if missed_dates is None:
+        missed_dates = _get_missed_dates_from_db(start_date, end_date)
+        cache.set(cache_key, missed_dates,
+                  settings.WORKSHIFT_DATES_CACHE_LIFETIME)
+        logger.info(
+            f'Missed dates from {start_date} to {end_date}: '
+            f'{len(missed_dates)}.'
+        )
+    return missed_dates
+
+
 def get_missed_dates_tuple() -> tuple[datetime.date, ...]:
-    """Returns tuple with missed dates of unclosed workshifts."""
+    """
+    Returns tuple with missed dates of unclosed workshifts
+    for the last MISSED_WORKSHIFTS_DAYS days.
+    """
     current_date = timezone.localdate(timezone.now())
-    year, month = current_date.year, current_date.month
-    last_day_of_month = current_date.day
-    logger.debug(f'"missed dates" current date: {current_date}')
-
-    exists_workshifts_dates = WorkingShift.objects.filter(
-        shift_date__month=month, shift_date__year=year,
-        shift_date__day__lte=last_day_of_month).dates('shift_date', 'day')
-    logger.debug(f'Exists workshifts dates: {exists_workshifts_dates}')
-    month_dates = [
-        datetime.date(year, month, day)
-        for day in range(1, last_day_of_month + 1)
+    start_date = current_date - datetime.timedelta(
+        days=settings.MISSED_WORKSHIFTS_DAYS)
+    return get_missed_dates(start_date, current_date)
+
+
+def get_missed_dates_by_months(
+        missed_dates: tuple[datetime.date, ...]) -> list[MissedMonth]:
+    """Returns missed dates grouped by months, the latest month first"""
+    months_dict = dict()
+    for missed_date in reversed(missed_dates):
+        months_dict.setdefault(missed_date.replace(day=1), []).append(
+            missed_date)
+    return [
+        MissedMonth(month_date=month_date, dates=dates)
+        for month_date, dates in months_dict.items()
     ]
-    missed_dates_tuple = tuple([
-        date for date in month_dates
-        if date not in exists_workshifts_dates
-    ])
-    logger.info(f'Missed dates tuple: {missed_dates_tuple}')
-
-    return missed_dates_tuple
 
 
+@request_memoized
 def get_employee_unclosed_workshifts_dates(
         user_id: int) -> tuple[datetime.date, ...]:
     """Returns tuple with missed dates of employee unclosed workshifts."""
+    current_date = timezone.localdate(timezone.now())
+    cache_key = _get_workshift_dates_cache_key(
+        f'unclosed_dates_{user_id}', current_date)
+    unclosed_dates_tuple = cache.get(cache_key)
+    if unclosed_dates_tuple is None:
+        unclosed_dates_tuple = _get_employee_unclosed_workshifts_dates(
+            user_id, current_date)
+        cache.set(cache_key, unclosed_dates_tuple,
+                  settings.WORKSHIFT_DATES_CACHE_LIFETIME)
+    return unclosed_dates_tuple
+
+
+def _get_employee_unclosed_workshifts_dates(
+        user_id: int,
+        current_date: datetime.date) -> tuple[datetime.date, ...]:
     requested_user = get_object_or_404(User, id=user_id)
     if not requested_user.has_perm('salary.add_workingshift'):
         logger.info(
@@ -123,34 +232,30 @@ def get_employee_unclosed_workshifts_dates(
         )
         return tuple()
 
-    current_date = timezone.localdate(timezone.now())
     logger.debug(
         f'"employee_unclosed_workshifts" current date: {current_date}')
     year, month = current_date.year, current_date.month
 
     missed_dates = get_missed_dates_tuple()
-    planed_shift_closed_dates = [
+    first_month_date = datetime.date(year, month, 1)
+    start_date = first_month_date
+    if first_month_date in missed_dates:
+        logger.debug(
+            f'Check permissoins to close first day {first_month_date}.')
+        start_date = _get_date_with_offset(-1, first_month_date)
+    planed_dates_start, planed_dates_end = _get_planed_dates_range()
+    planed_shift_closed_dates = {
         _get_date_with_offset(1, planed_date)
-        for planed_date in get_planed_workshifts_days_list(user_id, month,
-                                                           year)
-    ]
+        for planed_date in _get_employee_planed_dates(
+            user_id, planed_dates_start, planed_dates_end)
+        if start_date <= planed_date < current_date
+    }
     logger.debug(f'User allowed to close dates: {planed_shift_closed_dates}')
 
     employee_unclosed_workshifts_dates = [
         date for date in missed_dates
         if date in planed_shift_closed_dates
     ]
-
-    first_month_date = datetime.date(year, month, 1)
-    if first_month_date in missed_dates:
-        logger.debug(
-            f'Check permissoins to close first day {first_month_date}.')
-        last_day_of_last_month = _get_date_with_offset(-1, first_month_date)
-        last_month_planed_days = get_planed_workshifts_days_list(
-            user_id, last_day_of_last_month.month, last_day_of_last_month.year)
-        if (last_month_planed_days
-                and last_month_planed_days[-1] == last_day_of_last_month):
-            employee_unclosed_workshifts_dates.append(first_month_date)
     logger.info(
         f'User unclosed workshift dates: {employee_unclosed_workshifts_dates}')
     return tuple(employee_unclosed_workshifts_dates)
@@ -164,7 +269,8 @@ def get_employee_month_workshifts(employee_id: int, month: int, year: int,
     """
     employee_month_workshifts = WorkingShift.objects.select_related(
         'hall_admin__profile__position',
-        'cash_admin__profile__position').filter(
+        'cash_admin__profile__position').prefetch_related(
+            'earnings_snapshots').filter(
             shift_date__month=month, shift_date__year=year).filter(
                 Q(cash_admin__id=employee_id) | Q(hall_admin__id=employee_id)
             ).order_by('shift_date')
@@ -183,10 +289,11 @@ def _get_summary_earnings(employee_id: int, month: int, year: int,
     """
     employee_month_workshifts = get_employee_month_workshifts(
         employee_id, month, year, only_verified=True)
+    earnings_dict = get_workshifts_earnings(employee_month_workshifts)
     summary_earnings = sum([
-        workshift.hall_admin_earnings.final_earnings
-        if workshift.hall_admin.id == employee_id
-        else workshift.cashier_earnings.final_earnings
+        earnings_dict[workshift.pk].hall_admin.final_earnings
+        if workshift.hall_admin_id == employee_id
+        else earnings_dict[workshift.pk].cashier.final_earnings
         for workshift in employee_month_workshifts
     ])
     if rating_data:
@@ -195,47 +302,89 @@ def _get_summary_earnings(employee_id: int, month: int, year: int,
     return round(summary_earnings, 2)
 
 
-def _is_employee_cashier(employee_id: int) -> bool:
+def is_employee_cashier(employee_id: int) -> bool:
     """Returns True if employee with employee_id has position 'cash_admin'"""
-    try:
-        employee_object = User.objects.select_related(
-            'profile', 'profile__position').get(pk=employee_id)
-        position_name = employee_object.profile.position.name
-    except ObjectDoesNotExist:
+    employee = get_employee_by_id(employee_id)
+    if employee is None:
         logger.error(f'User with id {employee_id} does not exist.')
         return False
 
-    return True if position_name == 'cash_admin' else False
+    return employee.position_name == 'cash_admin'
+
+
+def _get_employee_month_sums(employee_id: int, month: int,
+                             year: int) -> dict:
+    """
+    Returns dict with workshifts numbers, unpaid shortage and earnings
+    from snapshots of the employee for the month by the single query.
+    """
+    is_verified = Q(status=WorkingShift.WorkshiftStatus.VERIFIED)
+    is_hall_admin = Q(hall_admin_id=employee_id)
+    is_snapshot_missed = (
+        is_hall_admin & Q(hall_admin_snapshot__isnull=True)
+        | ~is_hall_admin & Q(cashier_snapshot__isnull=True)
+    )
+    return WorkingShift.objects.alias(
+        hall_admin_snapshot=FilteredRelation(
+            'earnings_snapshots',
+            condition=Q(
+                earnings_snapshots__role=EarningsSnapshot.Role.HALL_ADMIN)
+        ),
+        cashier_snapshot=FilteredRelation(
+            'earnings_snapshots',
+            condition=Q(earnings_snapshots__role=EarningsSnapshot.Role.CASHIER)
+        ),
+    ).filter(
+        Q(cash_admin_id=employee_id) | is_hall_admin,
+        shift_date__month=month, shift_date__year=year
+    ).aggregate(
+        total_number=Count('pk'),
+        verified_number=Count('pk', filter=is_verified),
+        unpaid_shortage=Sum(
+            'shortage',
+            filter=Q(cash_admin_id=employee_id, shortage_paid=False)
+        ),
+        earnings=Sum(
+            Case(
+                When(is_hall_admin,
+                     then=F('hall_admin_snapshot__final_earnings')),
+                default=F('cashier_snapshot__final_earnings')
+            ),
+            filter=is_verified
+        ),
+        missed_snapshots_number=Count(
+            'pk', filter=is_verified & is_snapshot_missed),
+    )
 
 
 def get_employee_workshift_indicators(
-    employee_id: int, month: int = 0,
-        year: int = 0) -> EmployeeMonthIndicators:
+    employee_id: int, month: int = 0, year: int = 0,
+        is_cashier: bool | None = None) -> EmployeeMonthIndicators:
     """
     Returns EmployeeWorkshiftsIndicators for employee
     """
     if not month or not year:
         month, year = timezone.now().month, timezone.now().year
-    number_of_total_workshifts = get_employee_month_workshifts(
-        employee_id, month, year).count()
-    shortage_sum = get_employee_month_workshifts(
-        employee_id, month, year).filter(
-            cash_admin__id=employee_id, shortage_paid=False).aggregate(
-                Sum('shortage')).get('shortage__sum', 0.0)
-    is_cashier = _is_employee_cashier(employee_id)
+    month_sums = _get_employee_month_sums(employee_id, month, year)
+    if is_cashier is None:
+        is_cashier = is_employee_cashier(employee_id)
 
     rating_data=get_rating_data(employee_id, is_cashier, month, year)
-    summary_earnings = _get_summary_earnings(employee_id, month, year,
-                                             rating_data)
-    number_of_verified_workshifts=get_employee_month_workshifts(
-        employee_id, month, year, True).count()
+    if month_sums['missed_snapshots_number']:
+        summary_earnings = _get_summary_earnings(employee_id, month, year,
+                                                 rating_data)
+    else:
+        summary_earnings = month_sums['earnings'] or 0.0
+        if rating_data:
+            summary_earnings += rating_data.bonus
+        summary_earnings = round(summary_earnings, 2)
 
     logger.info(f'Return employee indicators at {month}-{year}.')
     return EmployeeMonthIndicators(
         summary_earnings=summary_earnings,
-        summary_shortage=shortage_sum,
-        number_of_verified_workshifts=number_of_verified_workshifts,
-        number_of_total_workshifts=number_of_total_workshifts,
+        summary_shortage=month_sums['unpaid_shortage'],
+        number_of_verified_workshifts=month_sums['verified_number'],
+        number_of_total_workshifts=month_sums['total_number'],
         rating_data=rating_data
     )
 
@@ -244,10 +393,9 @@ def get_unclosed_workshift_number() -> UnclosedWorkshifts:
     """
     Returns number of unclosed workshifts 
     """
-    unclosed_workshifts_number = WorkingShift.objects.exclude(
-            status=WorkingShift.WorkshiftStatus.VERIFIED).count()
-    wait_fix_workshifts_number = WorkingShift.objects.filter(
-            status=WorkingShift.WorkshiftStatus.WAIT_CORRECTION).count()
+    staff_counters = get_staff_counters()
+    unclosed_workshifts_number = staff_counters.unclosed_workshifts_number
+    wait_fix_workshifts_number = staff_counters.wait_fix_workshifts_number
     unverified_workshifts_number = unclosed_workshifts_number - \
         wait_fix_workshifts_number
     return UnclosedWorkshifts(unverified_number=unverified_workshifts_number,
@@ -261,12 +409,14 @@ def get_summary_workshift_data(workshift_queryset: QuerySet,
     summary_earnings = 0.0
     summary_penalties = 0.0
     summary_shortages = 0.0
+    earnings_dict = get_workshifts_earnings(workshift_queryset)
     for workshift in workshift_queryset:
-        if workshift.hall_admin.pk == employee_id:
-            summary_earnings += workshift.hall_admin_earnings.final_earnings
+        earnings = earnings_dict[workshift.pk]
+        if workshift.hall_admin_id == employee_id:
+            summary_earnings += earnings.hall_admin.final_earnings
             summary_penalties += workshift.hall_admin_penalty
-        elif workshift.cash_admin.pk == employee_id:
-            summary_earnings += workshift.cashier_earnings.final_earnings
+        elif workshift.cash_admin_id == employee_id:
+            summary_earnings += earnings.cashier.final_earnings
             summary_penalties += workshift.cash_admin_penalty
             if not workshift.shortage_paid:
                 summary_shortages += workshift.shortage
@@ -1,13 +1,13 @@
 import datetime
 
 from django import template
-from django.db.models import Q
 from django.contrib.auth.models import User
 from django.utils import timezone
 
-from salary.models import Misconduct, Profile
-from salary.services.profile_services import profile_photo_is_exists
-from salary.services.chat import get_unread_messages_number
+from salary.models import Profile
+from salary.services.counters import (
+    get_staff_counters, get_unread_messages_counter
+)
 from salary.services.workshift import get_unclosed_workshift_number
 
 
@@ -21,34 +21,26 @@ def unverified_shift():
 
 @register.simple_tag()
 def inactive_user() -> int:
-    return Profile.objects.exclude(
-        Q(profile_status='VD') | Q(profile_status='DSM')
-    ).count()
+    return get_staff_counters().inactive_users_number
 
 
 @register.simple_tag()
 def wait_explanation_misconducts() -> int:
     """Returns number of misconducts awaiting explanation"""
-    return Misconduct.objects.filter(
-        status=Misconduct.MisconductStatus.ADDED).exclude(
-            intruder__profile__profile_status=Profile.ProfileStatus.DISMISSED
-        ).count()
+    return get_staff_counters().wait_explanation_misconducts_number
 
 
 @register.simple_tag()
 def wait_decision_misconducts() -> int:
     """Returns number of misconducts awaiting resolution"""
-    return Misconduct.objects.filter(
-        status=Misconduct.MisconductStatus.WAIT).exclude(
-            intruder__profile__profile_status=Profile.ProfileStatus.DISMISSED
-        ).count()
+    return get_staff_counters().wait_decision_misconducts_number
 
 
 @register.simple_tag()
 def get_unread_messages(user: User) -> int:
-    return get_unread_messages_number(user)
+    return get_unread_messages_counter(user)
 
 
 @register.simple_tag()
 def check_image_file_exists(profile: Profile) -> bool:
-    return profile_photo_is_exists(profile)
+    return profile.has_photo
@@ -1,3 +1,1159 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import os
+import tempfile
+import time
+from io import StringIO
 
-# Create your tests here.
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import F, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from salary.middleware import (
+    recalculation_middleware, request_memo_middleware
+)
+from salary.models import (
+    ArchivedMessage, Chat, Cost, DisciplinaryRegulations, EarningsSnapshot,
+    ErrorKNA, Message, Misconduct, MonthlyEmployeeAggregate, Position,
+    Profile, WorkingShift, PlannedShift, WorksheetCopy,
+    penalties_recalculation_queue
+)
+from salary.services.chat import (
+    encode_message_cursor, get_chats_list, get_members_chat,
+    get_messages_page, get_unread_messages_number, mark_chat_as_read,
+    members_chat_exists
+)
+from salary.services.chat_archive import archive_messages
+from salary.services.chat_updates import wait_chat_updates
+from salary.services.earnings import get_batch_earnings, get_current_earnings
+from salary.services.google_sheets import gsheets_circuit_breaker
+from salary.services.circuit_breaker import (
+    CircuitBreaker, CircuitOpenError, CircuitState
+)
+from salary.services.counters import (
+    get_staff_counters, get_unread_messages_counter
+)
+from salary.services.employees_index import (
+    get_employee_by_id, get_employee_by_name
+)
+from salary.services.schedule import (
+    WorksheetScheduleProvider, FileScheduleProvider,
+    GoogleSheetsScheduleProvider, DatabaseScheduleProvider, get_employees_schedule_dict, sync_planned_shifts
+)
+from salary.services.shift_calendar import (
+    get_team_calendar, get_user_calendar
+)
+from salary.services.misconduct import get_intruders_queryset
+from salary.services import monthly_reports
+from salary.services.monthly_reports import (
+    get_filtered_rating_data, get_monthly_employee_categories,
+    rebuild_monthly_aggregates
+)
+from salary.services.request_memo import request_memo_scope
+from salary.services.workshift import (
+    get_employee_workshift_indicators, get_employee_unclosed_workshifts_dates,
+    get_missed_dates, get_missed_dates_by_months, get_missed_dates_tuple,
+    notification_of_upcoming_shifts
+)
+
+
+fake_worksheet_requests = []
+fake_worksheet_data = [
+    ['', '1', '2', '3'],
+    ['IVANOV  Ivan ', 'Р', '', 'р '],
+    ['Unknown Name', 'Р', 'Р', ''],
+]
+
+
+class FakeScheduleProvider(WorksheetScheduleProvider):
+    """Returns worksheet grid without any network request"""
+
+    def get_worksheet_data(self, worksheet_name: str) -> list[list[str]]:
+        fake_worksheet_requests.append(worksheet_name)
+        return fake_worksheet_data
+
+
+class EmployeesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cash_position = Position.objects.create(
+            title='Администратор кассы', name='cash_admin',
+            position_salary=1500.0
+        )
+        hall_position = Position.objects.create(
+            title='Администратор зала', name='hall_admin',
+            position_salary=1200.0
+        )
+        cls.cashier = cls._create_employee('cashier', cash_position)
+        cls.hall_admin = cls._create_employee('hall_admin', hall_position)
+
+    @staticmethod
+    def _create_employee(username: str, position: Position) -> User:
+        employee = User.objects.create(
+            username=username, first_name=username, last_name=username)
+        employee.profile.position = position
+        employee.profile.employment_date = datetime.date(2021, 1, 1)
+        employee.profile.save()
+        return employee
+
+    def _create_workshift(self, shift_date: datetime.date) -> WorkingShift:
+        return WorkingShift.objects.create(
+            shift_date=shift_date,
+            cash_admin=self.cashier,
+            hall_admin=self.hall_admin,
+            bar_revenue=4000.0,
+            game_zone_revenue=20000.0,
+            hookah_revenue=1000.0,
+            shortage=100.0,
+            status=WorkingShift.WorkshiftStatus.VERIFIED
+        )
+
+    def setUp(self):
+        cache.clear()
+
+
+class EmployeeIndicatorsQueriesTest(EmployeesTestCase):
+    month, year = 2, 2022
+
+    def _create_workshifts(self, number: int) -> None:
+        for day in range(1, number + 1):
+            self._create_workshift(datetime.date(self.year, self.month, day))
+
+    def _assert_indicators_queries(self, workshifts_number: int) -> None:
+        self._create_workshifts(workshifts_number)
+        for employee in (self.cashier, self.hall_admin):
+            indicators = get_employee_workshift_indicators(
+                employee.id, self.month, self.year)
+            self.assertEqual(indicators.number_of_total_workshifts,
+                             workshifts_number)
+            self.assertEqual(indicators.number_of_verified_workshifts,
+                             workshifts_number)
+            with self.assertNumQueries(1):
+                get_employee_workshift_indicators(
+                    employee.id, self.month, self.year, is_cashier=False)
+            # Position is taken from the cached employees index.
+            with self.assertNumQueries(1):
+                get_employee_workshift_indicators(
+                    employee.id, self.month, self.year)
+
+    def test_indicators_queries_for_few_workshifts(self):
+        self._assert_indicators_queries(2)
+
+    def test_indicators_queries_for_many_workshifts(self):
+        self._assert_indicators_queries(20)
+
+    def test_indicators_summary_shortage(self):
+        self._create_workshifts(3)
+        indicators = get_employee_workshift_indicators(
+            self.cashier.id, self.month, self.year)
+        self.assertEqual(indicators.summary_shortage, 300.0)
+
+    @override_settings(
+        SCHEDULE_PROVIDER='salary.services.schedule.DatabaseScheduleProvider')
+    def test_calendar_queries_do_not_depend_on_month(self):
+        self._create_workshifts(20)
+        for day in (27, 28):
+            PlannedShift.objects.create(
+                user=self.cashier,
+                date=datetime.date(self.year, self.month, day)
+            )
+        for month in (self.month, 5, 10):
+            with self.assertNumQueries(3 if month == self.month else 2):
+                user_calendar = get_user_calendar(
+                    self.cashier.id, self.year, month)
+        user_calendar = get_user_calendar(
+            self.cashier.id, self.year, self.month)
+        self.assertEqual(user_calendar.complited_shifts_count, 20)
+        self.assertEqual(user_calendar.planed_shifts_count, 1)
+
+    @override_settings(
+        SCHEDULE_PROVIDER='salary.services.schedule.DatabaseScheduleProvider')
+    def test_team_calendar_queries_and_coverage(self):
+        self._create_workshifts(20)
+        for employee in (self.cashier, self.hall_admin):
+            PlannedShift.objects.create(
+                user=employee,
+                date=datetime.date(self.year, self.month, 25)
+            )
+        PlannedShift.objects.create(
+            user=self.cashier, date=datetime.date(self.year, self.month, 26))
+        self.cashier.user_permissions.add(Permission.objects.get(
+            codename='add_workingshift', content_type__app_label='salary'))
+        get_employee_by_id(self.cashier.id)
+        with self.assertNumQueries(4):
+            team_calendar = get_team_calendar(
+                User.objects.order_by('pk'), self.year, self.month)
+        self.assertEqual(
+            [row.calendar.complited_shifts_count
+             for row in team_calendar.rows],
+            [20, 20]
+        )
+        self.assertEqual(
+            [coverage_day.date.day
+             for coverage_day in team_calendar.coverage
+             if not coverage_day.is_gap],
+            [25]
+        )
+        self.assertEqual(team_calendar.coverage[25].cashiers_count, 1)
+
+    @override_settings(
+        SCHEDULE_PROVIDER='salary.services.schedule.DatabaseScheduleProvider',
+        TIME_ZONE='UTC', USE_TZ=True)
+    def test_dashboard_queries(self):
+        self.cashier.profile.profile_status = Profile.ProfileStatus.VERIFIED
+        self.cashier.profile.save()
+        self.cashier.user_permissions.add(Permission.objects.get(
+            codename='view_workingshift', content_type__app_label='salary'))
+        self._create_workshift(timezone.localdate())
+        self.client.force_login(self.cashier)
+        expected_queries = {
+            reverse('index'): 10,
+            reverse('employee_workshifts'): 8,
+        }
+        for url, queries_count in expected_queries.items():
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(len(queries), queries_count)
+            self.assertFalse([
+                query for query in queries
+                if query['sql'].startswith('SELECT "salary_position"')
+            ])
+
+
+@override_settings(
+    SCHEDULE_PROVIDER='salary.services.schedule.DatabaseScheduleProvider',
+    TIME_ZONE='UTC', USE_TZ=True)
+class WorkshiftDatesMemoTest(EmployeesTestCase):
+    def test_missed_dates_are_computed_once(self):
+        today = timezone.localdate(timezone.now())
+        with request_memo_scope():
+            with self.assertNumQueries(1):
+                missed_dates = get_missed_dates_tuple()
+            with self.assertNumQueries(0):
+                get_missed_dates_tuple()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_missed_dates_tuple(), missed_dates)
+        self.assertIn(today, missed_dates)
+
+        with request_memo_scope():
+            get_missed_dates_tuple()
+            self._create_workshift(today)
+            self.assertNotIn(today, get_missed_dates_tuple())
+
+    def test_missed_dates_in_range_and_history(self):
+        for shift_date in ('2021-12-30', '2022-01-02', '2022-01-03'):
+            self._create_workshift(datetime.date.fromisoformat(shift_date))
+        with self.assertNumQueries(1):
+            missed_dates = get_missed_dates(
+                datetime.date(2021, 12, 29), datetime.date(2022, 1, 4))
+        self.assertEqual(missed_dates, (
+            datetime.date(2021, 12, 29), datetime.date(2021, 12, 31),
+            datetime.date(2022, 1, 1), datetime.date(2022, 1, 4)
+        ))
+        history_missed_dates = get_missed_dates(None, datetime.date(2022, 1, 4))
+        self.assertEqual(history_missed_dates, missed_dates[1:])
+        self.assertEqual(
+            [missed_month.month_date.month for missed_month
+             in get_missed_dates_by_months(history_missed_dates)],
+            [1, 12]
+        )
+
+    def test_unclosed_dates_use_planed_dates_once(self):
+        today = timezone.localdate(timezone.now())
+        yesterday = today - datetime.timedelta(days=1)
+        PlannedShift.objects.create(user=self.cashier, date=yesterday)
+        self.cashier.user_permissions.add(
+            Permission.objects.get(codename='add_workingshift'))
+        with request_memo_scope():
+            self.assertTrue(notification_of_upcoming_shifts(
+                self.cashier.id, yesterday - datetime.timedelta(days=1)))
+            with self.assertNumQueries(4):
+                unclosed_dates = get_employee_unclosed_workshifts_dates(
+                    self.cashier.id)
+            with self.assertNumQueries(0):
+                get_employee_unclosed_workshifts_dates(self.cashier.id)
+        self.assertEqual(unclosed_dates, (today,))
+
+
+
+class StaffCountersTest(EmployeesTestCase):
+    def test_counters_are_cached_until_change(self):
+        workshift = self._create_workshift(datetime.date(2022, 2, 1))
+        with self.assertNumQueries(3):
+            staff_counters = get_staff_counters()
+        self.assertEqual(staff_counters.unclosed_workshifts_number, 0)
+        with self.assertNumQueries(0):
+            get_staff_counters()
+
+        workshift.status = WorkingShift.WorkshiftStatus.WAIT_CORRECTION
+        workshift.save()
+        staff_counters = get_staff_counters()
+        self.assertEqual(staff_counters.unclosed_workshifts_number, 1)
+        self.assertEqual(staff_counters.wait_fix_workshifts_number, 1)
+
+    def test_unread_messages_counter_is_invalidated(self):
+        chat = Chat.objects.create()
+        chat.members.add(self.cashier, self.hall_admin)
+        self.assertEqual(get_unread_messages_counter(self.cashier), 0)
+        Message.objects.create(
+            chat=chat, author=self.hall_admin, message_text='Hello')
+        self.assertEqual(get_unread_messages_counter(self.cashier), 1)
+        with self.assertNumQueries(0):
+            get_unread_messages_counter(self.cashier)
+
+
+class ChatsListTest(EmployeesTestCase):
+    def test_chats_list_is_loaded_with_single_query(self):
+        for number in range(5):
+            interlocutor = User.objects.create(
+                username=f'user_{number}', first_name='Ivan',
+                last_name=f'Ivanov{number}'
+            )
+            chat = Chat.objects.create()
+            chat.members.add(self.cashier, interlocutor)
+            for author in (interlocutor, interlocutor, self.cashier):
+                Message.objects.create(
+                    chat=chat, author=author, message_text='Hello')
+        with self.assertNumQueries(1):
+            chats_list = get_chats_list(self.cashier.id)
+        self.assertEqual(len(chats_list), 5)
+        self.assertEqual(chats_list[0].full_name, 'Ivanov4 Ivan')
+        self.assertEqual(
+            {dialog.unread_messages_count for dialog in chats_list}, {2})
+
+    def test_chat_is_read_with_single_write(self):
+        chat = Chat.objects.create()
+        chat.members.add(self.cashier, self.hall_admin)
+        for _ in range(10):
+            Message.objects.create(
+                chat=chat, author=self.hall_admin, message_text='Hello')
+        self.assertEqual(get_unread_messages_number(self.cashier), 10)
+        with self.assertNumQueries(2):
+            mark_chat_as_read(chat, self.cashier)
+        self.assertEqual(get_unread_messages_number(self.cashier), 0)
+        self.assertEqual(get_unread_messages_counter(self.cashier), 0)
+        Message.objects.create(
+            chat=chat, author=self.hall_admin, message_text='Hello')
+        self.assertEqual(get_unread_messages_number(self.cashier), 1)
+
+    def test_direct_chat_is_found_by_members_pair(self):
+        self.assertIsNone(members_chat_exists(self.cashier, self.hall_admin))
+        chat = get_members_chat(self.hall_admin, self.cashier)
+        self.assertEqual(set(chat.members.all()),
+                         {self.cashier, self.hall_admin})
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                get_members_chat(self.cashier, self.hall_admin), chat)
+        self.assertEqual(
+            members_chat_exists(self.cashier, self.hall_admin), chat)
+
+    @override_settings(CHAT_PAGE_SIZE=4)
+    def test_messages_are_paginated_by_cursor(self):
+        chat = Chat.objects.create()
+        chat.members.add(self.cashier, self.hall_admin)
+        messages = [
+            Message.objects.create(
+                chat=chat, author=self.hall_admin, message_text=str(number))
+            for number in range(10)
+        ]
+        messages_page = get_messages_page(chat)
+        self.assertEqual(messages_page.messages, messages[6:])
+        messages_page = get_messages_page(chat, messages_page.older_cursor)
+        self.assertEqual(messages_page.messages, messages[2:6])
+        messages_page = get_messages_page(chat, messages_page.older_cursor)
+        self.assertEqual(messages_page.messages, messages[:2])
+        self.assertIsNone(messages_page.older_cursor)
+
+        self.client.force_login(self.cashier)
+        url = reverse('messenger_new_messages', kwargs={'slug': chat.slug})
+        response = self.client.get(
+            url, {'after': encode_message_cursor(messages[7])})
+        self.assertEqual(
+            [message['message_text']
+             for message in response.json()['messages']],
+            ['8', '9']
+        )
+        self.assertEqual(response.json()['cursor'],
+                         encode_message_cursor(messages[9]))
+        self.assertEqual(get_unread_messages_number(self.cashier), 0)
+        self.assertEqual(
+            self.client.get(url, {'after': 'wrong'}).status_code, 400)
+        self.client.force_login(self.hall_admin)
+        chat.members.remove(self.hall_admin)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(CHAT_PAGE_SIZE=4, CHAT_ARCHIVE_AFTER_DAYS=30)
+    def test_archived_messages_are_read_through(self):
+        chat = Chat.objects.create()
+        chat.members.add(self.cashier, self.hall_admin)
+        messages = [
+            Message.objects.create(
+                chat=chat, author=self.hall_admin, message_text=str(number))
+            for number in range(6)
+        ]
+        Message.objects.filter(
+            pk__in=[message.pk for message in messages[:5]]
+        ).update(sending_time=F('sending_time') - datetime.timedelta(days=31))
+        unread_number = get_unread_messages_counter(self.cashier)
+        with mock.patch('salary.services.chat_archive.'
+                        'invalidate_messages_counters') as invalidate, \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_chat_messages', batch_size=2,
+                         stdout=StringIO())
+        self.assertEqual(invalidate.call_count, 3)
+        self.assertEqual(get_unread_messages_counter(self.cashier),
+                         unread_number - 5)
+        self.assertEqual(Message.objects.count(), 1)
+        self.assertEqual(ArchivedMessage.objects.count(), 5)
+
+        messages_page = get_messages_page(chat)
+        self.assertEqual(
+            [message.message_text for message in messages_page.messages],
+            ['2', '3', '4', '5']
+        )
+        messages_page = get_messages_page(chat, messages_page.older_cursor)
+        self.assertEqual(
+            [message.message_text for message in messages_page.messages],
+            ['0', '1']
+        )
+        self.assertIsNone(messages_page.older_cursor)
+
+    def _open_chat_page(self, chat: Chat, **params) -> str:
+        self.cashier.profile.profile_status = Profile.ProfileStatus.VERIFIED
+        self.cashier.profile.save()
+        self.client.force_login(self.cashier)
+        response = self.client.get(
+            reverse('messenger_open_chat', kwargs={'slug': chat.slug}),
+            params
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    @override_settings(TIME_ZONE='UTC', USE_TZ=True)
+    def test_empty_chat_waits_new_messages(self):
+        chat = Chat.objects.create()
+        chat.members.add(self.cashier, self.hall_admin)
+        page = self._open_chat_page(chat)
+        self.assertIn('data-newest-cursor=""', page)
+        self.assertIn('waitMessages();', page)
+
+    @override_settings(CHAT_PAGE_SIZE=2, TIME_ZONE='UTC', USE_TZ=True)
+    def test_older_messages_page_does_not_wait_new_messages(self):
+        chat = Chat.objects.create()
+        chat.members.add(self.cashier, self.hall_admin)
+        for number in range(3):
+            Message.objects.create(
+                chat=chat, author=self.hall_admin, message_text=str(number))
+        page = self._open_chat_page(chat)
+        self.assertIn('Загрузить ранее', page)
+        self.assertIn('waitMessages();', page)
+        older_cursor = get_messages_page(chat).older_cursor
+        page = self._open_chat_page(chat, before=older_cursor)
+        self.assertNotIn('waitMessages();', page)
+        self.assertIn('К последним сообщениям', page)
+
+    def test_archive_conflict_keeps_hot_messages(self):
+        chat = Chat.objects.create()
+        chat.members.add(self.cashier, self.hall_admin)
+        message = Message.objects.create(
+            chat=chat, author=self.hall_admin, message_text='Hello')
+        ArchivedMessage.objects.create(
+            id=message.id, chat=chat, author=self.hall_admin,
+            message_text='Other', sending_time=message.sending_time
+        )
+        with self.assertRaises(IntegrityError):
+            archive_messages(timezone.now() + datetime.timedelta(days=1))
+        self.assertTrue(Message.objects.filter(pk=message.pk).exists())
+
+
+@override_settings(CHAT_DB_POLL_INTERVAL=30)
+class ChatUpdatesTest(EmployeesTestCase):
+    def setUp(self):
+        self.chat = Chat.objects.create()
+        self.chat.members.add(self.cashier, self.hall_admin)
+        self.cursor = encode_message_cursor(Message.objects.create(
+            chat=self.chat, author=self.cashier, message_text='Hello'))
+
+    def _send_message(self, chat: Chat | None = None):
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(
+                chat=chat or self.chat, author=self.hall_admin,
+                message_text='Hi'
+            )
+
+    def _create_other_chat(self) -> Chat:
+        other_chat = Chat.objects.create()
+        other_chat.members.add(self.cashier, self.hall_admin)
+        self.async_client.force_login(self.cashier)
+        return other_chat
+
+    def test_middleware_is_async_capable(self):
+        async def get_response(request):
+            pass
+
+        for middleware in (recalculation_middleware, request_memo_middleware):
+            self.assertTrue(
+                asyncio.iscoroutinefunction(middleware(get_response)))
+
+    @override_settings(CHAT_LONG_POLL_TIMEOUT=3)
+    async def test_long_poll_request_returns_new_unread_count(self):
+        other_chat = await sync_to_async(self._create_other_chat)()
+        started_time = time.monotonic()
+        waiting = asyncio.create_task(self.async_client.get(
+            reverse('messenger_wait_messages', kwargs={'slug': self.chat.slug}),
+            {'after': self.cursor, 'unread': 0}
+        ))
+        await asyncio.sleep(0.3)
+        await sync_to_async(self._send_message)(other_chat)
+        response = await waiting
+        self.assertLess(time.monotonic() - started_time, 2)
+        self.assertEqual(response.json()['messages'], [])
+        self.assertEqual(response.json()['unread_messages_count'], 1)
+
+    async def test_empty_cursor_returns_first_messages(self):
+        chat_updates = await wait_chat_updates(
+            self.chat, self.cashier, '', unread_messages_count=0, timeout=1)
+        self.assertEqual(
+            [message['message_text'] for message in chat_updates.messages],
+            ['Hello']
+        )
+        self.assertEqual(chat_updates.cursor, self.cursor)
+
+    async def test_waiting_request_is_woken_up_by_new_message(self):
+        started_time = time.monotonic()
+        waiting = asyncio.create_task(wait_chat_updates(
+            self.chat, self.cashier, self.cursor, unread_messages_count=0,
+            timeout=10
+        ))
+        await asyncio.sleep(0.1)
+        await sync_to_async(self._send_message)()
+        chat_updates = await waiting
+        self.assertLess(time.monotonic() - started_time, 5)
+        self.assertEqual(
+            [message['message_text'] for message in chat_updates.messages],
+            ['Hi']
+        )
+        self.assertEqual(chat_updates.unread_messages_count, 0)
+
+    async def test_waiting_request_is_finished_by_timeout(self):
+        started_time = time.monotonic()
+        chat_updates = await wait_chat_updates(
+            self.chat, self.cashier, self.cursor, unread_messages_count=0,
+            timeout=0.2
+        )
+        self.assertGreaterEqual(time.monotonic() - started_time, 0.2)
+        self.assertEqual(chat_updates.messages, [])
+        self.assertEqual(chat_updates.cursor, self.cursor)
+
+
+class MonthlyAggregatesTest(EmployeesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.workshift = self._create_workshift(datetime.date(2022, 2, 1))
+        self._create_workshift(datetime.date(2022, 2, 2))
+
+    def _get_aggregates(self) -> list[tuple]:
+        return list(MonthlyEmployeeAggregate.objects.filter(
+            year=2022, month=2).values_list('employee_id', 'shift_counter'))
+
+    def test_aggregates_are_rebuilt_idempotently(self):
+        categories = get_monthly_employee_categories(month=2, year=2022)
+        self.assertEqual(
+            [employee.shift_counter for employee in categories.cashier_list],
+            [2]
+        )
+        rebuild_monthly_aggregates(month=2, year=2022)
+        self.assertEqual(
+            sorted(self._get_aggregates()),
+            [(self.cashier.id, 2), (self.hall_admin.id, 2)]
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                get_monthly_employee_categories(month=2, year=2022),
+                categories
+            )
+
+    def test_empty_month_is_rebuilt_once(self):
+        get_monthly_employee_categories(month=3, year=2022)
+        with self.assertNumQueries(1):
+            categories = get_monthly_employee_categories(month=3, year=2022)
+        self.assertEqual(categories.cashier_list, [])
+        self._create_workshift(datetime.date(2022, 3, 1))
+        categories = get_monthly_employee_categories(month=3, year=2022)
+        self.assertEqual(len(categories.cashier_list), 1)
+
+    def test_aggregates_are_invalidated_by_report_fields(self):
+        rebuild_monthly_aggregates(month=2, year=2022)
+        workshift = WorkingShift.objects.get(pk=self.workshift.pk)
+        workshift.comment_for_cash_admin = 'Comment'
+        workshift.save()
+        self.assertEqual(len(self._get_aggregates()), 2)
+        workshift.bar_revenue = 5000.0
+        workshift.save()
+        self.assertEqual(self._get_aggregates(), [])
+
+    def test_deferred_date_change_invalidates_only_affected_months(self):
+        self._create_workshift(datetime.date(2022, 3, 1))
+        self._create_workshift(datetime.date(2022, 4, 1))
+        for month in (2, 3, 4):
+            rebuild_monthly_aggregates(month=month, year=2022)
+        workshift = WorkingShift.objects.only('id').get(pk=self.workshift.pk)
+        workshift.shift_date = datetime.date(2022, 4, 2)
+        workshift.save()
+        self.assertEqual(
+            set(MonthlyEmployeeAggregate.objects.values_list(
+                'month', flat=True)),
+            {3}
+        )
+
+    def test_command_rebuilds_range_of_months(self):
+        self._create_workshift(datetime.date(2022, 3, 1))
+        with self.assertRaisesMessage(CommandError, 'YYYY-MM'):
+            call_command('rebuild_monthly_aggregates', '--start=02.2022')
+        call_command('rebuild_monthly_aggregates', '--start=2022-02',
+                     '--end=2022-02', stdout=StringIO())
+        self.assertEqual(
+            set(MonthlyEmployeeAggregate.objects.values_list(
+                'month', flat=True)),
+            {2}
+        )
+
+
+class BatchEarningsTest(EmployeesTestCase):
+    def _get_revenue_values(self) -> list[float]:
+        thresholds = {
+            max_value
+            for criteria in (settings.ADMIN_BONUS_CRITERIA,
+                             settings.CASHIER_BONUS_CRITERIA)
+            for criterias in criteria
+            for max_value, _ in criterias
+        }
+        return sorted(
+            max(threshold + delta, 0.0)
+            for threshold in thresholds for delta in (-0.01, 0.0, 0.01)
+        )
+
+    @override_settings(ATTESTATION_ENABLED=True, PUBLICATION_ENABLED=True)
+    def test_batch_earnings_is_equal_to_current_earnings(self):
+        self.hall_admin.profile.attestation_date = datetime.date(2022, 1, 10)
+        experience_date = datetime.date(2021, 1, 1) + datetime.timedelta(
+            days=settings.REQUIRED_EXPERIENCE)
+        shift_dates = (
+            experience_date - datetime.timedelta(days=1), experience_date,
+            datetime.date(2022, 1, 9), datetime.date(2022, 1, 10),
+        )
+        workshifts = []
+        for number, value in enumerate(self._get_revenue_values(), 1):
+            workshifts.append(WorkingShift(
+                pk=number, shift_date=shift_dates[number % len(shift_dates)],
+                hall_admin=self.hall_admin, cash_admin=self.cashier,
+                bar_revenue=value, game_zone_subtotal=value,
+                additional_services_revenue=value, hookah_revenue=value,
+                hall_cleaning=bool(number % 2), shortage=value / 100,
+                shortage_paid=not number % 3,
+                publication_is_verified=bool(number % 2),
+                hall_admin_penalty=number * 100.0,
+                cash_admin_penalty=number * 50.0,
+            ))
+        batch_earnings = get_batch_earnings(workshifts)
+        for workshift in workshifts:
+            workshift_data = workshift.get_workshift_data()
+            self.assertEqual(
+                batch_earnings[workshift.pk].hall_admin,
+                get_current_earnings(self.hall_admin, workshift_data)
+            )
+            self.assertEqual(
+                batch_earnings[workshift.pk].cashier,
+                get_current_earnings(self.cashier, workshift_data,
+                                     is_cashier=True)
+            )
+
+
+class EarningsSnapshotsTest(EmployeesTestCase):
+    def _get_workshifts(self) -> list[WorkingShift]:
+        return list(WorkingShift.objects.select_related(
+            'hall_admin__profile__position', 'cash_admin__profile__position'
+        ).prefetch_related('earnings_snapshots').order_by('pk'))
+
+    def _assert_snapshots_are_actual(self) -> None:
+        workshifts = self._get_workshifts()
+        earnings_dict = get_batch_earnings(workshifts)
+        for workshift in workshifts:
+            self.assertEqual(workshift.get_snapshot_earnings(),
+                             earnings_dict[workshift.pk])
+
+    def test_snapshots_are_saved_with_workshift(self):
+        workshift = self._create_workshift(datetime.date(2022, 2, 1))
+        self.assertEqual(workshift.earnings_snapshots.count(), 2)
+        self._assert_snapshots_are_actual()
+        workshift.bar_revenue = 9000.0
+        workshift.save()
+        self.assertEqual(workshift.earnings_snapshots.count(), 2)
+        self._assert_snapshots_are_actual()
+
+    def test_repeated_refresh_upserts_snapshots(self):
+        for day in (1, 2):
+            self._create_workshift(datetime.date(2022, 2, day))
+        WorkingShift.objects.update(bar_revenue=9000.0)
+        for _ in range(2):
+            EarningsSnapshot.refresh_for_workshifts(self._get_workshifts())
+        self.assertEqual(EarningsSnapshot.objects.count(), 4)
+        self._assert_snapshots_are_actual()
+
+    def test_command_backfills_snapshots(self):
+        for day in range(1, 4):
+            self._create_workshift(datetime.date(2022, 2, day))
+        workshifts = self._get_workshifts()
+        workshifts[0].earnings_snapshots.all().delete()
+        workshifts[1].earnings_snapshots.update(final_earnings=0.0)
+        with self.assertRaises(CommandError):
+            call_command('refresh_earnings_snapshots', verify=True,
+                         stdout=StringIO())
+        call_command('refresh_earnings_snapshots', chunk_size=2,
+                     stdout=StringIO())
+        self.assertEqual(EarningsSnapshot.objects.count(), 6)
+        self._assert_snapshots_are_actual()
+        call_command('refresh_earnings_snapshots', verify=True,
+                     stdout=StringIO())
+
+
+class PenaltiesRecalculationTest(EmployeesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.regulations_article = DisciplinaryRegulations.objects.create(
+            article='1.1', title='Опоздание')
+        self.workshift = self._create_workshift(datetime.date(2022, 2, 1))
+        self.other_workshift = self._create_workshift(
+            datetime.date(2022, 2, 2))
+
+    def _create_misconduct(self, workshift_date: datetime.date,
+                           penalty: float) -> Misconduct:
+        return Misconduct.objects.create(
+            misconduct_date=workshift_date, workshift_date=workshift_date,
+            intruder=self.cashier, moderator=self.hall_admin,
+            regulations_article=self.regulations_article, penalty=penalty,
+            status=Misconduct.MisconductStatus.CLOSED
+        )
+
+    def test_penalties_are_recalculated_once_after_commit(self):
+        with mock.patch.object(
+                WorkingShift, 'update_penalties',
+                autospec=True,
+                side_effect=WorkingShift.update_penalties) as update:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for penalty in (100.0, 200.0, 300.0):
+                        misconduct = self._create_misconduct(
+                            self.workshift.shift_date, penalty)
+                    misconduct.workshift_date = self.other_workshift.shift_date
+                    misconduct.save()
+                    update.assert_not_called()
+        self.assertEqual(
+            sorted(call.args[0].pk for call in update.call_args_list),
+            [self.workshift.pk, self.other_workshift.pk]
+        )
+        self.workshift.refresh_from_db()
+        self.other_workshift.refresh_from_db()
+        self.assertEqual(self.workshift.cash_admin_penalty, 300.0)
+        self.assertEqual(self.other_workshift.cash_admin_penalty, 300.0)
+
+    def test_deleted_misconduct_is_recalculated_by_queue(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            misconduct = self._create_misconduct(
+                self.workshift.shift_date, 100.0)
+        with mock.patch.object(penalties_recalculation_queue,
+                               'handler') as handler:
+            with self.captureOnCommitCallbacks(execute=True):
+                misconduct.delete()
+        handler.assert_called_once_with({self.workshift.shift_date})
+
+    def test_deferred_workshift_date_change_recalculates_only_its_dates(self):
+        self._create_workshift(datetime.date(2022, 3, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            misconduct = self._create_misconduct(
+                self.workshift.shift_date, 100.0)
+            self._create_misconduct(datetime.date(2022, 3, 1), 100.0)
+        misconduct = Misconduct.objects.only('id').get(pk=misconduct.pk)
+        misconduct.workshift_date = self.other_workshift.shift_date
+        with mock.patch.object(penalties_recalculation_queue,
+                               'handler') as handler:
+            with self.captureOnCommitCallbacks(execute=True):
+                misconduct.save()
+        handler.assert_called_once_with(
+            {self.workshift.shift_date, self.other_workshift.shift_date})
+
+
+class RatingCacheTest(EmployeesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.workshift = self._create_workshift(datetime.date(2022, 2, 1))
+
+    def _assert_rating_calculations(self, number: int) -> None:
+        with mock.patch.object(
+                monthly_reports, '_get_filtered_rating_data',
+                wraps=monthly_reports._get_filtered_rating_data) as calculate:
+            get_filtered_rating_data(month=2, year=2022)
+        self.assertEqual(calculate.call_count, number)
+
+    def test_rating_is_cached_until_versions_are_bumped(self):
+        self._assert_rating_calculations(1)
+        with self.assertNumQueries(0):
+            get_filtered_rating_data(month=2, year=2022)
+        self._create_workshift(datetime.date(2022, 3, 1))
+        self._assert_rating_calculations(0)
+        self.workshift.bar_revenue = 9000.0
+        self.workshift.save()
+        self._assert_rating_calculations(1)
+        position = self.cashier.profile.position
+        position.position_salary = 2000.0
+        position.save()
+        self._assert_rating_calculations(1)
+        self._assert_rating_calculations(0)
+
+
+class WorkshiftSumsTest(EmployeesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.workshift = self._create_workshift(datetime.date(2022, 2, 1))
+        self.other_workshift = self._create_workshift(
+            datetime.date(2022, 2, 2))
+
+    def _create_error(self, workshift: WorkingShift,
+                      error_sum: float) -> ErrorKNA:
+        return ErrorKNA.objects.create(
+            error_time=datetime.time(12), card='1', error_sum=error_sum,
+            workshift=workshift
+        )
+
+    def _get_month_sums(self) -> dict:
+        return WorkingShift.objects.filter(
+            shift_date__year=2022, shift_date__month=2).aggregate(
+                Sum('game_zone_error'), Sum('cost_sum'),
+                Sum('summary_revenue'))
+
+    def _assert_sums_are_actual(self) -> None:
+        month_sums = self._get_month_sums()
+        for workshift in WorkingShift.objects.all():
+            workshift.refresh_aggregates()
+        self.assertEqual(month_sums, self._get_month_sums())
+
+    def test_deltas_keep_month_sums(self):
+        error = self._create_error(self.workshift, 300.0)
+        self._create_error(self.other_workshift, 200.0)
+        cost = Cost.objects.create(
+            cost_sum=150.0, cost_reason='Reason', cost_person=self.cashier,
+            workshift=self.workshift
+        )
+        error.error_sum = 500.0
+        error.workshift = self.other_workshift
+        error.save()
+        cost.cost_sum = 50.0
+        cost.save()
+        self.assertEqual(self._get_month_sums(), {
+            'game_zone_error__sum': 700.0,
+            'cost_sum__sum': 50.0,
+            'summary_revenue__sum': 49300.0,
+        })
+        self._assert_sums_are_actual()
+        error.delete()
+        cost.delete()
+        self.assertEqual(self._get_month_sums()['game_zone_error__sum'], 200.0)
+        self._assert_sums_are_actual()
+
+    def test_deferred_error_sum_is_recalculated(self):
+        error = self._create_error(self.workshift, 300.0)
+        deferred_error = ErrorKNA.objects.defer('error_sum').get(pk=error.pk)
+        deferred_error.error_sum += 100.0
+        deferred_error.save()
+        unknown_error = ErrorKNA.objects.only('id').get(pk=error.pk)
+        unknown_error.error_sum = 250.0
+        unknown_error.save()
+        self.workshift.refresh_from_db()
+        self.assertEqual(self.workshift.game_zone_error, 250.0)
+        self.assertEqual(self.workshift.summary_revenue, 24750.0)
+
+    def test_save_skips_recalculation_of_other_fields(self):
+        workshift = WorkingShift.objects.get(pk=self.workshift.pk)
+        workshift.comment_for_cash_admin = 'Comment'
+        with mock.patch.object(
+                WorkingShift, 'calculate_penalties') as calculate_penalties, \
+                mock.patch.object(WorkingShift,
+                                  'refresh_earnings_snapshots') as refresh:
+            workshift.save()
+        calculate_penalties.assert_not_called()
+        refresh.assert_not_called()
+
+    def test_deferred_workshift_is_recalculated(self):
+        workshift = WorkingShift.objects.only('id').get(pk=self.workshift.pk)
+        workshift.bar_revenue = 5000.0
+        workshift.save()
+        self.workshift.refresh_from_db()
+        self.assertEqual(self.workshift.summary_revenue, 26000.0)
+        workshift = WorkingShift.objects.only(
+            'id', 'comment_for_cash_admin').get(pk=self.workshift.pk)
+        workshift.comment_for_cash_admin = 'Comment'
+        with mock.patch.object(WorkingShift,
+                               'refresh_earnings_snapshots') as refresh:
+            workshift.save()
+        refresh.assert_not_called()
+
+
+class IntrudersListTest(EmployeesTestCase):
+    def test_intruders_are_counted_with_single_query(self):
+        regulations_article = DisciplinaryRegulations.objects.create(
+            article='1.1', title='Опоздание')
+        statuses = {
+            self.cashier: [Misconduct.MisconductStatus.ADDED,
+                           Misconduct.MisconductStatus.WAIT,
+                           Misconduct.MisconductStatus.CLOSED],
+            self.hall_admin: [Misconduct.MisconductStatus.ADDED],
+        }
+        for intruder, intruder_statuses in statuses.items():
+            for status in intruder_statuses:
+                Misconduct.objects.create(
+                    misconduct_date=datetime.date(2022, 2, 1),
+                    workshift_date=datetime.date(2022, 2, 1),
+                    intruder=intruder, moderator=self.cashier,
+                    regulations_article=regulations_article, status=status
+                )
+        with self.assertNumQueries(1):
+            intruders = [
+                (intruder, intruder.total_count, intruder.explanation_count,
+                 intruder.decision_count)
+                for intruder in get_intruders_queryset()
+            ]
+        self.assertEqual(intruders, [(self.cashier, 3, 1, 1),
+                                     (self.hall_admin, 1, 1, 0)])
+
+        Profile.objects.filter(user=self.hall_admin).update(
+            profile_status=Profile.ProfileStatus.DISMISSED)
+        self.assertEqual(list(get_intruders_queryset()), [self.cashier])
+        self.assertEqual(
+            list(get_intruders_queryset(show_dismissed=True)),
+            [self.cashier, self.hall_admin]
+        )
+
+
+@override_settings(SCHEDULE_PROVIDER='salary.tests.FakeScheduleProvider')
+class ScheduleRefreshTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = User.objects.create(
+            username='ivanov', first_name='Ivan', last_name='Ivanov')
+
+    def setUp(self):
+        cache.clear()
+        fake_worksheet_requests.clear()
+
+    def test_schedule_is_loaded_once(self):
+        expected_schedule = {
+            self.employee.id: [datetime.date(2022, 2, 1),
+                               datetime.date(2022, 2, 3)]
+        }
+        self.assertEqual(get_employees_schedule_dict(2022, 2),
+                         expected_schedule)
+        self.assertEqual(get_employees_schedule_dict(2022, 2),
+                         expected_schedule)
+        self.assertEqual(fake_worksheet_requests,
+                         ['01-2022', '02-2022', '03-2022'])
+
+    def test_neighbour_months_are_loaded_with_missed_schedule(self):
+        get_employees_schedule_dict(2022, 2)
+        get_employees_schedule_dict(2022, 1)
+        get_employees_schedule_dict(2022, 3)
+        get_employees_schedule_dict(2022, 4)
+        self.assertEqual(fake_worksheet_requests, [
+            '01-2022', '02-2022', '03-2022', '04-2022', '05-2022'
+        ])
+
+    @mock.patch('salary.services.schedule.threading.Thread')
+    def test_stale_schedule_is_refreshed_in_background_once(self, thread):
+        get_employees_schedule_dict(2022, 2)
+        with self.settings(SCHEDULE_SOFT_LIFETIME=-1):
+            stale_schedule = get_employees_schedule_dict(2022, 2)
+            get_employees_schedule_dict(2022, 2)
+        self.assertIn(self.employee.id, stale_schedule)
+        self.assertEqual(len(fake_worksheet_requests), 3)
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+
+
+class ScheduleProvidersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = User.objects.create(
+            username='ivanov', first_name='Ivan', last_name='Ivanov')
+        cls.expected_schedule = {
+            cls.employee.id: [datetime.date(2022, 2, 1),
+                              datetime.date(2022, 2, 3)]
+        }
+
+    def setUp(self):
+        cache.clear()
+
+    def test_file_provider_reads_csv_worksheet(self):
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, '02-2022.csv')
+            with open(csv_path, 'w', newline='', encoding='utf-8') as file:
+                csv.writer(file).writerows(fake_worksheet_data)
+            provider = FileScheduleProvider(directory)
+            self.assertEqual(provider.get_schedule(2022, 2),
+                             self.expected_schedule)
+            self.assertEqual(provider.get_schedule(2022, 3), {})
+
+    @override_settings(
+        SCHEDULE_PROVIDER='salary.services.schedule.DatabaseScheduleProvider')
+    def test_database_provider_is_not_cached(self):
+        for day in (3, 1):
+            PlannedShift.objects.create(
+                user=self.employee, date=datetime.date(2022, 2, day))
+        self.assertEqual(DatabaseScheduleProvider().get_schedule(2022, 2),
+                         self.expected_schedule)
+        get_employees_schedule_dict(2022, 2)
+        PlannedShift.objects.filter(date__day=3).delete()
+        self.assertEqual(get_employees_schedule_dict(2022, 2),
+                         {self.employee.id: [datetime.date(2022, 2, 1)]})
+
+    def test_planned_shifts_sync_creates_and_deletes_difference(self):
+        stale_shift = PlannedShift.objects.create(
+            user=self.employee, date=datetime.date(2022, 2, 2))
+        kept_shift = PlannedShift.objects.create(
+            user=self.employee, date=datetime.date(2022, 2, 1))
+        sync_result = sync_planned_shifts(2022, 2, FakeScheduleProvider())
+        self.assertEqual(sync_result, (1, 1))
+        self.assertFalse(
+            PlannedShift.objects.filter(pk=stale_shift.pk).exists())
+        self.assertTrue(PlannedShift.objects.filter(pk=kept_shift.pk).exists())
+        self.assertEqual(
+            DatabaseScheduleProvider().get_employee_dates(
+                self.employee.id, datetime.date(2022, 1, 31),
+                datetime.date(2022, 2, 2)),
+            [datetime.date(2022, 2, 1)]
+        )
+
+    def test_google_sheets_worksheets_copies_are_upserted(self):
+        provider = GoogleSheetsScheduleProvider()
+        for worksheet_data in (fake_worksheet_data, fake_worksheet_data[:2]):
+            with mock.patch(
+                    'salary.services.schedule.get_gsheets_worksheets_data',
+                    return_value={'02-2022': worksheet_data}):
+                provider.get_worksheets_data(['02-2022'])
+        self.assertEqual(
+            list(WorksheetCopy.objects.values_list('name', 'data')),
+            [('02-2022', fake_worksheet_data[:2])]
+        )
+
+        with mock.patch.object(connection.features,
+                               'supports_update_conflicts_with_target', False), \
+                mock.patch.object(WorksheetCopy.objects,
+                                  'bulk_create') as bulk_create:
+            WorksheetCopy.save_worksheets({'02-2022': fake_worksheet_data})
+        self.assertIsNone(bulk_create.call_args.kwargs['unique_fields'])
+
+    def test_google_sheets_data_is_returned_if_copy_is_not_saved(self):
+        with mock.patch(
+                'salary.services.schedule.get_gsheets_worksheets_data',
+                return_value={'02-2022': fake_worksheet_data}), \
+                mock.patch.object(WorksheetCopy, 'save_worksheets',
+                                  side_effect=DatabaseError):
+            self.assertEqual(
+                GoogleSheetsScheduleProvider().get_worksheets_data(
+                    ['02-2022']),
+                {'02-2022': fake_worksheet_data}
+            )
+
+
+    @override_settings(
+        SCHEDULE_PROVIDER=(
+            'salary.services.schedule.GoogleSheetsScheduleProvider'))
+    @mock.patch('salary.services.schedule.threading.Thread')
+    def test_fallback_is_refreshed_after_breaker_retry_time(self, thread):
+        WorksheetCopy.save_worksheets({'02-2022': fake_worksheet_data})
+        retry_at = time.time() + 100
+        with mock.patch(
+                'salary.services.schedule.get_gsheets_worksheets_data',
+                side_effect=CircuitOpenError), \
+                mock.patch.object(gsheets_circuit_breaker, 'get_retry_time',
+                                  return_value=retry_at):
+            self.assertEqual(get_employees_schedule_dict(2022, 2),
+                             self.expected_schedule)
+        self.assertEqual(get_employees_schedule_dict(2022, 2),
+                         self.expected_schedule)
+        thread.assert_not_called()
+        with mock.patch('salary.services.schedule.time.time',
+                        return_value=retry_at + 1):
+            get_employees_schedule_dict(2022, 2)
+        thread.assert_called_once()
+
+    def test_warm_schedules_requires_shared_cache(self):
+        with self.assertRaisesMessage(CommandError, 'LocMemCache'):
+            call_command('warm_schedules', stdout=StringIO())
+
+
+class EmployeesIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_employee_is_found_by_normalized_name(self):
+        employee = User.objects.create(
+            username='fedorov', first_name='Пётр', last_name='Фёдоров')
+        self.assertEqual(get_employee_by_name(' федоров  ПЕТР').id,
+                         employee.id)
+        with self.assertNumQueries(0):
+            get_employee_by_name('Фёдоров Пётр')
+
+    def test_index_is_invalidated_on_user_change(self):
+        employee = User.objects.create(
+            username='fedorov', first_name='Petr', last_name='Fedorov')
+        self.assertFalse(get_employee_by_id(employee.id).is_cashier)
+        employee.is_superuser = True
+        employee.save()
+        self.assertTrue(get_employee_by_id(employee.id).is_cashier)
+
+
+class CircuitBreakerTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.circuit_breaker = CircuitBreaker(
+            'test', failure_exceptions=(ConnectionError,),
+            failure_threshold=2, base_delay=60, max_delay=600
+        )
+
+    @staticmethod
+    def _fail():
+        raise ConnectionError('Service is unavailable')
+
+    def test_circuit_is_open_after_failures_in_row(self):
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                self.circuit_breaker.call(self._fail)
+        self.assertEqual(self.circuit_breaker.get_state(), CircuitState.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.circuit_breaker.call(lambda: 'response')
+        metrics = self.circuit_breaker.get_metrics()
+        self.assertEqual((metrics['failure'], metrics['rejected']), (2, 1))
+
+    def test_successful_probe_closes_circuit(self):
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                self.circuit_breaker.call(self._fail)
+        with mock.patch('salary.services.circuit_breaker.time.time',
+                        return_value=time.time() + 61):
+            self.assertEqual(self.circuit_breaker.get_state(),
+                             CircuitState.HALF_OPEN)
+            self.assertEqual(self.circuit_breaker.call(lambda: 'response'),
+                             'response')
+        self.assertEqual(self.circuit_breaker.get_state(),
+                         CircuitState.CLOSED)
@@ -43,6 +43,7 @@ urlpatterns = [
     path('workshifts_view/', StaffWorkshiftsView.as_view(), name='workshifts_view'),
     path('workshifts_archive_view/<int:year>/<int:month>/', StaffArchiveWorkshiftsView.as_view(), name='workshift_archive_view'),
     path('workshifts_for_year/<int:year>/', StaffWorkshiftsForYearView.as_view(), name='workshifts_for_year'),
+    path('missed_workshifts/', StaffMissedWorkshiftsView.as_view(), name='missed_workshifts'),
     path('workshifts_all_years/', StaffWorkshiftsYearView.as_view(), name='workshifts_all_years'),
     path('my_workshifts/', EmployeeWorkshiftsView.as_view(), name='employee_workshifts'),    
     path('workshifts_view/<int:year>/<int:month>/<int:employee>/', StaffEmployeeMonthView.as_view(), name='staff_employee_month_view'),
@@ -68,11 +69,14 @@ urlpatterns = [
     # Messenger section
     path('messenger/', MessengerMainView.as_view(), name='messenger'),
     path('messenger/<slug:slug>/', MessengerChatView.as_view(), name='messenger_open_chat'),
+    path('messenger/<slug:slug>/messages/', load_new_messages, name='messenger_new_messages'),
+    path('messenger/<slug:slug>/wait/', wait_new_messages, name='messenger_wait_messages'),
     path('messenger/new_chat/<int:pk>/', MessengerNewChatView.as_view(), name='messenger_new_chat'),
     # Calendar section
     path('calendar/<int:year>/<int:month>/', CalendarView.as_view(), name='calendar'),
     path('staff_schedule_list/', StaffCalendarListView.as_view(), name='staff_schedule_list'),
     path('staff_calendar/<int:pk>/<int:year>/<int:month>/', StaffCalendarView.as_view(), name='staff_calendar'),
+    path('staff_team_calendar/<int:year>/<int:month>/', StaffTeamCalendarView.as_view(), name='staff_team_calendar'),
     # Everyday report section
     path('everyday_report_print/<slug:slug>/', EverydayReportPrintView.as_view(), name='everyday_report_print'),
     path('costs_and_errors_form/<int:pk>/', AddCostErrorFormView.as_view(), name='costs_and_errors_form'),
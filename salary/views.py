@@ -3,6 +3,7 @@ from typing import *
 from dateutil.relativedelta import relativedelta
 import logging
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth.forms import AuthenticationForm, AdminPasswordChangeForm
 from django.http import Http404, HttpRequest, JsonResponse, HttpResponseNotFound, HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
@@ -10,7 +11,7 @@ from django.views.generic import TemplateView, ListView, DetailView
 from django.contrib.auth.views import LoginView, PasswordChangeView, PasswordResetView, PasswordResetDoneView, PasswordResetConfirmView
 from django.contrib.auth import logout, login
 from django.contrib.auth.decorators import login_required
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import BadRequest, PermissionDenied
 from django.contrib.auth.models import Permission
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.views.generic.edit import CreateView, DeleteView, UpdateView, FormView
@@ -21,14 +22,17 @@ from .forms import *
 from .mixins import *
 from salary.services.chat import *
 from salary.services.shift_calendar import (get_user_calendar,
-                                            get_employees_at_work)
-from salary.services.misconduct import Intruder
+                                            get_employees_at_work,
+                                            get_team_calendar)
+from salary.services.counters import get_unread_messages_counter
+from salary.services.chat_updates import wait_chat_updates
 from salary.services.internal_model_func import get_misconduct_slug
 from salary.services.workshift import (
     notification_of_upcoming_shifts, get_missed_dates_tuple,
     get_employee_workshift_indicators, get_employee_month_workshifts,
     get_employee_unclosed_workshifts_dates, get_unclosed_workshift_number,
-    get_summary_workshift_data
+    get_summary_workshift_data, get_missed_dates, get_missed_dates_by_months,
+    is_employee_cashier
 )
 from salary.services.registration import (
     registration_user, sending_confirmation_link, confirmation_user_email,
@@ -43,7 +47,7 @@ from salary.services.monthly_reports import (
     get_monthly_report, get_awards_data, get_filtered_rating_data
 )
 from salary.services.misconduct import (
-    get_misconduct_employee_data, get_sorted_intruders_list, get_penalty_sum
+    get_misconduct_employee_data, get_intruders_queryset, get_penalty_sum
 )
 from salary.services.profile_services import get_birthday_person_list
 from salary.services.analytic import get_analytic_data
@@ -245,7 +249,7 @@ class StaffIndexView(PermissionRequiredMixin, TitleMixin, UpdateContextMixin,
             'today_date': today_date,
             'missed_workshifts_dates': get_missed_dates_tuple(),
             'birthday_person_list': birthday_person_list,
-            'unread_messages_number': get_unread_messages_number(
+            'unread_messages_number': get_unread_messages_counter(
                 self.request.user),
             'unclosed_workshifts': get_unclosed_workshift_number(),
             'total_rating_data': get_filtered_rating_data(today_date.month,
@@ -309,6 +313,20 @@ class StaffArchiveWorkshiftsView(PermissionRequiredMixin,
         return additional_context_data
 
 
+class StaffMissedWorkshiftsView(PermissionRequiredMixin, TitleMixin,
+                                UpdateContextMixin, TemplateView):
+    template_name = 'salary/staff_missed_workshifts_view.html'
+    title = 'Пропущенные смены'
+    permission_required = WORKINGSHIFT_PERMISSONS_TUPLE
+
+    def get_additional_context_data(self) -> dict:
+        missed_dates = get_missed_dates(start_date=None)
+        return {
+            'missed_months': get_missed_dates_by_months(missed_dates),
+            'missed_dates_number': len(missed_dates),
+        }
+
+
 class StaffWorkshiftsForYearView(PermissionRequiredMixin, TitleMixin,
                                  MonthYearExtractMixin, UpdateContextMixin,
                                  ListView):
@@ -424,20 +442,17 @@ class MisconductListView(MisconductPermissionsMixin, TitleMixin,
     model = Misconduct
     title = 'Список нарушителей'
     template_name = 'salary/intruders_list.html'
+    context_object_name = 'intruders_list'
+    paginate_by = 20
     is_show_dissmissed = False
 
-    def get_queryset(self) -> List[Intruder]:
-        queryset = Misconduct.objects.select_related('intruder__profile')
-        if not self.request.GET.get('show_dissmissed'):
-            self.is_show_dissmissed = True
-            dismissed_status = Profile.ProfileStatus.DISMISSED
-            return queryset.exclude(
-                intruder__profile__profile_status=dismissed_status)
-        return queryset
+    def get_queryset(self) -> QuerySet:
+        show_dismissed = bool(self.request.GET.get('show_dissmissed'))
+        self.is_show_dissmissed = not show_dismissed
+        return get_intruders_queryset(show_dismissed)
 
     def get_additional_context_data(self):
         additional_context_data = {
-            'intruders_list': get_sorted_intruders_list(self.object_list),
             'is_show_dissmissed': self.is_show_dissmissed,
         }
         return additional_context_data
@@ -557,7 +572,7 @@ class WorkshiftDetailView(ProfileStatusRedirectMixin, PermissionRequiredMixin,
     queryset = WorkingShift.objects.select_related(
             'cash_admin__profile__position',
             'hall_admin__profile__position',
-    )
+    ).prefetch_related('earnings_snapshots')
     context_object_name = 'workshift'
 
     def get_additional_context_data(self) -> dict:
@@ -619,7 +634,9 @@ class IndexEmployeeView(LoginRequiredMixin, ProfileStatusRedirectMixin,
             user_id=self.request.user.pk)
         misconduct_data = get_misconduct_employee_data(self.request.user.id)
         employee_month_indicators = get_employee_workshift_indicators(
-            self.request.user.id)
+            self.request.user.id,
+            is_cashier=is_employee_cashier(self.request.user.id)
+        )
         unclosed_shifts_dates = get_employee_unclosed_workshifts_dates(
             self.request.user.id)
         logger.debug(
@@ -648,7 +665,9 @@ class EmployeeWorkshiftsView(PermissionRequiredMixin, MonthYearExtractMixin,
         workshifts_list = get_employee_month_workshifts(
             self.request.user.id, self.month, self.year)
         employee_month_indicators = get_employee_workshift_indicators(
-            self.request.user.id, self.month, self.year)
+            self.request.user.id, self.month, self.year,
+            is_cashier=is_employee_cashier(self.request.user.id)
+        )
         return {
             'employee_indicators': employee_month_indicators,
             'workshifts_list': workshifts_list
@@ -930,28 +949,82 @@ class MessengerChatView(MessengerMainView):
         return super().dispatch(request, *args, **kwargs)
 
     def get_additional_context_data(self) -> dict:
-        messages_list = []
-        messages_list = get_messages_list(self.chat_object.slug)
+        before = self.request.GET.get('before', '')
+        try:
+            messages_page = get_messages_page(self.chat_object, before)
+        except ValueError:
+            raise BadRequest('Wrong messages cursor.')
 
         chats_list = get_chats_list(
             self.request.user.id,
             self.chat_object.slug
         )
-        recipient = get_chat_info(
+        recipient = get_chat_interlocutor(
             self.chat_object, # type: ignore
             self.request.user.id
-        ).member
+        )
 
-        mark_messages_as_read(messages_list, self.request.user)
+        mark_chat_as_read(self.chat_object, self.request.user)
         additional_context_data = {
             'chats_list': chats_list,
-            'messages_list': messages_list,
+            'messages_list': messages_page.messages,
+            'older_cursor': messages_page.older_cursor,
+            'newest_cursor': messages_page.newest_cursor,
+            'is_older_page': bool(before),
             'recipient': recipient,
+            'recipient_last_read_message_id': get_last_read_message_id(
+                self.chat_object, recipient),
         }
 
         return additional_context_data
 
 
+@login_required
+def load_new_messages(request: HttpRequest, slug: str) -> JsonResponse:
+    chat = get_object_or_404(Chat, slug=slug, members=request.user)
+    try:
+        messages = get_new_messages(chat, request.GET.get('after', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Wrong messages cursor.'}, status=400)
+
+    if messages:
+        mark_chat_as_read(chat, request.user)
+    response = {
+        'messages': [get_message_data(message) for message in messages],
+        'cursor': (
+            encode_message_cursor(messages[-1]) if messages
+            else request.GET.get('after')
+        ),
+    }
+
+    return JsonResponse(response)
+
+
+async def wait_new_messages(request: HttpRequest, slug: str) -> JsonResponse:
+    # request.user is loaded lazily with the sync session and user queries.
+    if not await sync_to_async(lambda: request.user.is_authenticated)():
+        return JsonResponse({'error': 'Login required.'}, status=403)
+    user = request.user
+    try:
+        chat = await Chat.objects.aget(slug=slug, members=user)
+    except Chat.DoesNotExist:
+        raise Http404
+    after = request.GET.get('after', '')
+    unread_messages_count = request.GET.get('unread')
+    try:
+        if after:
+            decode_message_cursor(after)
+        if unread_messages_count is not None:
+            unread_messages_count = int(unread_messages_count)
+    except ValueError:
+        return JsonResponse({'error': 'Wrong request parameters.'}, status=400)
+
+    chat_updates = await wait_chat_updates(
+        chat, user, after, unread_messages_count)
+
+    return JsonResponse(chat_updates._asdict())
+
+
 class MessengerNewChatView(MessengerMainView):
     template_name = 'salary/chat/chat_open.html'
 
@@ -1010,6 +1083,22 @@ class StaffCalendarListView(TitleMixin, UpdateContextMixin, ListView):
         return {'date': datetime.date.today()}
 
 
+class StaffTeamCalendarView(StaffOnlyMixin, MonthYearExtractMixin, TitleMixin,
+                            UpdateContextMixin, TemplateView):
+    template_name: str = 'salary/calendar/team_calendar.html'
+    title = 'График команды'
+
+    def get_additional_context_data(self) -> dict:
+        requested_date = datetime.date(self.year, self.month, 1)
+        return {
+            'team_calendar': get_team_calendar(
+                StaffCalendarListView.queryset, self.year, self.month),
+            'requested_date': requested_date,
+            'previous_month': requested_date - relativedelta(months=1),
+            'next_month': requested_date + relativedelta(months=1),
+        }
+
+
 class AwardRatingView(MonthlyReportListView):
     template_name: str = 'salary/month_reports/award_rating.html'
     title = 'Рейтинговый отчёт'